@@ -1,6 +1,6 @@
 """Shared utilities for Receipt Vault Lambda functions."""
 
-from shared.response import success, error, created, no_content
+from shared.response import success, error, created, accepted, no_content
 from shared.auth import get_user_id
 from shared.dynamodb import (
     build_pk,
@@ -9,4 +9,10 @@ from shared.dynamodb import (
     extract_receipt_id,
     extract_user_id,
 )
-from shared.errors import NotFoundError, ForbiddenError, ConflictError, ValidationError
+from shared.errors import (
+    NotFoundError,
+    ForbiddenError,
+    ConflictError,
+    ValidationError,
+    InvalidCursorError,
+)
@@ -0,0 +1,284 @@
+"""Bulk DynamoDB reads and writes on the low-level client.
+
+batch_get splits keys into BatchGetItem requests of 100 and batch_write into
+BatchWriteItem requests of 25, runs the chunks concurrently on a thread pool
+and retries UnprocessedKeys / UnprocessedItems with exponential backoff and
+full jitter. If a chunk still has unprocessed entries after max_attempts,
+BatchIncompleteError is raised instead of silently dropping them.
+
+transact_write applies conditional writes in TransactWriteItems chunks of
+at most 100 actions and about 4 MB. A cancelled transaction writes nothing,
+so actions that failed for their own reasons (a condition, a validation
+error) are reported back and the rest of the chunk is resubmitted; transient
+cancellations are retried. A chunk refused as a whole with a
+ValidationException is bisected down to the actions that fail on their own.
+Chunks commit independently, so once one has committed a failing chunk is
+reported per action instead of raised.
+
+Items are converted with the table-driven marshaller in shared.fastpath.
+Pass a plain boto3.client("dynamodb"): a resource's meta.client already
+converts values and would do it twice.
+"""
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from shared.fastpath import marshal_item, unmarshal_item
+
+BATCH_GET_SIZE = 100
+BATCH_WRITE_SIZE = 25
+TRANSACT_SIZE = 100
+# TransactWriteItems accepts 4 MB; the estimate leaves room for request overhead
+TRANSACT_MAX_BYTES = 4_000_000
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 8
+BASE_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 2.0
+DEFAULT_KEY_NAMES = ("PK", "SK")
+
+# Cancellation reasons caused by contention rather than by the action itself
+RETRYABLE_CANCEL_CODES = {
+    "TransactionConflict",
+    "ThrottlingError",
+    "ProvisionedThroughputExceeded",
+    "RequestLimitExceeded",
+}
+
+
+class BatchIncompleteError(Exception):
+    """Raised when a batch still has unprocessed entries after all retries."""
+
+
+def deserialize_item(raw):
+    """Convert a low-level DynamoDB item to plain Python values."""
+    return unmarshal_item(raw)
+
+
+def serialize_item(item):
+    """Convert a plain Python item to the low-level DynamoDB format."""
+    return marshal_item(item)
+
+
+def batch_get(client, table_name, keys, projection=None, key_names=DEFAULT_KEY_NAMES,
+              consistent_read=False, max_workers=DEFAULT_MAX_WORKERS,
+              max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Fetch items by key and return a dict of key tuple -> item.
+
+    ``keys`` are plain dicts such as {"PK": ..., "SK": ...}; the result is
+    keyed by the tuple of ``key_names`` values. Keys with no item are absent
+    from the result. ``projection`` is an optional list of attribute names to
+    return; the key attributes are always included.
+    """
+    unique_keys = list({tuple(k[n] for n in key_names): k for k in keys}.values())
+    if not unique_keys:
+        return {}
+
+    request_template = {}
+    if projection:
+        names = list(dict.fromkeys([*key_names, *projection]))
+        request_template["ProjectionExpression"] = ", ".join(
+            f"#p{i}" for i in range(len(names))
+        )
+        request_template["ExpressionAttributeNames"] = {
+            f"#p{i}": name for i, name in enumerate(names)
+        }
+    if consistent_read:
+        request_template["ConsistentRead"] = True
+
+    def fetch_chunk(chunk):
+        request_items = {
+            table_name: {
+                **request_template,
+                "Keys": [serialize_item({n: k[n] for n in key_names}) for k in chunk],
+            }
+        }
+        found = []
+        for attempt in range(max_attempts):
+            if attempt:
+                backoff(attempt)
+            resp = client.batch_get_item(RequestItems=request_items)
+            found.extend(resp.get("Responses", {}).get(table_name, []))
+            request_items = resp.get("UnprocessedKeys")
+            if not request_items:
+                return found
+        raise BatchIncompleteError(
+            f"BatchGetItem left keys unprocessed after {max_attempts} attempts"
+        )
+
+    results = {}
+    for raw_items in _run_chunks(fetch_chunk, unique_keys, BATCH_GET_SIZE, max_workers):
+        for raw in raw_items:
+            item = deserialize_item(raw)
+            results[tuple(item[n] for n in key_names)] = item
+    return results
+
+
+def batch_write(client, table_name, put_items=(), delete_keys=(),
+                max_workers=DEFAULT_MAX_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Put and delete items with BatchWriteItem and return the number written.
+
+    A single call must not put and delete the same key.
+    """
+    requests = [{"PutRequest": {"Item": serialize_item(item)}} for item in put_items]
+    requests += [{"DeleteRequest": {"Key": serialize_item(key)}} for key in delete_keys]
+    if not requests:
+        return 0
+
+    def write_chunk(chunk):
+        request_items = {table_name: chunk}
+        for attempt in range(max_attempts):
+            if attempt:
+                backoff(attempt)
+            resp = client.batch_write_item(RequestItems=request_items)
+            request_items = resp.get("UnprocessedItems")
+            if not request_items:
+                return len(chunk)
+        raise BatchIncompleteError(
+            f"BatchWriteItem left items unprocessed after {max_attempts} attempts"
+        )
+
+    return sum(_run_chunks(write_chunk, requests, BATCH_WRITE_SIZE, max_workers))
+
+
+def transact_write(client, actions, max_workers=DEFAULT_MAX_WORKERS,
+                   max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Apply TransactWriteItems actions and return one result per action.
+
+    ``actions`` use the low-level TransactItems shape ({"Put": ...},
+    {"Update": ...}, ...). Each result is None if the action was written, or
+    {"code": <cancellation code>, "item": <current item or None>} if it was
+    rejected; "item" is filled in for conditional actions that ask for
+    ReturnValuesOnConditionCheckFailure. Actions within one call must target
+    distinct items.
+
+    An error that stops a chunk is raised only if no chunk committed;
+    otherwise that chunk's unwritten actions get its error code.
+    """
+    if not actions:
+        return []
+
+    def write_chunk(indexed):
+        results = {}
+        try:
+            _write_transaction(client, indexed, results, max_attempts)
+        except Exception as exc:
+            return results, indexed, exc
+        return results, indexed, None
+
+    merged = {}
+    failed = []
+    for results, indexed, exc in _run_chunk_list(
+        write_chunk, _transact_chunks(list(enumerate(actions))), max_workers
+    ):
+        merged.update(results)
+        if exc is not None:
+            failed.append((indexed, exc))
+
+    if failed:
+        if None not in merged.values():
+            raise failed[0][1]
+        for indexed, exc in failed:
+            for index, _ in indexed:
+                merged.setdefault(index, {"code": _error_code(exc), "item": None})
+    return [merged[i] for i in range(len(actions))]
+
+
+def _write_transaction(client, indexed, results, max_attempts):
+    """Write one chunk of (index, action) pairs, recording results by index."""
+    pending = indexed
+    for attempt in range(max_attempts):
+        if attempt:
+            backoff(attempt)
+        try:
+            client.transact_write_items(TransactItems=[action for _, action in pending])
+        except client.exceptions.TransactionCanceledException as exc:
+            reasons = exc.response.get("CancellationReasons") or []
+            retry = []
+            for (index, action), reason in zip(pending, reasons):
+                code = reason.get("Code", "None")
+                if code == "None" or code in RETRYABLE_CANCEL_CODES:
+                    retry.append((index, action))
+                else:
+                    item = reason.get("Item")
+                    results[index] = {
+                        "code": code,
+                        "item": deserialize_item(item) if item else None,
+                    }
+            pending = retry
+            if not pending:
+                return
+            continue
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") != "ValidationException":
+                raise
+            # Refused as a whole (e.g. too large): find the actions at fault
+            if len(pending) == 1:
+                results[pending[0][0]] = {"code": "ValidationError", "item": None}
+                return
+            middle = len(pending) // 2
+            _write_transaction(client, pending[:middle], results, max_attempts)
+            _write_transaction(client, pending[middle:], results, max_attempts)
+            return
+        for index, _ in pending:
+            results[index] = None
+        return
+    raise BatchIncompleteError(
+        f"TransactWriteItems did not complete after {max_attempts} attempts"
+    )
+
+
+def _transact_chunks(indexed):
+    """Split (index, action) pairs by TRANSACT_SIZE and TRANSACT_MAX_BYTES."""
+    chunks, chunk, chunk_bytes = [], [], 0
+    for entry in indexed:
+        size = _estimated_size(entry[1])
+        if chunk and (len(chunk) == TRANSACT_SIZE or chunk_bytes + size > TRANSACT_MAX_BYTES):
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append(entry)
+        chunk_bytes += size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _estimated_size(value):
+    """Approximate the bytes a low-level request value adds to a request."""
+    if isinstance(value, dict):
+        return sum(len(key) + _estimated_size(v) for key, v in value.items())
+    if isinstance(value, list):
+        return sum(_estimated_size(v) for v in value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return 8
+
+
+def _error_code(exc):
+    if isinstance(exc, ClientError):
+        return exc.response.get("Error", {}).get("Code", "InternalError")
+    if isinstance(exc, BatchIncompleteError):
+        return "TransactionIncomplete"
+    return "InternalError"
+
+
+def _run_chunks(fn, entries, chunk_size, max_workers):
+    """Apply fn to each chunk of entries, concurrently when there is more than one."""
+    chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+    return _run_chunk_list(fn, chunks, max_workers)
+
+
+def _run_chunk_list(fn, chunks, max_workers):
+    if len(chunks) == 1 or max_workers <= 1:
+        return [fn(chunk) for chunk in chunks]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        return list(pool.map(fn, chunks))
+
+
+def backoff(attempt):
+    """Sleep with capped exponential backoff and full jitter."""
+    time.sleep(random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt))))
@@ -0,0 +1,173 @@
+"""In-container LRU + TTL cache for small, rarely written items.
+
+Per-user META items (PROFILE, SETTINGS, CATEGORIES) are read on many
+requests but change only when the user edits them. A module-level cache
+survives across warm invocations of a container, so repeat reads skip
+DynamoDB:
+
+    item = META_CACHE.get_item(table, {"PK": pk, "SK": build_settings_sk()})
+    ...
+    table.update_item(...)
+    META_CACHE.invalidate_item(pk, build_settings_sk())
+
+The cache is bounded by entry count and by an estimate of the cached bytes,
+evicting least recently used entries first. Missing items are cached too
+(as None), since a new user's absent SETTINGS item is the common case.
+
+Invalidation only reaches the container that made the write; other warm
+containers serve their copy until it expires, so the TTL is the bound on
+staleness across containers. Hit/miss counters are logged as structured JSON
+every ``log_every`` lookups, and on demand with ``log_stats``.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+logger = logging.getLogger()
+
+DEFAULT_TTL_SECONDS = float(os.environ.get("META_CACHE_TTL_SECONDS", "30"))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("META_CACHE_MAX_ENTRIES", "1024"))
+DEFAULT_MAX_BYTES = int(os.environ.get("META_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+DEFAULT_LOG_EVERY = 500
+
+# Bookkeeping per entry (key tuple, OrderedDict node, expiry) on top of the item
+_ENTRY_OVERHEAD = 200
+
+
+def estimate_size(value):
+    """Approximate the in-memory footprint of a deserialized DynamoDB value."""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (int, float, Decimal)):
+        return len(str(value))
+    if isinstance(value, dict):
+        return sum(len(str(k)) + estimate_size(v) for k, v in value.items()) + 3
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sum(estimate_size(v) + 1 for v in value) + 3
+    return 1
+
+
+class TTLCache:
+    """LRU cache whose entries also expire ``ttl`` seconds after being stored."""
+
+    def __init__(self, name, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, log_every=DEFAULT_LOG_EVERY, clock=time.monotonic):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.log_every = log_every
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expires_at, size, value), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, key):
+        """Return ``(True, value)`` for a live entry, else ``(False, None)``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self._clock():
+                self._discard(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                found, value = False, None
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found, value = True, entry[2]
+            lookups = self.hits + self.misses
+        if self.log_every and lookups % self.log_every == 0:
+            self.log_stats()
+        return found, value
+
+    def put(self, key, value):
+        """Store ``value``, evicting LRU entries to stay within both bounds."""
+        size = estimate_size(value) + _ENTRY_OVERHEAD
+        with self._lock:
+            self._discard(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (self._clock() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cache": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def log_stats(self, **extra):
+        logger.info(json.dumps({"action": "cache_stats", **self.stats(), **extra}))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+
+class ItemCache(TTLCache):
+    """TTLCache of table items keyed by (PK, SK)."""
+
+    def get_item(self, table, key):
+        """Return the item at ``key`` (or None), reading the table on a miss.
+
+        The returned dict is the cached object; callers must not mutate it.
+        """
+        cache_key = (key["PK"], key["SK"])
+        found, item = self.lookup(cache_key)
+        if not found:
+            item = table.get_item(Key=key).get("Item")
+            self.put(cache_key, item)
+        return item
+
+    def lookup_item(self, pk, sk):
+        """Return ``(found, item)`` without reading the table; see ``lookup``."""
+        return self.lookup((pk, sk))
+
+    def put_item(self, pk, sk, item):
+        """Cache an item (or None for an absent one) read by other means."""
+        self.put((pk, sk), item)
+
+    def invalidate_item(self, pk, sk):
+        self.invalidate((pk, sk))
+
+
+# Shared by every handler in the container that reads per-user META items
+META_CACHE = ItemCache("meta")
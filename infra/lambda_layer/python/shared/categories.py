@@ -0,0 +1,14 @@
+"""System default categories, offered to every user alongside their own."""
+
+DEFAULT_CATEGORIES = [
+    "Electronics",
+    "Groceries",
+    "Clothing",
+    "Home & Garden",
+    "Automotive",
+    "Health & Beauty",
+    "Office",
+    "Sports & Outdoors",
+    "Toys & Kids",
+    "Dining",
+]
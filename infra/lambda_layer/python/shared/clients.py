@@ -0,0 +1,117 @@
+"""Lazily constructed boto3 clients, resources and tables.
+
+Building a boto3 client loads and parses its service model, which is a large
+part of a Lambda cold start. Handlers still declare their clients at module
+level, but get a placeholder that builds the real client the first time an
+attribute is used and forwards to it from then on, so a route that never
+touches S3 never pays for an S3 client. Built objects are cached in a
+process-wide registry and reused for the life of the container, including by
+other modules that ask for the same client.
+
+    s3_client = lazy_client("s3", region_name=REGION)
+    table = lazy_table(TABLE_NAME, region_name=REGION)
+"""
+
+import threading
+
+_registry = {}
+# Re-entrant: building a table resolves the shared resource under the lock
+_lock = threading.RLock()
+
+
+class LazyProxy:
+    """Stands in for an object that is built on first attribute access."""
+
+    __slots__ = ("_key", "_factory", "_target")
+
+    def __init__(self, key, factory):
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_target", None)
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __repr__(self):
+        state = "built" if self._target is not None else "not built"
+        return f"<LazyProxy {self._key!r} ({state})>"
+
+    def _resolve(self):
+        target = self._target
+        if target is None:
+            target = _get_or_build(self._key, self._factory)
+            object.__setattr__(self, "_target", target)
+        return target
+
+
+def lazy_client(service_name, region_name=None, **config_options):
+    """Return a placeholder for boto3.client(service_name, ...).
+
+    ``config_options`` are botocore Config settings, e.g.
+    ``max_pool_connections=8``; calls with equal settings share a client.
+    """
+
+    def build():
+        import boto3
+
+        return boto3.client(
+            service_name, region_name=region_name, config=_build_config(config_options)
+        )
+
+    return LazyProxy(("client", service_name, region_name, _config_key(config_options)), build)
+
+
+def lazy_resource(service_name, region_name=None, **config_options):
+    """Return a placeholder for boto3.resource(service_name, ...)."""
+
+    def build():
+        import boto3
+
+        return boto3.resource(
+            service_name, region_name=region_name, config=_build_config(config_options)
+        )
+
+    return LazyProxy(("resource", service_name, region_name, _config_key(config_options)), build)
+
+
+def lazy_table(table_name, region_name=None):
+    """Return a placeholder for a DynamoDB Table on the shared resource."""
+    resource = lazy_resource("dynamodb", region_name=region_name)
+    return LazyProxy(
+        ("table", table_name, region_name),
+        lambda: resource.Table(table_name),
+    )
+
+
+def built_clients():
+    """Return the registry keys of every object built so far (for profiling)."""
+    with _lock:
+        return list(_registry)
+
+
+def _get_or_build(key, factory):
+    built = _registry.get(key)
+    if built is not None:
+        return built
+    with _lock:
+        built = _registry.get(key)
+        if built is None:
+            built = factory()
+            _registry[key] = built
+        return built
+
+
+def _build_config(config_options):
+    if not config_options:
+        return None
+    from botocore.config import Config
+
+    return Config(**config_options)
+
+
+def _config_key(config_options):
+    """Key Config settings so that equal settings share a client."""
+    return tuple(sorted((k, repr(v)) for k, v in config_options.items()))
@@ -1,4 +1,12 @@
-"""DynamoDB key helpers for the single-table ReceiptVault schema."""
+"""DynamoDB key and update-expression helpers for the single-table ReceiptVault schema."""
+
+import zlib
+from functools import lru_cache
+
+# Number of write shards per day in the ByExpiryDate index (GSI-7).
+EXPIRY_SHARD_COUNT = 10
+# Distinct field sets compiled per UpdateBuilder before the oldest are evicted
+UPDATE_CACHE_SIZE = 256
 
 
 def build_pk(user_id):
@@ -21,6 +29,31 @@ def build_settings_sk():
     return "META#SETTINGS"
 
 
+def build_profile_sk():
+    """Return the sort key for the user profile meta item."""
+    return "META#PROFILE"
+
+
+def build_stats_sk():
+    """Return the sort key for the user's precomputed stats meta item."""
+    return "META#STATS"
+
+
+def build_store_stats_sk():
+    """Return the sort key for the user's per-store stats meta item."""
+    return "META#STATS#STORES"
+
+
+def expiry_shard(receipt_id):
+    """Return the stable GSI-7 shard number for a receipt."""
+    return zlib.crc32(receipt_id.encode("utf-8")) % EXPIRY_SHARD_COUNT
+
+
+def build_expiry_pk(expiry_date, shard):
+    """Build the GSI-7 partition key for a warranty expiry date and shard."""
+    return f"EXPIRY#{expiry_date}#{shard}"
+
+
 def extract_receipt_id(sk):
     """Extract the receipt ID from a sort key."""
     return sk.removeprefix("RECEIPT#")
@@ -29,3 +62,65 @@ def extract_receipt_id(sk):
 def extract_user_id(pk):
     """Extract the user ID from a partition key."""
     return pk.removeprefix("USER#")
+
+
+class UpdateBuilder:
+    """Builds SET/REMOVE UpdateExpressions, compiling each shape once.
+
+    ``fixed_clauses`` are SET clauses every update carries, written with the
+    caller's own placeholders, and ``fixed_names`` maps those placeholders
+    to attribute names. Field placeholders are positional (#f0 / :u0 …, and
+    #r0 … for removed attributes), so any attribute name is safe, and their
+    prefixes differ from the #n0 / :v0 that boto3 generates for condition
+    objects. Compiled shapes are kept in an LRU cache keyed by the field
+    and removal tuples: callers that build them in a fixed order hit it on
+    every request with the same shape.
+    """
+
+    def __init__(self, fixed_clauses=(), fixed_names=None):
+        self.fixed_clauses = tuple(fixed_clauses)
+        self.fixed_names = dict(fixed_names or {})
+        self._compile = lru_cache(maxsize=UPDATE_CACHE_SIZE)(self._compile_shape)
+
+    def build(self, fields, remove=()):
+        """Return ``(update_expression, names, values)`` for a dict of fields.
+
+        ``remove`` lists attributes to REMOVE in the same update. The caller
+        adds the values for its fixed placeholders to ``values``. ``names``
+        is a fresh dict, since boto3 adds generated placeholders to it when
+        given condition objects.
+        """
+        update_expr, expr_names, value_names = self._compile(tuple(fields), tuple(remove))
+        return update_expr, dict(expr_names), dict(zip(value_names, fields.values()))
+
+    def _compile_shape(self, field_names, remove_names):
+        expr_parts = list(self.fixed_clauses)
+        expr_names = dict(self.fixed_names)
+        value_names = []
+        for i, field in enumerate(field_names):
+            expr_parts.append(f"#f{i} = :u{i}")
+            expr_names[f"#f{i}"] = field
+            value_names.append(f":u{i}")
+        update_expr = "SET " + ", ".join(expr_parts) if expr_parts else ""
+        if remove_names:
+            for i, field in enumerate(remove_names):
+                expr_names[f"#r{i}"] = field
+            removed = ", ".join(f"#r{i}" for i in range(len(remove_names)))
+            update_expr = f"{update_expr} REMOVE {removed}".lstrip()
+        return update_expr, expr_names, tuple(value_names)
+
+
+# Every receipt write bumps serverVersion and moves the receipt in GSI-6;
+# callers supply ":now" and ":one" (and may compare against "#sv")
+RECEIPT_UPDATE = UpdateBuilder(
+    ("#updatedAt = :now", "#gsi6sk = :now", "#sv = #sv + :one"),
+    {"#updatedAt": "updatedAt", "#gsi6sk": "GSI6SK", "#sv": "serverVersion"},
+)
+# GSI key repairs rewrite derived attributes only, without a new serverVersion
+REPAIR_UPDATE = UpdateBuilder()
+# META items (profile, settings) track updatedAt and a version counter for
+# ETags; callers supply ":now", ":zero" and ":one"
+META_UPDATE = UpdateBuilder(
+    ("#updatedAt = :now", "#version = if_not_exists(#version, :zero) + :one"),
+    {"#updatedAt": "updatedAt", "#version": "version"},
+)
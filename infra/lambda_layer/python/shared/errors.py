@@ -47,3 +47,25 @@ class ValidationError(Exception):
     @property
     def code(self):
         return "VALIDATION_ERROR"
+
+
+class InvalidCursorError(ValidationError):
+    """Raised when a pagination cursor is malformed or was tampered with."""
+
+    def __init__(self, message="Invalid pagination cursor"):
+        super().__init__(message)
+
+    @property
+    def code(self):
+        return "INVALID_CURSOR"
+
+
+class InvalidDateFormatError(ValidationError):
+    """Raised when a date parameter is not an ISO 8601 calendar date."""
+
+    def __init__(self, message="Invalid date format"):
+        super().__init__(message)
+
+    @property
+    def code(self):
+        return "INVALID_DATE_FORMAT"
@@ -0,0 +1,208 @@
+"""Coordinator/worker fan-out helpers for scheduled jobs.
+
+A job run is split into numbered segments. The coordinator either sends one
+SQS message per segment or, when no queue is configured, runs the segments on
+a local thread pool. Workers record a checkpoint item per segment after every
+page, so a run that times out resumes where it stopped instead of restarting.
+
+Checkpoint items live in the main table:
+    PK = JOB#<jobName>    SK = RUN#<runId>#SEG#<segment>
+"""
+
+import json
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+CHECKPOINT_TTL_SECONDS = 7 * 86400
+DEFAULT_RESERVE_MS = 10000
+DISPATCH_MAX_ATTEMPTS = 3
+BASE_BACKOFF_SECONDS = 0.1
+
+
+class SegmentTimeout(Exception):
+    """Raised when a worker stops early to avoid hitting the Lambda timeout."""
+
+
+class SegmentDispatchError(Exception):
+    """Raised when SQS keeps rejecting the messages for some segments."""
+
+
+def build_job_pk(job_name):
+    """Build the partition key for a job's checkpoint items."""
+    return f"JOB#{job_name}"
+
+
+def build_segment_sk(run_id, segment):
+    """Build the sort key for one segment of a job run."""
+    return f"RUN#{run_id}#SEG#{segment:04d}"
+
+
+def get_run_id(event):
+    """Derive a run ID from a scheduled event so retries share checkpoints.
+
+    EventBridge sets ``time`` to the scheduled time, which is identical for
+    retries of the same run. Manual invocations can pass ``runId`` to resume a
+    run; without one they get a fresh ID, so a second run on the same day
+    does not find the first run's segments already done.
+    """
+    event = event or {}
+    if event.get("runId"):
+        return event["runId"]
+    if event.get("time"):
+        return event["time"][:10]
+    return uuid.uuid4().hex
+
+
+def load_checkpoint(table, job_name, run_id, segment):
+    """Return the checkpoint item for a segment, or None if it has not started."""
+    resp = table.get_item(
+        Key={"PK": build_job_pk(job_name), "SK": build_segment_sk(run_id, segment)},
+        ConsistentRead=True,
+    )
+    return resp.get("Item")
+
+
+def save_checkpoint(table, job_name, run_id, segment, cursor, counters, done=False):
+    """Persist a segment's cursor and counters after a page is processed."""
+    item = {
+        "PK": build_job_pk(job_name),
+        "SK": build_segment_sk(run_id, segment),
+        "counters": counters,
+        "done": done,
+        "updatedAt": datetime.now(timezone.utc).isoformat(),
+        "ttl": int(time.time()) + CHECKPOINT_TTL_SECONDS,
+    }
+    if cursor is not None:
+        item["cursor"] = cursor
+    table.put_item(Item=item)
+
+
+def has_time_left(context, reserve_ms=DEFAULT_RESERVE_MS):
+    """Return True if the invocation has more than reserve_ms left to run."""
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return True
+    return context.get_remaining_time_in_millis() > reserve_ms
+
+
+def scan_segment(table, segment, total_segments, params, start_key=None):
+    """Yield (items, last_evaluated_key) pages of one parallel Scan segment."""
+    scan_params = dict(params, Segment=segment, TotalSegments=total_segments)
+    if start_key:
+        scan_params["ExclusiveStartKey"] = start_key
+    while True:
+        resp = table.scan(**scan_params)
+        last_key = resp.get("LastEvaluatedKey")
+        yield resp.get("Items", []), last_key
+        if not last_key:
+            break
+        scan_params["ExclusiveStartKey"] = last_key
+
+
+def run_segment(table, job_name, run_id, segment, pages, process_page,
+                context=None, reserve_ms=DEFAULT_RESERVE_MS):
+    """Run one segment from its last checkpoint and return its counters.
+
+    ``pages(cursor)`` yields ``(items, next_cursor)`` tuples starting at the
+    checkpointed cursor, with ``next_cursor`` None on the last page.
+    ``process_page(items)`` handles a page and returns a dict of counters.
+    Raises SegmentTimeout if the invocation runs low on time; the checkpoint
+    is already saved at that point.
+    """
+    checkpoint = load_checkpoint(table, job_name, run_id, segment) or {}
+    counters = {k: int(v) for k, v in checkpoint.get("counters", {}).items()}
+    if checkpoint.get("done"):
+        return counters
+
+    done = False
+    for items, next_cursor in pages(checkpoint.get("cursor")):
+        for key, value in process_page(items).items():
+            counters[key] = counters.get(key, 0) + value
+        done = next_cursor is None
+        save_checkpoint(table, job_name, run_id, segment, next_cursor, counters, done)
+        if not done and not has_time_left(context, reserve_ms):
+            raise SegmentTimeout(f"{job_name} segment {segment} stopped early")
+
+    if not done:
+        save_checkpoint(table, job_name, run_id, segment, None, counters, True)
+    return counters
+
+
+def build_segment_message(job_name, run_id, segment, total_segments, extra=None):
+    """Build the SQS message body that hands one segment to a worker."""
+    return json.dumps({
+        **(extra or {}),
+        "job": job_name,
+        "runId": run_id,
+        "segment": segment,
+        "totalSegments": total_segments,
+    })
+
+
+def parse_segment_messages(event):
+    """Return the segment messages carried by an SQS event."""
+    return [json.loads(record["body"]) for record in event.get("Records", [])]
+
+
+def dispatch_segments(job_name, run_id, total_segments, worker, sqs_client=None,
+                      queue_url=None, max_workers=8, extra=None):
+    """Fan a job run out to workers.
+
+    With a queue URL, one message per segment (plus any ``extra`` fields) is
+    sent and an empty list is returned; the workers report their own results.
+    Entries SQS reports as failed are resent, and SegmentDispatchError is
+    raised if any are still failing after the last attempt. Without a queue,
+    ``worker`` is called with each segment number on a local thread pool and
+    the list of per-segment results is returned.
+    """
+    segments = list(range(total_segments))
+
+    if queue_url:
+        for i in range(0, len(segments), 10):
+            entries = [
+                {
+                    "Id": str(segment),
+                    "MessageBody": build_segment_message(
+                        job_name, run_id, segment, total_segments, extra
+                    ),
+                }
+                for segment in segments[i:i + 10]
+            ]
+            _send_entries(sqs_client, queue_url, entries, job_name)
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, total_segments)) as pool:
+        return list(pool.map(worker, segments))
+
+
+def _send_entries(sqs_client, queue_url, entries, job_name):
+    """Send one SendMessageBatch worth of entries, resending the failed ones."""
+    for attempt in range(DISPATCH_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(random.uniform(0, BASE_BACKOFF_SECONDS * (2 ** attempt)))
+        resp = sqs_client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        failed = {failure["Id"] for failure in resp.get("Failed", [])}
+        if not failed:
+            return
+        entries = [entry for entry in entries if entry["Id"] in failed]
+
+    raise SegmentDispatchError(
+        f"{job_name} segments {sorted(int(entry['Id']) for entry in entries)} "
+        "could not be queued"
+    )
+
+
+def requeue_segment(sqs_client, queue_url, message):
+    """Send a segment back to the queue so another invocation resumes it."""
+    sqs_client.send_message(QueueUrl=queue_url, MessageBody=json.dumps(message))
+
+
+def sum_counters(results):
+    """Add up the counter dicts returned by segment workers."""
+    totals = {}
+    for counters in results:
+        for key, value in (counters or {}).items():
+            totals[key] = totals.get(key, 0) + int(value)
+    return totals
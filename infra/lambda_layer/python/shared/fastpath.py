@@ -0,0 +1,287 @@
+"""Fast-path DynamoDB access on the low-level client.
+
+The boto3 resource layer converts every attribute through TypeSerializer /
+TypeDeserializer, which inspect each value with a chain of isinstance checks
+and build a Decimal for every number. This module replaces that with
+table-driven converters: values are marshalled by a dict lookup on their
+exact type, and unmarshalled by a dict lookup on the type tag, with integral
+numbers returned as int (everything else numeric as Decimal, as before).
+Attributes with a known type in RECEIPT_SCHEMA skip the lookup entirely.
+
+FastTable wraps a low-level client with the subset of the Table API the
+handlers use (get_item, put_item, update_item, delete_item, query, scan),
+accepting the same arguments — including boto3 condition objects — and
+returning plain Python items, so it is a drop-in replacement for
+``dynamodb.Table(name)`` on hot paths.
+"""
+
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+
+# Attribute types of the receipt item, used to skip per-value type dispatch
+RECEIPT_SCHEMA = {
+    "PK": "S",
+    "SK": "S",
+    "receiptId": "S",
+    "userId": "S",
+    "status": "S",
+    "createdAt": "S",
+    "updatedAt": "S",
+    "serverVersion": "N",
+    "displayName": "S",
+    "merchantName": "S",
+    "purchaseDate": "S",
+    "totalAmount": "N",
+    "currency": "S",
+    "category": "S",
+    "warrantyMonths": "N",
+    "warrantyExpiryDate": "S",
+    "notes": "S",
+    "tags": "L",
+    "imageKeys": "L",
+    "userEditedFields": "L",
+    "GSI1PK": "S",
+    "GSI1SK": "S",
+    "GSI2PK": "S",
+    "GSI2SK": "S",
+    "GSI3PK": "S",
+    "GSI3SK": "S",
+    "GSI4PK": "S",
+    "GSI5PK": "S",
+    "GSI5SK": "S",
+    "GSI6PK": "S",
+    "GSI6SK": "S",
+    "GSI7PK": "S",
+    "GSI7SK": "S",
+    "GSI8PK": "S",
+    "ttl": "N",
+}
+
+_EXPRESSION_KEYS = ("KeyConditionExpression", "FilterExpression", "ConditionExpression")
+
+
+# ---------------------------------------------------------------------------
+# Marshalling (Python -> DynamoDB JSON)
+# ---------------------------------------------------------------------------
+
+def _marshal_number(value):
+    return {"N": str(value)}
+
+
+def _marshal_float(value):
+    raise TypeError("Float types are not supported. Use Decimal types instead.")
+
+
+def _marshal_set(value):
+    if not value:
+        raise TypeError("Empty sets are not supported by DynamoDB")
+    sample = next(iter(value))
+    if isinstance(sample, str):
+        return {"SS": list(value)}
+    if isinstance(sample, (bytes, bytearray)):
+        return {"BS": [bytes(v) for v in value]}
+    return {"NS": [str(v) for v in value]}
+
+
+def _marshal_list(value):
+    return {"L": [marshal_value(v) for v in value]}
+
+
+def _marshal_map(value):
+    return {"M": {k: marshal_value(v) for k, v in value.items()}}
+
+
+_MARSHALLERS = {
+    str: lambda v: {"S": v},
+    bool: lambda v: {"BOOL": v},
+    int: _marshal_number,
+    Decimal: _marshal_number,
+    float: _marshal_float,
+    type(None): lambda v: {"NULL": True},
+    list: _marshal_list,
+    tuple: _marshal_list,
+    dict: _marshal_map,
+    set: _marshal_set,
+    frozenset: _marshal_set,
+    bytes: lambda v: {"B": v},
+    bytearray: lambda v: {"B": bytes(v)},
+}
+
+# Per-type marshallers that are only correct for a value of that exact type
+_SCHEMA_MARSHALLERS = {
+    "S": (str, _MARSHALLERS[str]),
+    "N": (int, _marshal_number),
+    "L": (list, _marshal_list),
+}
+
+
+def marshal_value(value):
+    """Convert one Python value to its DynamoDB JSON form."""
+    marshaller = _MARSHALLERS.get(type(value))
+    if marshaller is None:
+        # Subclasses (e.g. OrderedDict, IntEnum) take the slower path
+        for base, fallback in _MARSHALLERS.items():
+            if isinstance(value, base) and base is not bool:
+                return fallback(value)
+        raise TypeError(f"Unsupported type {type(value).__name__} for DynamoDB")
+    return marshaller(value)
+
+
+def marshal_item(item, schema=RECEIPT_SCHEMA):
+    """Convert a plain Python item to the low-level DynamoDB format."""
+    result = {}
+    for name, value in item.items():
+        hint = schema.get(name)
+        if hint is not None:
+            expected, marshaller = _SCHEMA_MARSHALLERS[hint]
+            if type(value) is expected:
+                result[name] = marshaller(value)
+                continue
+        result[name] = marshal_value(value)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Unmarshalling (DynamoDB JSON -> Python)
+# ---------------------------------------------------------------------------
+
+def _unmarshal_number(text):
+    if "." in text or "e" in text or "E" in text:
+        return Decimal(text)
+    return int(text)
+
+
+def _unmarshal_list(values):
+    return [unmarshal_value(v) for v in values]
+
+
+def _unmarshal_map(values):
+    return {k: unmarshal_value(v) for k, v in values.items()}
+
+
+_UNMARSHALLERS = {
+    "S": lambda v: v,
+    "N": _unmarshal_number,
+    "BOOL": lambda v: v,
+    "NULL": lambda v: None,
+    "L": _unmarshal_list,
+    "M": _unmarshal_map,
+    "SS": set,
+    "NS": lambda v: {_unmarshal_number(n) for n in v},
+    "B": bytes,
+    "BS": lambda v: {bytes(b) for b in v},
+}
+
+
+def unmarshal_value(raw):
+    """Convert one DynamoDB JSON value to a Python value."""
+    for tag, value in raw.items():
+        return _UNMARSHALLERS[tag](value)
+    raise ValueError("Empty DynamoDB attribute value")
+
+
+def unmarshal_item(raw, schema=RECEIPT_SCHEMA):
+    """Convert a low-level DynamoDB item to plain Python values."""
+    result = {}
+    for name, value in raw.items():
+        hint = schema.get(name)
+        if hint == "S":
+            text = value.get("S")
+            if text is not None:
+                result[name] = text
+                continue
+        result[name] = unmarshal_value(value)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Table facade
+# ---------------------------------------------------------------------------
+
+def _merge_placeholders(target, generated):
+    """Add placeholders generated for a condition object, refusing to overwrite."""
+    clash = target.keys() & generated.keys()
+    if clash:
+        raise ValueError(
+            f"Expression placeholders {sorted(clash)} are used both by the caller "
+            "and by a generated condition expression"
+        )
+    target.update(generated)
+
+
+class FastTable:
+    """Table-like access to one DynamoDB table through a low-level client."""
+
+    def __init__(self, client, table_name, schema=RECEIPT_SCHEMA):
+        self.client = client
+        self.name = table_name
+        self.schema = schema
+
+    @property
+    def exceptions(self):
+        """The client's modeled exceptions, e.g. ConditionalCheckFailedException."""
+        return self.client.exceptions
+
+    def get_item(self, **kwargs):
+        resp = self.client.get_item(**self._request(kwargs))
+        return self._response(resp)
+
+    def put_item(self, **kwargs):
+        resp = self.client.put_item(**self._request(kwargs))
+        return self._response(resp)
+
+    def update_item(self, **kwargs):
+        resp = self.client.update_item(**self._request(kwargs))
+        return self._response(resp)
+
+    def delete_item(self, **kwargs):
+        resp = self.client.delete_item(**self._request(kwargs))
+        return self._response(resp)
+
+    def query(self, **kwargs):
+        resp = self.client.query(**self._request(kwargs))
+        return self._response(resp)
+
+    def scan(self, **kwargs):
+        resp = self.client.scan(**self._request(kwargs))
+        return self._response(resp)
+
+    def _request(self, kwargs):
+        """Translate Table-style arguments into low-level client arguments."""
+        request = dict(kwargs, TableName=self.name)
+        names = dict(request.get("ExpressionAttributeNames") or {})
+        values = dict(request.get("ExpressionAttributeValues") or {})
+
+        builder = None
+        for key in _EXPRESSION_KEYS:
+            condition = request.get(key)
+            if isinstance(condition, ConditionBase):
+                builder = builder or ConditionExpressionBuilder()
+                built = builder.build_expression(
+                    condition, is_key_condition=key == "KeyConditionExpression"
+                )
+                request[key] = built.condition_expression
+                _merge_placeholders(names, built.attribute_name_placeholders)
+                _merge_placeholders(values, built.attribute_value_placeholders)
+
+        if names:
+            request["ExpressionAttributeNames"] = names
+        if values:
+            request["ExpressionAttributeValues"] = {
+                k: marshal_value(v) for k, v in values.items()
+            }
+        for key in ("Key", "Item", "ExclusiveStartKey"):
+            if key in request:
+                request[key] = marshal_item(request[key], self.schema)
+        return request
+
+    def _response(self, resp):
+        """Unmarshal the items in a low-level response, keeping its shape."""
+        schema = self.schema
+        if "Items" in resp:
+            resp["Items"] = [unmarshal_item(raw, schema) for raw in resp["Items"]]
+        for key in ("Item", "Attributes", "LastEvaluatedKey"):
+            if key in resp:
+                resp[key] = unmarshal_item(resp[key], schema)
+        return resp
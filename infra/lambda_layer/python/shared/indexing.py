@@ -0,0 +1,280 @@
+"""Derived attributes of a receipt item: warranty expiry and every GSI key.
+
+Each write path derives these from the receipt's own fields here instead of
+setting index keys by hand, so an index cannot fall out of step with the
+data it sorts or filters on:
+
+    warrantyExpiryDate  purchaseDate + warrantyMonths (client value kept when
+                        warrantyMonths is absent; removed when it is 0)
+    GSI1PK / GSI1SK     ByUserDate        USER#<id> / purchaseDate
+    GSI2PK / GSI2SK     ByUserCategory    USER#<id> / CAT#<category>
+    GSI3PK / GSI3SK     ByUserStore       USER#<id> / STORE#<merchantName>
+    GSI4PK              ByWarrantyExpiry  USER#<id>#ACTIVE, active receipts
+                                          with a warranty only
+    GSI5PK / GSI5SK     ByUserStatus      USER#<id> / STATUS#<status>#<date>
+    GSI6PK / GSI6SK     ByUpdatedAt       USER#<id> / updatedAt
+    GSI7PK / GSI7SK     ByExpiryDate      EXPIRY#<date>#<shard> / USER#<id>
+    GSI8PK              ByUserListView    USER#<id>, non-deleted receipts only
+
+A derived value of None means the attribute must be absent, which is how
+the sparse indexes drop an item.
+
+Repairs of stored items come in two kinds. Fixing GSI keys alone changes
+nothing a client sees, so it is written without a new serverVersion. A
+repair that changes warrantyExpiryDate is a change to the receipt: it is
+written like any receipt update (serverVersion, updatedAt and GSI6SK
+bumped) and folded into the sync tree and stats, so devices pull it.
+"""
+
+import calendar
+import datetime
+import json
+import logging
+import time
+
+from botocore.exceptions import ClientError
+
+from shared.dynamodb import (
+    RECEIPT_UPDATE,
+    REPAIR_UPDATE,
+    build_expiry_pk,
+    expiry_shard,
+    extract_receipt_id,
+    extract_user_id,
+)
+from shared.stats import record_stats
+from shared.streams import derived_views_inline
+from shared.synctree import record_version
+
+logger = logging.getLogger()
+
+INDEX_ATTRIBUTES = (
+    "GSI1PK", "GSI1SK", "GSI2PK", "GSI2SK", "GSI3PK", "GSI3SK", "GSI4PK",
+    "GSI5PK", "GSI5SK", "GSI6PK", "GSI6SK", "GSI7PK", "GSI7SK", "GSI8PK",
+)
+DERIVED_ATTRIBUTES = ("warrantyExpiryDate",) + INDEX_ATTRIBUTES
+
+# RECEIPT_UPDATE moves GSI6SK to the write time on every update
+_UPDATE_MANAGED = frozenset({"GSI6SK"})
+
+
+def compute_warranty_expiry(purchase_date, warranty_months):
+    """Return purchase_date + warranty_months as YYYY-MM-DD, or None.
+
+    The day is clamped to the end of a shorter month (2026-01-31 + 1 month
+    is 2026-02-28). None when there is no warranty or the inputs are invalid.
+    """
+    try:
+        months = int(warranty_months)
+        start = datetime.date.fromisoformat(str(purchase_date)[:10])
+    except (TypeError, ValueError):
+        return None
+    if months <= 0:
+        return None
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    if year > datetime.MAXYEAR:
+        return None
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return datetime.date(year, month, day).isoformat()
+
+
+def derive_attributes(item):
+    """Return ``{name: value or None}`` for every derived attribute of a receipt."""
+    pk = item["PK"]
+    receipt_id = item.get("receiptId") or extract_receipt_id(item["SK"])
+    status = item.get("status", "active")
+    purchase_date = item.get("purchaseDate")
+
+    if item.get("warrantyMonths") is not None:
+        expiry = compute_warranty_expiry(purchase_date, item["warrantyMonths"])
+    else:
+        expiry = item.get("warrantyExpiryDate") or None
+
+    derived = dict.fromkeys(DERIVED_ATTRIBUTES)
+    derived["warrantyExpiryDate"] = expiry
+    if purchase_date:
+        derived["GSI1PK"] = pk
+        derived["GSI1SK"] = purchase_date
+        derived["GSI5PK"] = pk
+        derived["GSI5SK"] = f"STATUS#{status}#{purchase_date}"
+    if item.get("category"):
+        derived["GSI2PK"] = pk
+        derived["GSI2SK"] = f"CAT#{item['category']}"
+    if item.get("merchantName"):
+        derived["GSI3PK"] = pk
+        derived["GSI3SK"] = f"STORE#{item['merchantName']}"
+    if expiry:
+        if status == "active":
+            derived["GSI4PK"] = f"{pk}#ACTIVE"
+        derived["GSI7PK"] = build_expiry_pk(expiry, expiry_shard(receipt_id))
+        derived["GSI7SK"] = pk
+    if item.get("updatedAt"):
+        derived["GSI6PK"] = pk
+        derived["GSI6SK"] = item["updatedAt"]
+    if status != "deleted":
+        derived["GSI8PK"] = pk
+    return derived
+
+
+def with_derived_attributes(item):
+    """Return a copy of a full receipt item with its derived attributes applied."""
+    result = dict(item)
+    for name, value in derive_attributes(item).items():
+        if value is None:
+            result.pop(name, None)
+        else:
+            result[name] = value
+    return result
+
+
+def index_update(current, fields, remove=()):
+    """Extend an update of ``current`` so its derived attributes stay correct.
+
+    ``fields`` are the attributes the caller SETs and ``remove`` those it
+    REMOVEs. Returns ``(fields, remove)`` with derived attributes that change
+    added (or overridden, when the caller supplied a stale value) and those
+    that must disappear moved to ``remove``. Derived names are appended in a
+    fixed order, so UpdateBuilder sees a stable field tuple per shape.
+    """
+    merged = {**current, **fields}
+    for name in remove:
+        merged.pop(name, None)
+
+    fields = dict(fields)
+    remove = list(remove)
+    for name, value in derive_attributes(merged).items():
+        if name in _UPDATE_MANAGED:
+            continue
+        if value is None:
+            fields.pop(name, None)
+            if name in current and name not in remove:
+                remove.append(name)
+        elif merged.get(name) != value:
+            fields[name] = value
+    return fields, remove
+
+
+def repair_update(item):
+    """Return ``(fields, remove)`` that fix a stored item's derived attributes.
+
+    Unlike index_update, GSI6SK is compared too: a repair does not go through
+    RECEIPT_UPDATE, so nothing else keeps it equal to updatedAt.
+    """
+    fields = {}
+    remove = []
+    for name, value in derive_attributes(item).items():
+        if value is None:
+            if name in item:
+                remove.append(name)
+        elif item.get(name) != value:
+            fields[name] = value
+    return fields, remove
+
+
+def repair_item(table, item):
+    """Rewrite a stored receipt's derived attributes if any are wrong.
+
+    The write is conditional on the item's serverVersion, so a receipt that
+    changed since ``item`` was read is left to the newer write, which
+    derived its own attributes. A repair that changes warrantyExpiryDate
+    bumps serverVersion (see the module docstring). Returns True if the
+    item was updated.
+    """
+    fields, remove = repair_update(item)
+    if not fields and not remove:
+        return False
+    if "warrantyExpiryDate" in fields or "warrantyExpiryDate" in remove:
+        return _repair_as_update(table, item, fields, remove)
+
+    update_expr, expr_names, expr_values = REPAIR_UPDATE.build(fields, remove)
+    expr_names["#sv"] = "serverVersion"
+    if "serverVersion" in item:
+        condition = "#sv = :expectedVersion"
+        expr_values[":expectedVersion"] = item["serverVersion"]
+    else:
+        condition = "attribute_exists(PK) AND attribute_not_exists(#sv)"
+
+    kwargs = {
+        "Key": {"PK": item["PK"], "SK": item["SK"]},
+        "UpdateExpression": update_expr,
+        "ExpressionAttributeNames": expr_names,
+        "ConditionExpression": condition,
+    }
+    if expr_values:
+        kwargs["ExpressionAttributeValues"] = expr_values
+    try:
+        table.update_item(**kwargs)
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
+
+
+def _repair_as_update(table, item, fields, remove):
+    """Write a repair that changes warrantyExpiryDate as a receipt update."""
+    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    # The write sets updatedAt, so GSI-6 keys follow it rather than the item
+    fields = {name: value for name, value in fields.items() if name not in ("GSI6PK", "GSI6SK")}
+    remove = [name for name in remove if name not in ("GSI6PK", "GSI6SK")]
+    if item.get("GSI6PK") != item["PK"]:
+        fields["GSI6PK"] = item["PK"]
+
+    if "serverVersion" in item:
+        update_expr, expr_names, expr_values = RECEIPT_UPDATE.build(fields, remove)
+        expr_values.update({
+            ":now": now_iso,
+            ":one": 1,
+            ":expectedVersion": item["serverVersion"],
+        })
+        condition = "#sv = :expectedVersion"
+    else:
+        fields.update({"updatedAt": now_iso, "GSI6SK": now_iso, "serverVersion": 1})
+        update_expr, expr_names, expr_values = REPAIR_UPDATE.build(fields, remove)
+        expr_names["#sv"] = "serverVersion"
+        condition = "attribute_exists(PK) AND attribute_not_exists(#sv)"
+
+    try:
+        resp = table.update_item(
+            Key={"PK": item["PK"], "SK": item["SK"]},
+            UpdateExpression=update_expr,
+            ExpressionAttributeNames=expr_names,
+            ExpressionAttributeValues=expr_values,
+            ConditionExpression=condition,
+            ReturnValues="ALL_NEW",
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+
+    # ``item`` may be a projection; only warrantyExpiryDate moved the stats
+    new_item = resp["Attributes"]
+    old_item = dict(new_item)
+    old_item.pop("warrantyExpiryDate", None)
+    if item.get("warrantyExpiryDate"):
+        old_item["warrantyExpiryDate"] = item["warrantyExpiryDate"]
+    record_repair(table, old_item, new_item)
+    return True
+
+
+def record_repair(table, old_item, new_item):
+    """Fold a repair that bumped serverVersion into the sync tree and stats.
+
+    Like any receipt write, this is left to the stream processor under
+    DERIVED_VIEWS_MODE "stream", and a failure only makes the views drift.
+    """
+    if not derived_views_inline():
+        return
+    receipt_id = new_item.get("receiptId") or extract_receipt_id(new_item["SK"])
+    try:
+        record_version(
+            table, extract_user_id(new_item["PK"]), receipt_id, new_item["serverVersion"]
+        )
+    except Exception:
+        logger.exception(json.dumps({"action": "sync_tree_update_failed", "receipt_id": receipt_id}))
+    try:
+        record_stats(table, old_item, new_item, new_item["updatedAt"])
+    except Exception:
+        logger.exception(json.dumps({"action": "stats_update_failed", "receipt_id": receipt_id}))
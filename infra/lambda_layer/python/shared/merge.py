@@ -0,0 +1,83 @@
+"""Compiled field-level merge for sync pushes.
+
+A MergePlan turns the conflict resolution tiers into one dict lookup per
+field. Merging only walks the fields the client sent: a field the client
+omits (or sends as null) can only resolve to the server value, which never
+needs writing, so server-only attributes are never visited.
+
+Rules:
+    SERVER       server value wins silently (e.g. LLM-extracted fields)
+    CLIENT       client value wins
+    CONDITIONAL  client wins if the field is in the client's userEditedFields
+    SKIP         never merged (keys, server-managed attributes)
+    anything else: server wins and the differing client value is reported
+    as a conflict
+"""
+
+SKIP = 0
+SERVER = 1
+CLIENT = 2
+CONDITIONAL = 3
+SERVER_DEFAULT = 4
+
+_USER_EDITED = "userEditedFields"
+
+
+class MergePlan:
+    """Per-field dispatch table built once from the tier sets."""
+
+    def __init__(self, server_wins=(), client_wins=(), conditional=(), skip=()):
+        rules = {}
+        for fields, rule in (
+            (server_wins, SERVER),
+            (client_wins, CLIENT),
+            (conditional, CONDITIONAL),
+            (skip, SKIP),
+        ):
+            for field in fields:
+                rules[field] = rule
+        rules[_USER_EDITED] = SKIP
+        self._rules = rules
+
+    def rule_for(self, field):
+        """Return the rule applied to a field."""
+        return self._rules.get(field, SERVER_DEFAULT)
+
+    def merge(self, client_item, server_item):
+        """Merge one client item into the server item.
+
+        Returns ``(write_fields, conflicts)``: the fields whose merged value
+        differs from the server and must be written, and the conflicts to
+        report for fields resolved by the server-wins default.
+        """
+        rules_get = self._rules.get
+        write_fields = {}
+        conflicts = []
+        edited = None
+
+        for field, client_val in client_item.items():
+            if client_val is None:
+                continue
+            rule = rules_get(field, SERVER_DEFAULT)
+            if rule == SKIP or rule == SERVER:
+                continue
+            server_val = server_item.get(field)
+            if client_val == server_val:
+                continue
+
+            if rule == CLIENT:
+                write_fields[field] = client_val
+            elif rule == CONDITIONAL:
+                if edited is None:
+                    edited = set(client_item.get(_USER_EDITED) or ())
+                if field in edited:
+                    write_fields[field] = client_val
+            else:
+                conflicts.append({
+                    "field": field,
+                    "clientValue": client_val,
+                    "serverValue": server_val,
+                    "resolution": "server_wins_default",
+                })
+
+        return write_fields, conflicts
@@ -0,0 +1,165 @@
+"""Batched SNS publishing with batched DynamoDB marker writes.
+
+NotificationBatcher groups messages into SNS PublishBatch calls (10 per call)
+and, as soon as each call returns, writes the DynamoDB updates that mark its
+accepted messages as sent. Marker updates are written with TransactWriteItems,
+since BatchWriteItem cannot express partial updates. Failed entries and
+throttled calls are retried on their own, and a marker is never held back
+behind later work, so messages that already succeeded are never sent twice.
+"""
+
+import json
+import random
+import time
+
+from botocore.exceptions import ClientError
+
+SNS_BATCH_SIZE = 10
+DEFAULT_MAX_ATTEMPTS = 3
+BASE_BACKOFF_SECONDS = 0.1
+
+_RETRYABLE_PUBLISH_CODES = frozenset({
+    "Throttling",
+    "ThrottlingException",
+    "Throttled",
+    "InternalError",
+    "InternalFailure",
+    "ServiceUnavailable",
+})
+
+
+class NotificationBatcher:
+    """Buffer notifications and publish them in batches, marking each batch as sent."""
+
+    def __init__(self, sns_client, topic_arn, dynamodb_client,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.sns_client = sns_client
+        self.topic_arn = topic_arn
+        self.dynamodb_client = dynamodb_client
+        self.max_attempts = max_attempts
+
+        self._pending_messages = []
+        self._next_id = 0
+        self._started_at = None
+
+        self.messages_sent = 0
+        self.messages_failed = 0
+        self.updates_written = 0
+        self.publish_calls = 0
+        self.write_calls = 0
+
+    def add(self, message, attributes=None, update=None):
+        """Queue a message, plus an optional Update action to apply once it is sent.
+
+        ``update`` uses the TransactWriteItems ``Update`` shape: TableName, Key,
+        UpdateExpression and the expression attribute maps.
+        """
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+
+        self._pending_messages.append({
+            "Id": str(self._next_id),
+            "Message": json.dumps(message, default=str),
+            "MessageAttributes": attributes or {},
+            "update": update,
+        })
+        self._next_id += 1
+
+        if len(self._pending_messages) >= SNS_BATCH_SIZE:
+            self._publish(self._pending_messages)
+            self._pending_messages = []
+
+    def flush(self):
+        """Publish everything still buffered."""
+        if self._pending_messages:
+            self._publish(self._pending_messages)
+            self._pending_messages = []
+
+    def stats(self):
+        """Return throughput counters for everything flushed so far."""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0
+        unbatched_calls = self.messages_sent + self.updates_written
+        return {
+            "messagesSent": self.messages_sent,
+            "messagesFailed": self.messages_failed,
+            "publishCalls": self.publish_calls,
+            "writeCalls": self.write_calls,
+            "apiCallsSaved": unbatched_calls - self.publish_calls - self.write_calls,
+            "messagesPerSecond": round(self.messages_sent / elapsed, 2) if elapsed else 0,
+        }
+
+    def _publish(self, entries):
+        """Publish entries with PublishBatch, retrying only retryable failures.
+
+        The markers of each call's accepted messages are written before the
+        next attempt, so an exception later on cannot lose them.
+        """
+        for attempt in range(self.max_attempts):
+            if attempt:
+                _backoff(attempt)
+
+            try:
+                resp = self.sns_client.publish_batch(
+                    TopicArn=self.topic_arn,
+                    PublishBatchRequestEntries=[
+                        {
+                            "Id": entry["Id"],
+                            "Message": entry["Message"],
+                            "MessageAttributes": entry["MessageAttributes"],
+                        }
+                        for entry in entries
+                    ],
+                )
+            except ClientError as exc:
+                code = exc.response.get("Error", {}).get("Code")
+                if code not in _RETRYABLE_PUBLISH_CODES or attempt == self.max_attempts - 1:
+                    raise
+                self.publish_calls += 1
+                continue
+            self.publish_calls += 1
+
+            succeeded = {s["Id"] for s in resp.get("Successful", [])}
+            retryable = set()
+            for failure in resp.get("Failed", []):
+                if failure.get("SenderFault"):
+                    self.messages_failed += 1
+                else:
+                    retryable.add(failure["Id"])
+
+            updates = []
+            for entry in entries:
+                if entry["Id"] in succeeded:
+                    self.messages_sent += 1
+                    if entry["update"]:
+                        updates.append(entry["update"])
+            if updates:
+                self._write_updates(updates)
+
+            entries = [entry for entry in entries if entry["Id"] in retryable]
+            if not entries:
+                return
+
+        self.messages_failed += len(entries)
+
+    def _write_updates(self, updates):
+        """Apply marker updates in one transaction, falling back to single writes."""
+        try:
+            self.dynamodb_client.transact_write_items(
+                TransactItems=[{"Update": update} for update in updates],
+            )
+            self.write_calls += 1
+            self.updates_written += len(updates)
+            return
+        except self.dynamodb_client.exceptions.TransactionCanceledException:
+            self.write_calls += 1
+
+        # A cancelled transaction writes nothing — apply each update on its own
+        for update in updates:
+            self.dynamodb_client.update_item(**update)
+            self.write_calls += 1
+            self.updates_written += 1
+
+
+def _backoff(attempt):
+    """Sleep with exponential backoff and full jitter."""
+    time.sleep(random.uniform(0, BASE_BACKOFF_SECONDS * (2 ** attempt)))
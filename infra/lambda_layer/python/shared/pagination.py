@@ -0,0 +1,86 @@
+"""Opaque pagination cursors.
+
+A cursor is a JSON object (typically a DynamoDB LastEvaluatedKey plus any
+state the endpoint needs to continue) encoded as URL-safe Base64. Clients
+must treat it as opaque and pass it back unchanged.
+
+Signed cursors append a truncated HMAC-SHA256 of the payload, so a client
+cannot edit the key or state inside one (e.g. to point ExclusiveStartKey at
+another user's partition). The signing key is CURSOR_SIGNING_KEY if set,
+otherwise the secret named by CURSOR_SECRET_ARN, fetched once per container.
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+from decimal import Decimal
+
+from shared.clients import lazy_client
+from shared.errors import InvalidCursorError
+
+CURSOR_SIGNING_KEY = os.environ.get("CURSOR_SIGNING_KEY", "")
+CURSOR_SECRET_ARN = os.environ.get("CURSOR_SECRET_ARN", "")
+SIGNATURE_BYTES = 16
+
+secrets_client = lazy_client("secretsmanager")
+
+_signing_key = None
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _get_signing_key():
+    global _signing_key
+    if _signing_key is None:
+        secret = CURSOR_SIGNING_KEY
+        if not secret:
+            if not CURSOR_SECRET_ARN:
+                raise RuntimeError("CURSOR_SIGNING_KEY or CURSOR_SECRET_ARN must be set")
+            secret = secrets_client.get_secret_value(SecretId=CURSOR_SECRET_ARN)["SecretString"]
+        _signing_key = secret.encode("utf-8")
+    return _signing_key
+
+
+def _signature(payload):
+    digest = hmac.new(_get_signing_key(), payload.encode("ascii"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:SIGNATURE_BYTES]).decode("ascii").rstrip("=")
+
+
+def encode_cursor(state, signed=False):
+    """Encode a cursor state dict as an opaque string."""
+    raw = json.dumps(state, separators=(",", ":"), sort_keys=True, default=_json_default)
+    cursor = base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+    if signed:
+        cursor = f"{cursor}.{_signature(cursor)}"
+    return cursor
+
+
+def decode_cursor(cursor, signed=False):
+    """Decode a cursor produced by encode_cursor().
+
+    Raises InvalidCursorError if the value is not a cursor, or if ``signed``
+    is set and its signature does not match.
+    """
+    if signed:
+        payload, _, signature = str(cursor).rpartition(".")
+        try:
+            valid = bool(payload) and hmac.compare_digest(signature, _signature(payload))
+        except (TypeError, UnicodeError):
+            valid = False
+        if not valid:
+            raise InvalidCursorError()
+        cursor = payload
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (AttributeError, UnicodeError, binascii.Error, ValueError):
+        raise InvalidCursorError()
+    if not isinstance(state, dict):
+        raise InvalidCursorError()
+    return state
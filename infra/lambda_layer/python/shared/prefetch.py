@@ -0,0 +1,49 @@
+"""Bounded, order-preserving concurrent prefetch.
+
+ordered_prefetch fetches items on a thread pool ahead of the consumer and
+yields the results in input order. The number of bytes held by fetched but
+not yet consumed results is capped by a memory budget, so a slow consumer
+(for example a ZIP writer uploading parts) applies backpressure instead of
+letting downloads pile up in memory.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+_END = object()
+
+
+def ordered_prefetch(tasks, fetch, size_of, max_workers=DEFAULT_MAX_WORKERS,
+                     memory_budget=DEFAULT_MEMORY_BUDGET):
+    """Yield ``(task, fetch(task))`` pairs in the order of ``tasks``.
+
+    ``size_of(task)`` estimates the bytes a result will hold. New fetches are
+    started only while the in-flight total stays within ``memory_budget``;
+    a single task larger than the budget is still fetched on its own.
+    """
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    in_flight = 0
+    task_iter = iter(tasks)
+    next_task = next(task_iter, _END)
+
+    try:
+        while pending or next_task is not _END:
+            while (
+                next_task is not _END
+                and len(pending) < max_workers * 2
+                and (not pending or in_flight + size_of(next_task) <= memory_budget)
+            ):
+                pending.append((next_task, pool.submit(fetch, next_task)))
+                in_flight += size_of(next_task)
+                next_task = next(task_iter, _END)
+
+            task, future = pending.popleft()
+            yield task, future.result()
+            # The consumer is done with the result once it asks for the next one
+            in_flight -= size_of(task)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -1,20 +1,42 @@
-"""API Gateway proxy response builders with CORS headers."""
+"""API Gateway proxy response builders with CORS headers.
 
+GET handlers whose data carries a version can answer conditionally: build an
+ETag from the version with ``make_etag`` and return ``conditional(event, body,
+etag)``, which answers 304 Not Modified without serializing the body when the
+request's If-None-Match already names that ETag.
+"""
+
+import hashlib
 import json
+from decimal import Decimal
 
 _CORS_HEADERS = {
     "Access-Control-Allow-Origin": "*",
-    "Access-Control-Allow-Headers": "Content-Type,Authorization,X-Amz-Date,X-Api-Key,X-Amz-Security-Token",
+    "Access-Control-Allow-Headers": "Content-Type,Authorization,X-Amz-Date,X-Api-Key,X-Amz-Security-Token,If-None-Match",
     "Access-Control-Allow-Methods": "GET,POST,PUT,PATCH,DELETE,OPTIONS",
+    "Access-Control-Expose-Headers": "ETag",
 }
 
+# Responses are per user: shared caches must not store them, and clients
+# revalidate with If-None-Match once max-age has passed
+DEFAULT_CACHE_MAX_AGE = 0
+
+
+def _json_default(value):
+    """Serialize DynamoDB Decimals as plain JSON numbers."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, set):
+        return sorted(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
 
 def success(body, status_code=200):
     """Return a JSON success response with CORS headers."""
     return {
         "statusCode": status_code,
         "headers": {**_CORS_HEADERS, "Content-Type": "application/json"},
-        "body": json.dumps(body),
+        "body": json.dumps(body, default=_json_default),
     }
 
 
@@ -32,6 +54,11 @@ def created(body):
     return success(body, status_code=201)
 
 
+def accepted(body):
+    """Return a 202 Accepted JSON response with CORS headers."""
+    return success(body, status_code=202)
+
+
 def no_content():
     """Return a 204 No Content response with CORS headers."""
     return {
@@ -39,3 +66,55 @@ def no_content():
         "headers": _CORS_HEADERS,
         "body": "",
     }
+
+
+def make_etag(*parts):
+    """Build a weak ETag from the values that identify a representation.
+
+    Pass the resource identity and its version (serverVersion, version or
+    updatedAt); the tag changes whenever any part does.
+    """
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8"))
+    return f'W/"{digest.hexdigest()[:16]}"'
+
+
+def etag_matches(event, etag):
+    """Return True if the request's If-None-Match names ``etag`` (weak comparison)."""
+    headers = (event or {}).get("headers") or {}
+    header = next(
+        (value for name, value in headers.items() if name.lower() == "if-none-match"),
+        None,
+    )
+    if not header:
+        return False
+    opaque = etag.removeprefix("W/")
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def _cache_headers(etag, max_age):
+    return {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={max_age}, must-revalidate",
+    }
+
+
+def not_modified(etag, max_age=DEFAULT_CACHE_MAX_AGE):
+    """Return a 304 Not Modified response with CORS and cache headers."""
+    return {
+        "statusCode": 304,
+        "headers": {**_CORS_HEADERS, **_cache_headers(etag, max_age)},
+        "body": "",
+    }
+
+
+def conditional(event, body, etag, max_age=DEFAULT_CACHE_MAX_AGE):
+    """Return 304 if the client already has ``etag``, else 200 with the body."""
+    if etag_matches(event, etag):
+        return not_modified(etag, max_age)
+    response = success(body)
+    response["headers"].update(_cache_headers(etag, max_age))
+    return response
@@ -0,0 +1,144 @@
+"""Streaming writes to S3 through a multipart upload.
+
+S3MultipartWriter is a write-only, non-seekable file object. Bytes written to
+it are buffered until a full part is available and then uploaded with
+UploadPart, so memory use is bounded by the part size no matter how large the
+object grows. Python's zipfile writes to it directly (using data descriptors,
+since the stream cannot seek), which lets a ZIP be built without staging it
+in /tmp.
+"""
+
+import io
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """File-like writer that streams into an S3 multipart upload."""
+
+    def __init__(self, s3_client, bucket, key, part_size=DEFAULT_PART_SIZE,
+                 content_type="application/octet-stream", resume_state=None,
+                 resume_buffer=b""):
+        """Start a new multipart upload, or continue one from checkpoint().
+
+        ``resume_state`` and ``resume_buffer`` are the two values returned by
+        checkpoint() in an earlier invocation.
+        """
+        super().__init__()
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+
+        self._buffer = bytearray(resume_buffer)
+        self._completed = False
+
+        if resume_state:
+            self.upload_id = resume_state["uploadId"]
+            self._parts = list(resume_state["parts"])
+            self._position = int(resume_state["position"])
+            return
+
+        self._parts = []
+        self._position = 0
+        resp = s3_client.create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType=content_type
+        )
+        self.upload_id = resp["UploadId"]
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed S3MultipartWriter")
+
+        self._buffer.extend(data)
+        self._position += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def close(self):
+        """Upload the final part and complete the multipart upload."""
+        if self.closed:
+            return
+        try:
+            if self._buffer or not self._parts:
+                self._upload_part(bytes(self._buffer))
+                self._buffer.clear()
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+            self._completed = True
+        finally:
+            super().close()
+
+    def checkpoint(self):
+        """Return ``(state, buffer)`` needed to resume this upload later.
+
+        ``state`` is JSON-serializable; ``buffer`` holds the bytes written
+        since the last uploaded part. The writer must not be used afterwards.
+        """
+        state = {
+            "uploadId": self.upload_id,
+            "parts": list(self._parts),
+            "position": self._position,
+        }
+        return state, bytes(self._buffer)
+
+    def abort(self):
+        """Abort the upload and discard any parts already sent."""
+        if self._completed:
+            return
+        self._buffer.clear()
+        self.s3_client.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+        )
+        super().close()
+
+    def release(self):
+        """Stop writing but leave the upload open, to be resumed from a checkpoint."""
+        self._buffer.clear()
+        super().close()
+
+    def __del__(self):
+        # Never complete an upload implicitly during garbage collection
+        pass
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+        return False
+
+    @property
+    def parts_uploaded(self):
+        return len(self._parts)
+
+    def _upload_part(self, body):
+        part_number = len(self._parts) + 1
+        if part_number > MAX_PARTS:
+            raise ValueError("Multipart upload exceeds the S3 part limit")
+
+        resp = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        self._parts.append({"PartNumber": part_number, "ETag": resp["ETag"]})
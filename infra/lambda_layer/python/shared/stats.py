@@ -0,0 +1,341 @@
+"""Per-user aggregate statistics, kept up to date on every receipt write.
+
+One META item per user holds counters that would otherwise need a query
+over all of the user's receipts:
+
+    PK = USER#<userId>    SK = META#STATS
+
+    receipts                      non-deleted receipts
+    status#<status>               receipts per status
+    category#<category>           receipts per category
+    spend#<YYYY-MM>#<currency>    sum of totalAmount by purchase month
+    warranties                    active receipts with a warranty expiry
+    warrantyValue#<currency>      sum of totalAmount of those receipts
+    expiry#<YYYY-MM>              how many of those expire in the month
+    version, updatedAt            bumped by every change (for ETags)
+
+The per-store counters, one per merchant name, would grow the stats item
+with every new merchant, so they live on a second item that is only read
+by GET /user/bootstrap:
+
+    PK = USER#<userId>    SK = META#STATS#STORES
+
+    store#<merchantName>          receipts per store (name cut to 64 chars)
+    updatedAt
+
+Attribute names are flat so that a single ADD can create any counter.
+Soft-deleted receipts contribute nothing, so their later TTL removal
+needs no correction.
+
+Each write path passes the receipt as it was and as it is now.
+``stats_delta`` turns that into counter differences, which are ADDed
+without a read, so concurrent writers commute. Deltas only apply to an
+existing item. The stream processor creates both items empty when a new
+user's first receipt is written (``start_stats``), before that receipt's
+delta is applied. For users whose receipts predate the items, the index
+backfill and the weekly summary call ``load_stats``, which builds them
+once from a Query of the receipts and so counts every earlier write. A
+write that lands between that Query and the item's creation is missed;
+run ``rebuild_stats(..., overwrite=True)`` to correct any drift.
+
+An ADD leaves a counter at 0 rather than removing it, and expiry months
+stop mattering once they have passed. ``prune_stats`` REMOVEs both, each
+zero counter on condition that it is still 0; a late ADD to a removed
+past month only recreates it until the next prune.
+"""
+
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from shared.dynamodb import build_pk, build_stats_sk, build_store_stats_sk, extract_user_id
+
+RECEIPT_ATTRIBUTES = (
+    "status", "category", "merchantName", "purchaseDate", "totalAmount",
+    "currency", "warrantyExpiryDate",
+)
+
+EXPIRY_PREFIX = "expiry#"
+STORE_PREFIX = "store#"
+WARRANTY_VALUE_PREFIX = "warrantyValue#"
+STORE_NAME_LENGTH = 64
+# Attributes removed by one prune UpdateItem
+PRUNE_BATCH_SIZE = 100
+
+
+def _amount(value):
+    try:
+        return Decimal(str(value))
+    except (ArithmeticError, ValueError, TypeError):
+        return Decimal(0)
+
+
+def receipt_contribution(item):
+    """Return the counters one receipt item adds to its owner's stats."""
+    if not item or item.get("status", "active") == "deleted":
+        return {}
+
+    status = item.get("status", "active")
+    currency = item.get("currency") or "EUR"
+    amount = _amount(item.get("totalAmount", 0))
+    counters = {"receipts": 1, f"status#{status}": 1}
+    if item.get("category"):
+        counters[f"category#{item['category']}"] = 1
+    if item.get("merchantName"):
+        counters[f"{STORE_PREFIX}{str(item['merchantName'])[:STORE_NAME_LENGTH]}"] = 1
+    if item.get("purchaseDate") and amount:
+        counters[f"spend#{str(item['purchaseDate'])[:7]}#{currency}"] = amount
+    expiry = item.get("warrantyExpiryDate")
+    if status == "active" and expiry:
+        counters["warranties"] = 1
+        counters[f"{EXPIRY_PREFIX}{str(expiry)[:7]}"] = 1
+        if amount:
+            counters[f"{WARRANTY_VALUE_PREFIX}{currency}"] = amount
+    return counters
+
+
+def add_stats_delta(deltas, old_item, new_item):
+    """Accumulate the counter change for one receipt write into ``deltas``.
+
+    ``old_item`` is None for a created receipt and ``new_item`` is None for
+    a removed one.
+    """
+    for name, value in receipt_contribution(new_item).items():
+        deltas[name] = deltas.get(name, 0) + value
+    for name, value in receipt_contribution(old_item).items():
+        deltas[name] = deltas.get(name, 0) - value
+    return deltas
+
+
+def stats_delta(old_item, new_item):
+    """Return the non-zero counter changes of one receipt write."""
+    return {k: v for k, v in add_stats_delta({}, old_item, new_item).items() if v}
+
+
+def split_store_counters(counters):
+    """Split counters into those of the stats item and those of the stores item."""
+    stats, stores = {}, {}
+    for name, value in counters.items():
+        (stores if name.startswith(STORE_PREFIX) else stats)[name] = value
+    return stats, stores
+
+
+def apply_stats_delta(table, user_id, deltas, now_iso):
+    """ADD counter deltas to the user's stats items, if they exist.
+
+    Returns False when there was nothing to apply or no stats item yet.
+    """
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not deltas:
+        return False
+    counters, stores = split_store_counters(deltas)
+
+    if not _add_counters(table, user_id, build_stats_sk(), counters, now_iso, bump_version=True):
+        return False
+    if stores:
+        _add_counters(table, user_id, build_store_stats_sk(), stores, now_iso)
+    return True
+
+
+def _add_counters(table, user_id, sk, counters, now_iso, bump_version=False):
+    names = {"#updatedAt": "updatedAt"}
+    values = {":now": now_iso}
+    adds = []
+    if bump_version:
+        names["#version"] = "version"
+        values[":one"] = 1
+        adds.append("#version :one")
+    for i, (name, value) in enumerate(counters.items()):
+        names[f"#s{i}"] = name
+        values[f":s{i}"] = value
+        adds.append(f"#s{i} :s{i}")
+
+    try:
+        table.update_item(
+            Key={"PK": build_pk(user_id), "SK": sk},
+            UpdateExpression="ADD " + ", ".join(adds) + " SET #updatedAt = :now",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ConditionExpression="attribute_exists(PK)",
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
+
+
+def record_stats(table, old_item, new_item, now_iso):
+    """Fold a single receipt write into its owner's stats item."""
+    user_id = extract_user_id((new_item or old_item)["PK"])
+    return apply_stats_delta(table, user_id, stats_delta(old_item, new_item), now_iso)
+
+
+def compute_stats(items):
+    """Return the counters for a full list of receipt items."""
+    totals = {}
+    for item in items:
+        add_stats_delta(totals, None, item)
+    return {name: value for name, value in totals.items() if value}
+
+
+def rebuild_stats(table, user_id, now_iso, overwrite=False):
+    """Build the stats and stores items from the user's receipts.
+
+    Returns ``(stats_item, stores_item)``. Without ``overwrite`` an existing
+    item wins, so concurrent builders do not double count.
+    """
+    pk = build_pk(user_id)
+    names = {f"#a{i}": name for i, name in enumerate(RECEIPT_ATTRIBUTES)}
+    params = {
+        "KeyConditionExpression": Key("PK").eq(pk) & Key("SK").begins_with("RECEIPT#"),
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+        "ConsistentRead": True,
+    }
+    receipts = []
+    while True:
+        resp = table.query(**params)
+        receipts.extend(resp.get("Items", []))
+        if "LastEvaluatedKey" not in resp:
+            break
+        params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    counters, stores = split_store_counters(compute_stats(receipts))
+    stats_item = {"PK": pk, "SK": build_stats_sk(), **counters, "version": 1, "updatedAt": now_iso}
+    stores_item = {"PK": pk, "SK": build_store_stats_sk(), **stores, "updatedAt": now_iso}
+    return (
+        _put_built_item(table, stats_item, overwrite),
+        _put_built_item(table, stores_item, overwrite),
+    )
+
+
+def _put_built_item(table, item, overwrite):
+    kwargs = {} if overwrite else {"ConditionExpression": "attribute_not_exists(PK)"}
+    try:
+        table.put_item(Item=item, **kwargs)
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return table.get_item(Key={"PK": item["PK"], "SK": item["SK"]})["Item"]
+    return item
+
+
+def start_stats(table, receipt, now_iso):
+    """Create empty stats items when ``receipt`` was just created and nothing precedes it.
+
+    The stream delivers a partition's writes in order. If every other
+    receipt of the user was last written no earlier than ``receipt``
+    (by ``updatedAt``), their records are still to come, so the items miss
+    no write that has already been processed. Otherwise the items are left
+    to ``load_stats``. Nothing is created if the receipt itself is gone,
+    e.g. because the account was deleted in the meantime.
+    """
+    pk = receipt["PK"]
+    if table.get_item(Key={"PK": pk, "SK": build_stats_sk()}).get("Item"):
+        return
+    updated_at = receipt.get("updatedAt") or ""
+    params = {
+        "KeyConditionExpression": Key("PK").eq(pk) & Key("SK").begins_with("RECEIPT#"),
+        "ProjectionExpression": "SK, updatedAt",
+        "ConsistentRead": True,
+    }
+    found = False
+    while True:
+        resp = table.query(**params)
+        for item in resp.get("Items", []):
+            if item["SK"] == receipt["SK"]:
+                found = True
+            elif (item.get("updatedAt") or "") < updated_at:
+                return
+        if "LastEvaluatedKey" not in resp:
+            break
+        params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    if not found:
+        return
+    stats_item = {"PK": pk, "SK": build_stats_sk(), "version": 1, "updatedAt": now_iso}
+    _put_built_item(table, stats_item, False)
+    _put_built_item(table, {"PK": pk, "SK": build_store_stats_sk(), "updatedAt": now_iso}, False)
+
+
+def load_stats(table, user_id, now_iso):
+    """Return the user's stats item, building it first if it does not exist."""
+    item = table.get_item(Key={"PK": build_pk(user_id), "SK": build_stats_sk()}).get("Item")
+    return item or rebuild_stats(table, user_id, now_iso)[0]
+
+
+def prunable_counters(item, current_month):
+    """Return ``(zero, stale)`` counter names that ``prune_stats`` would remove.
+
+    ``zero`` are counters at 0. ``stale`` are expiry months before
+    ``current_month`` (YYYY-MM) and store counters left on the stats item
+    from before they moved to the stores item.
+    """
+    zero, stale = [], []
+    for name, value in (item or {}).items():
+        if name in ("PK", "SK", "version", "updatedAt"):
+            continue
+        if item["SK"] == build_stats_sk() and (
+            name.startswith(STORE_PREFIX)
+            or (name.startswith(EXPIRY_PREFIX) and name[len(EXPIRY_PREFIX):] < current_month)
+        ):
+            stale.append(name)
+        elif value == 0:
+            zero.append(name)
+    return zero, stale
+
+
+def prune_stats(table, item, now_iso, min_prunable=1):
+    """REMOVE the prunable counters of a stats or stores item; return the item.
+
+    Nothing is written unless at least ``min_prunable`` counters qualify.
+    The returned item lacks the removed counters; if a zero counter changed
+    in the meantime the item is returned as it was.
+    """
+    zero, stale = prunable_counters(item, now_iso[:7])
+    if not item or len(zero) + len(stale) < min_prunable:
+        return item
+
+    remove = (zero + stale)[:PRUNE_BATCH_SIZE]
+    names = {"#updatedAt": "updatedAt"}
+    values = {":now": now_iso}
+    conditions = ["attribute_exists(PK)"]
+    for i, name in enumerate(remove):
+        names[f"#r{i}"] = name
+        if name in zero:
+            values[":zero"] = 0
+            conditions.append(f"#r{i} = :zero")
+    expression = "REMOVE " + ", ".join(f"#r{i}" for i in range(len(remove)))
+    expression += " SET #updatedAt = :now"
+    if item["SK"] == build_stats_sk():
+        names["#version"] = "version"
+        values[":one"] = 1
+        expression += " ADD #version :one"
+
+    try:
+        table.update_item(
+            Key={"PK": item["PK"], "SK": item["SK"]},
+            UpdateExpression=expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ConditionExpression=" AND ".join(conditions),
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return item
+    pruned = {name: value for name, value in item.items() if name not in remove}
+    pruned["updatedAt"] = now_iso
+    if "#version" in names:
+        pruned["version"] = pruned.get("version", 0) + 1
+    return pruned
+
+
+def counters_with_prefix(stats, prefix):
+    """Return ``{suffix: value}`` for the non-zero counters named ``prefix<suffix>``."""
+    return {
+        name[len(prefix):]: value
+        for name, value in (stats or {}).items()
+        if name.startswith(prefix) and value
+    }
@@ -0,0 +1,302 @@
+"""Change pipeline that maintains derived views from the table's stream.
+
+The table streams NEW_AND_OLD_IMAGES to the stream-processor Lambda, which
+hands each batch to a ChangePipeline. A Processor owns one derived view and
+sees every receipt change twice over:
+
+    apply(table, change)         a side effect that is safe to repeat, e.g.
+                                 repairing the receipt's own GSI keys
+    contribute(updates, change)  counter deltas (ADDs) on view items, e.g.
+                                 the sync tree buckets or the stats counters
+
+Records are grouped by partition key; DynamoDB orders a key's records within
+a shard and each group is handled in that order, groups in parallel. A
+group is committed in chunks: the chunk's ``apply`` effects run first, then
+its contributions are merged per view item and written in one
+TransactWriteItems together with a marker item per record
+
+    PK = STREAM#<eventID>    SK = EVENT    ttl = processing time + 2 days
+
+conditional on the marker not existing. A redelivered record therefore finds
+its marker and contributes nothing, and a chunk that mixes new and already
+applied records is resubmitted without the latter. A view update marked
+``must_exist`` (the stats and sync tree items, which are built by a Query
+on first use) is dropped when its item is missing, so a record processed
+after an account deletion cannot re-create them.
+
+A chunk that fails is bisected until the record that fails on its own is
+found; the chunks before it stay applied, and its sequence number is
+reported as a batch item failure so Lambda retries the shard from there.
+
+DERIVED_VIEWS_MODE says who maintains the counter views. "inline" (the
+default) keeps the ADDs in the API handlers that make each write;
+"stream" leaves them to this pipeline, and the processors marked
+``stream_only`` only run in that mode.
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from shared.batch_io import (
+    DEFAULT_MAX_ATTEMPTS,
+    RETRYABLE_CANCEL_CODES,
+    TRANSACT_SIZE,
+    BatchIncompleteError,
+    backoff,
+    deserialize_item,
+    serialize_item,
+)
+from shared.fastpath import FastTable
+
+logger = logging.getLogger()
+
+INLINE = "inline"
+STREAM = "stream"
+
+MARKER_PK_PREFIX = "STREAM#"
+MARKER_SK = "EVENT"
+# Stream records are kept for 24 hours, so a marker outlives any redelivery
+MARKER_TTL_SECONDS = 2 * 24 * 3600
+# Leaves room in a transaction for the view items a chunk of one partition touches
+CHANGES_PER_TRANSACTION = TRANSACT_SIZE - 10
+DEFAULT_GROUP_WORKERS = 4
+
+# Identity DynamoDB puts on the REMOVE records of items deleted by TTL
+_TTL_PRINCIPAL = "dynamodb.amazonaws.com"
+
+
+def derived_views_mode():
+    return os.environ.get("DERIVED_VIEWS_MODE", INLINE)
+
+
+def derived_views_inline():
+    """Return True if API handlers fold their writes into the counter views."""
+    return derived_views_mode() != STREAM
+
+
+class Change:
+    """One decoded stream record."""
+
+    __slots__ = ("event_id", "event_name", "sequence_number", "pk", "sk", "old", "new", "expired")
+
+    def __init__(self, record):
+        data = record["dynamodb"]
+        keys = deserialize_item(data["Keys"])
+        identity = record.get("userIdentity") or {}
+        self.event_id = record["eventID"]
+        self.event_name = record["eventName"]
+        self.sequence_number = data["SequenceNumber"]
+        self.pk = keys["PK"]
+        self.sk = keys["SK"]
+        self.old = deserialize_item(data["OldImage"]) if "OldImage" in data else None
+        self.new = deserialize_item(data["NewImage"]) if "NewImage" in data else None
+        # A REMOVE is either a TTL expiry or part of an account deletion
+        self.expired = identity.get("type") == "Service" and identity.get("principalId") == _TTL_PRINCIPAL
+
+    @property
+    def is_receipt(self):
+        return self.sk.startswith("RECEIPT#")
+
+
+class Processor:
+    """One derived view maintained from receipt changes.
+
+    Subclasses set ``name`` and implement ``apply``, ``contribute`` or both.
+    """
+
+    name = None
+    # Only run when the API handlers leave this view to the stream
+    stream_only = False
+
+    def accepts(self, change):
+        return change.is_receipt
+
+    def apply(self, table, change):
+        """Perform an idempotent side effect for the change."""
+
+    def contribute(self, updates, change):
+        """Add the change's counter deltas to ``updates`` (a ViewUpdates)."""
+
+
+class ViewUpdates:
+    """Counter deltas and attribute values merged per view item."""
+
+    def __init__(self):
+        self._updates = OrderedDict()
+
+    def add(self, pk, sk, counters, sets=None, must_exist=False):
+        update = self._updates.setdefault(
+            (pk, sk), {"adds": {}, "sets": {}, "must_exist": must_exist}
+        )
+        for name, value in counters.items():
+            update["adds"][name] = update["adds"].get(name, 0) + value
+        update["sets"].update(sets or {})
+
+    def actions(self, table_name, skip=()):
+        """Return ``(keys, actions)``: one Update action per view item with a change."""
+        keys, actions = [], []
+        for key, update in self._updates.items():
+            adds = {name: value for name, value in update["adds"].items() if value}
+            if key in skip or not adds:
+                continue
+            names, values, clauses = {}, {}, []
+            for i, (name, value) in enumerate(adds.items()):
+                names[f"#a{i}"] = name
+                values[f":a{i}"] = value
+                clauses.append(f"#a{i} :a{i}")
+            expression = "ADD " + ", ".join(clauses)
+            if update["sets"]:
+                sets = []
+                for i, (name, value) in enumerate(update["sets"].items()):
+                    names[f"#s{i}"] = name
+                    values[f":s{i}"] = value
+                    sets.append(f"#s{i} = :s{i}")
+                expression += " SET " + ", ".join(sets)
+
+            action = {
+                "TableName": table_name,
+                "Key": serialize_item({"PK": key[0], "SK": key[1]}),
+                "UpdateExpression": expression,
+                "ExpressionAttributeNames": names,
+                "ExpressionAttributeValues": serialize_item(values),
+            }
+            if update["must_exist"]:
+                action["ConditionExpression"] = "attribute_exists(PK)"
+            keys.append(key)
+            actions.append({"Update": action})
+        return keys, actions
+
+
+def active_processors(processors):
+    """Return the processors that run under the current DERIVED_VIEWS_MODE."""
+    inline = derived_views_inline()
+    return [p for p in processors if not (p.stream_only and inline)]
+
+
+class ChangePipeline:
+    """Applies a batch of stream records to the processors; see the module docstring."""
+
+    def __init__(self, client, table_name, processors, group_workers=DEFAULT_GROUP_WORKERS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, clock=time.time):
+        self.client = client
+        self.table_name = table_name
+        self.table = FastTable(client, table_name)
+        self.processors = list(processors)
+        self.group_workers = group_workers
+        self.max_attempts = max_attempts
+        self._clock = clock
+
+    def process(self, records):
+        """Apply the records and return the sequence numbers of failed records.
+
+        Each failed sequence number is the first record of its partition
+        that was not applied; Lambda resumes the shard from the lowest.
+        """
+        groups = OrderedDict()
+        for record in records:
+            change = Change(record)
+            if any(p.accepts(change) for p in self.processors):
+                groups.setdefault(change.pk, []).append(change)
+        if not groups:
+            return []
+
+        if len(groups) == 1 or self.group_workers <= 1:
+            failed = [self._process_group(changes) for changes in groups.values()]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.group_workers, len(groups))) as pool:
+                failed = list(pool.map(self._process_group, groups.values()))
+        return [change.sequence_number for change in failed if change is not None]
+
+    def _process_group(self, changes):
+        """Apply one partition's changes in order; return the first failed change."""
+        for start in range(0, len(changes), CHANGES_PER_TRANSACTION):
+            failed = self._apply_bisecting(changes[start:start + CHANGES_PER_TRANSACTION])
+            if failed is not None:
+                return failed
+        return None
+
+    def _apply_bisecting(self, chunk):
+        try:
+            self._apply(chunk)
+            return None
+        except Exception:
+            if len(chunk) == 1:
+                logger.exception(json.dumps({
+                    "action": "stream_record_failed",
+                    "event_id": chunk[0].event_id,
+                    "sequence_number": chunk[0].sequence_number,
+                    "pk": chunk[0].pk,
+                    "sk": chunk[0].sk,
+                }))
+                return chunk[0]
+        middle = len(chunk) // 2
+        return self._apply_bisecting(chunk[:middle]) or self._apply_bisecting(chunk[middle:])
+
+    def _apply(self, chunk):
+        for change in chunk:
+            for processor in self.processors:
+                if processor.accepts(change):
+                    processor.apply(self.table, change)
+        self._commit(chunk)
+
+    def _commit(self, chunk):
+        """Write the chunk's merged view updates once, with a marker per record."""
+        pending = list(chunk)
+        skip = set()
+        for attempt in range(self.max_attempts):
+            if attempt:
+                backoff(attempt)
+            updates = ViewUpdates()
+            for change in pending:
+                for processor in self.processors:
+                    if processor.accepts(change):
+                        processor.contribute(updates, change)
+            keys, view_actions = updates.actions(self.table_name, skip)
+            if not view_actions:
+                return
+
+            expires = int(self._clock()) + MARKER_TTL_SECONDS
+            markers = [self._marker(change, expires) for change in pending]
+            try:
+                self.client.transact_write_items(TransactItems=markers + view_actions)
+                return
+            except self.client.exceptions.TransactionCanceledException as exc:
+                reasons = exc.response.get("CancellationReasons") or []
+
+            applied = set()
+            for index, reason in enumerate(reasons):
+                code = reason.get("Code", "None")
+                if code == "None" or code in RETRYABLE_CANCEL_CODES:
+                    continue
+                if code != "ConditionalCheckFailed":
+                    raise BatchIncompleteError(f"Stream transaction cancelled: {code}")
+                if index < len(markers):
+                    applied.add(pending[index].event_id)
+                else:
+                    skip.add(keys[index - len(markers)])
+            if applied:
+                logger.info(json.dumps({"action": "stream_records_already_applied", "count": len(applied)}))
+                pending = [change for change in pending if change.event_id not in applied]
+                if not pending:
+                    return
+        raise BatchIncompleteError(
+            f"Stream transaction did not complete after {self.max_attempts} attempts"
+        )
+
+    def _marker(self, change, expires):
+        return {
+            "Put": {
+                "TableName": self.table_name,
+                "Item": serialize_item({
+                    "PK": f"{MARKER_PK_PREFIX}{change.event_id}",
+                    "SK": MARKER_SK,
+                    "sequenceNumber": change.sequence_number,
+                    "ttl": expires,
+                }),
+                "ConditionExpression": "attribute_not_exists(PK)",
+            }
+        }
@@ -0,0 +1,129 @@
+"""Per-user hash tree over (receiptId, serverVersion) for sync reconciliation.
+
+Receipts are grouped into 256 buckets by the first two hex characters of
+their ID (UUIDs are uniformly distributed), plus an overflow bucket "xx" for
+IDs that do not start with two hex characters. Each bucket stores the sum of
+a 64-bit hash of every (receiptId, serverVersion) pair in it, so a write only
+has to ADD the difference between the new and old entry hash — no read is
+needed and concurrent writers commute.
+
+The sums live on one META item per user:
+    PK = USER#<userId>    SK = META#SYNCTREE    b00 … bff, bxx = <sum>
+
+Digests exposed to clients (clients compute the same values locally):
+    bucket digest = sum mod 2**64 as 16 hex chars
+    group digest  = sha256 of the concatenated bucket digests in the group
+                    (buckets "<g>0" … "<g>f", or just "xx" for group "x"),
+                    first 16 hex chars
+    root digest   = sha256 of the concatenated group digests "0" … "f", "x",
+                    first 16 hex chars
+"""
+
+import hashlib
+import string
+from datetime import datetime, timezone
+
+from shared.dynamodb import build_pk
+
+SYNC_TREE_SK = "META#SYNCTREE"
+OVERFLOW_BUCKET = "xx"
+GROUPS = [*"0123456789abcdef", "x"]
+
+_HEX = set(string.hexdigits.lower())
+
+
+def bucket_of(receipt_id):
+    """Return the bucket name for a receipt ID."""
+    prefix = receipt_id[:2].lower()
+    if len(prefix) == 2 and set(prefix) <= _HEX:
+        return prefix
+    return OVERFLOW_BUCKET
+
+
+def group_buckets(group):
+    """Return the bucket names that make up a group."""
+    if group == "x":
+        return [OVERFLOW_BUCKET]
+    return [f"{group}{c}" for c in "0123456789abcdef"]
+
+
+def entry_hash(receipt_id, server_version):
+    """Return the 64-bit hash of one (receiptId, serverVersion) pair."""
+    digest = hashlib.sha256(f"{receipt_id}:{int(server_version)}".encode("utf-8"))
+    return int.from_bytes(digest.digest()[:8], "big")
+
+
+def add_delta(deltas, receipt_id, old_version=None, new_version=None):
+    """Accumulate the bucket change for one receipt write into ``deltas``.
+
+    ``old_version`` is None for a newly created receipt and ``new_version``
+    is None for a removed one.
+    """
+    delta = 0
+    if new_version is not None:
+        delta += entry_hash(receipt_id, new_version)
+    if old_version is not None:
+        delta -= entry_hash(receipt_id, old_version)
+    if delta:
+        bucket = bucket_of(receipt_id)
+        deltas[bucket] = deltas.get(bucket, 0) + delta
+    return deltas
+
+
+def apply_deltas(table, user_id, deltas):
+    """ADD accumulated bucket deltas to the user's sync tree item."""
+    deltas = {bucket: delta for bucket, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table.update_item(
+        Key={"PK": build_pk(user_id), "SK": SYNC_TREE_SK},
+        UpdateExpression="ADD " + ", ".join(f"#b{b} :d{b}" for b in deltas),
+        ExpressionAttributeNames={f"#b{b}": f"b{b}" for b in deltas},
+        ExpressionAttributeValues={f":d{b}": delta for b, delta in deltas.items()},
+    )
+
+
+def add_version_delta(deltas, receipt_id, new_version):
+    """Accumulate a receipt write that produced serverVersion ``new_version``.
+
+    Every receipt write bumps serverVersion by exactly one and version 1 is
+    the create, so the entry being replaced is implied by the new version.
+    """
+    new_version = int(new_version)
+    old_version = new_version - 1 if new_version > 1 else None
+    return add_delta(deltas, receipt_id, old_version, new_version)
+
+
+def record_version(table, user_id, receipt_id, new_version):
+    """Fold a single receipt write into the user's sync tree."""
+    apply_deltas(table, user_id, add_version_delta({}, receipt_id, new_version))
+
+
+def build_tree_item(user_id, entries):
+    """Build a complete sync tree item from (receiptId, serverVersion) pairs."""
+    deltas = {}
+    for receipt_id, server_version in entries:
+        add_delta(deltas, receipt_id, new_version=server_version)
+    return {
+        "PK": build_pk(user_id),
+        "SK": SYNC_TREE_SK,
+        "builtAt": datetime.now(timezone.utc).isoformat(),
+        **{f"b{bucket}": total for bucket, total in deltas.items()},
+    }
+
+
+def bucket_digest(tree_item, bucket):
+    """Return the client-facing digest of one bucket."""
+    return format(int(tree_item.get(f"b{bucket}", 0)) % (1 << 64), "016x")
+
+
+def group_digest(tree_item, group):
+    """Return the digest of a group of buckets."""
+    joined = "".join(bucket_digest(tree_item, b) for b in group_buckets(group))
+    return hashlib.sha256(joined.encode("ascii")).hexdigest()[:16]
+
+
+def root_digest(tree_item):
+    """Return the digest of the whole tree."""
+    joined = "".join(group_digest(tree_item, g) for g in GROUPS)
+    return hashlib.sha256(joined.encode("ascii")).hexdigest()[:16]
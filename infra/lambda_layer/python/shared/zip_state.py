@@ -0,0 +1,63 @@
+"""Save and restore the state of a ZIP archive that is still being written.
+
+A ZipFile in write mode only keeps its central directory (one ZipInfo per
+member) in memory and writes it out on close(). Capturing those entries lets
+one invocation stop part-way through an archive and a later one reopen a
+ZipFile on the resumed output stream, restore the entries and keep appending
+members; close() then writes a central directory covering all of them.
+An archive that is paused or abandoned must be detached from its stream,
+or garbage collection closes it and writes a central directory anyway.
+"""
+
+import base64
+import zipfile
+
+_INT_FIELDS = (
+    "compress_type",
+    "create_system",
+    "create_version",
+    "extract_version",
+    "reserved",
+    "flag_bits",
+    "volume",
+    "internal_attr",
+    "external_attr",
+    "header_offset",
+    "CRC",
+    "compress_size",
+    "file_size",
+)
+
+
+def snapshot_entries(zf):
+    """Return the archive's member entries as JSON-serializable dicts."""
+    entries = []
+    for zinfo in zf.filelist:
+        entry = {field: getattr(zinfo, field) for field in _INT_FIELDS}
+        entry["filename"] = zinfo.filename
+        entry["date_time"] = list(zinfo.date_time)
+        entry["comment"] = base64.b64encode(zinfo.comment).decode("ascii")
+        entry["extra"] = base64.b64encode(zinfo.extra).decode("ascii")
+        entries.append(entry)
+    return entries
+
+
+def restore_entries(zf, entries):
+    """Re-register entries from snapshot_entries() on a freshly opened ZipFile.
+
+    ``zf`` must be open in "w" mode on a stream positioned at the end of the
+    data already written, so new members land after the restored ones.
+    """
+    for entry in entries:
+        zinfo = zipfile.ZipInfo(entry["filename"], date_time=tuple(entry["date_time"]))
+        for field in _INT_FIELDS:
+            setattr(zinfo, field, int(entry[field]))
+        zinfo.comment = base64.b64decode(entry["comment"])
+        zinfo.extra = base64.b64decode(entry["extra"])
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+
+
+def detach_archive(zf):
+    """Cut a ZipFile off its stream so close() (or __del__) writes nothing."""
+    zf.fp = None
@@ -9,12 +9,14 @@ import os
 import logging
 import time
 
-import boto3
 from boto3.dynamodb.conditions import Attr
 
-from shared.response import success, error
+from shared.clients import lazy_resource, lazy_table
+from shared.response import success, error, conditional, make_etag
 from shared.auth import get_user_id
 from shared.dynamodb import build_pk, build_categories_sk
+from shared.cache import META_CACHE
+from shared.categories import DEFAULT_CATEGORIES
 from shared.errors import NotFoundError, ConflictError, ValidationError
 
 logger = logging.getLogger()
@@ -23,21 +25,8 @@ logger.setLevel(logging.INFO)
 TABLE_NAME = os.environ["TABLE_NAME"]
 REGION = os.environ.get("REGION", "eu-west-1")
 
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-table = dynamodb.Table(TABLE_NAME)
-
-DEFAULT_CATEGORIES = [
-    "Electronics",
-    "Groceries",
-    "Clothing",
-    "Home & Garden",
-    "Automotive",
-    "Health & Beauty",
-    "Office",
-    "Sports & Outdoors",
-    "Toys & Kids",
-    "Dining",
-]
+dynamodb = lazy_resource("dynamodb", region_name=REGION)
+table = lazy_table(TABLE_NAME, region_name=REGION)
 
 MAX_CATEGORIES = 50
 MAX_CATEGORY_LENGTH = 50
@@ -45,11 +34,10 @@ MIN_CATEGORY_LENGTH = 1
 
 
 def _get_categories(user_id):
-    """Fetch user categories from DynamoDB."""
-    resp = table.get_item(
-        Key={"PK": build_pk(user_id), "SK": build_categories_sk()},
+    """Fetch user categories, from the container's META cache when warm."""
+    return META_CACHE.get_item(
+        table, {"PK": build_pk(user_id), "SK": build_categories_sk()}
     )
-    return resp.get("Item")
 
 
 def _validate_categories(categories):
@@ -111,6 +99,9 @@ def _put_categories(user_id, categories, expected_version):
             )
     except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
         raise ConflictError("Category version conflict — reload and retry")
+    finally:
+        # Written or conflicting, the cached copy is no longer current
+        META_CACHE.invalidate_item(pk, sk)
 
     return new_version
 
@@ -123,11 +114,13 @@ def _handle_get(event):
     custom_categories = item.get("categories", []) if item else []
     version = item.get("version", 0) if item else 0
 
-    return success({
+    # The defaults ship with the code, so they are part of the representation
+    etag = make_etag("categories", user_id, version, *DEFAULT_CATEGORIES)
+    return conditional(event, {
         "defaults": DEFAULT_CATEGORIES,
         "custom": custom_categories,
         "version": version,
-    })
+    }, etag)
 
 
 def _handle_put(event):
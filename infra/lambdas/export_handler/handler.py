@@ -1,24 +1,48 @@
-"""User data export — API Gateway POST /user/export.
-
-Gathers all user receipts and images, creates a ZIP archive,
-uploads to the export bucket, and returns a presigned download URL.
+"""User data export — asynchronous export jobs.
+
+API Gateway:
+    POST /user/export             Start an export job, returns its exportId (202)
+    GET  /user/export/{exportId}  Job status, progress and the download URL
+
+SQS worker:
+    Each message carries one chunk of an export job. The worker streams the
+    user's receipts and images into a ZIP that is written straight to the
+    export bucket with a multipart upload. When the invocation runs low on
+    time it checkpoints the upload, the unflushed tail and the ZIP's central
+    directory to S3 and queues the next chunk, which resumes the same archive.
+    On completion an export.ready notification is published to SNS.
+
+Incremental exports:
+    Every completed export writes a manifest (receipt updatedAt values and
+    image ETags) under manifests/. Passing ``sinceExportId`` packages only
+    receipts whose GSI-6 (ByUpdatedAt) timestamp moved since that export and
+    images whose ETag changed, inheriting the base export's scope.
+
+Job items live next to the user's other META items:
+    PK = USER#<userId>    SK = META#EXPORT#<exportId>
 """
 
 import json
 import os
 import logging
 import time
+import uuid
 import zipfile
-import tempfile
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
-import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
 
-from shared.response import success, error
+from shared.clients import lazy_client, lazy_resource, lazy_table
+from shared.response import success, accepted, error
 from shared.auth import get_user_id
+from shared.batch_io import batch_get
 from shared.dynamodb import build_pk, extract_receipt_id
-from shared.errors import NotFoundError, ValidationError
+from shared.errors import ConflictError, NotFoundError, ValidationError
+from shared.fanout import has_time_left
+from shared.prefetch import ordered_prefetch
+from shared.s3_stream import S3MultipartWriter
+from shared.zip_state import detach_archive, restore_entries, snapshot_entries
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -29,15 +53,431 @@ S3_BUCKET = os.environ["S3_BUCKET"]
 EXPORT_BUCKET = os.environ["EXPORT_BUCKET"]
 EXPORT_TTL_DAYS = int(os.environ.get("EXPORT_TTL_DAYS", "7"))
 SNS_TOPIC_ARN = os.environ.get("SNS_TOPIC_ARN", "")
-
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-table = dynamodb.Table(TABLE_NAME)
-s3_client = boto3.client("s3", region_name=REGION)
-sns_client = boto3.client("sns", region_name=REGION)
+EXPORT_QUEUE_URL = os.environ.get("EXPORT_QUEUE_URL", "")
+# Receives of a chunk message before SQS moves it to the DLQ (the redrive policy)
+EXPORT_MAX_RECEIVES = int(os.environ.get("EXPORT_MAX_RECEIVES", "3"))
+EXPORT_PART_SIZE = int(os.environ.get("EXPORT_PART_SIZE_MB", "8")) * 1024 * 1024
+PREFETCH_WORKERS = int(os.environ.get("EXPORT_PREFETCH_WORKERS", "8"))
+PREFETCH_BUDGET = int(os.environ.get("EXPORT_PREFETCH_BUDGET_MB", "64")) * 1024 * 1024
+# Stop a chunk with enough time left to upload the checkpoint and queue the next one
+CHUNK_RESERVE_MS = int(os.environ.get("EXPORT_CHUNK_RESERVE_SECONDS", "30")) * 1000
+# A job that has not reported progress for this long no longer blocks a new export
+STALE_JOB_MINUTES = int(os.environ.get("EXPORT_STALE_JOB_MINUTES", "30"))
+# GSI-6 is eventually consistent — look back this far past the base snapshot
+INDEX_LAG_SECONDS = 60
+
+dynamodb = lazy_resource("dynamodb", region_name=REGION)
+table = lazy_table(TABLE_NAME, region_name=REGION)
+dynamodb_client = lazy_client("dynamodb", region_name=REGION)
+# Leave room in the connection pool for the prefetch workers plus the uploader
+s3_client = lazy_client(
+    "s3",
+    region_name=REGION,
+    max_pool_connections=PREFETCH_WORKERS + 2,
+)
+sns_client = lazy_client("sns", region_name=REGION)
+sqs_client = lazy_client("sqs", region_name=REGION)
 
 PRESIGNED_URL_EXPIRY = 86400  # 24 hours
+PROGRESS_INTERVAL = 25  # receipts between progress updates on the job item
+SUPPORTED_FORMATS = ("json",)
+
+STATUS_PROCESSING = "processing"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+# Errors worth another SQS delivery rather than failing the job
+_RETRYABLE_ERROR_CODES = {
+    "SlowDown",
+    "ThrottlingException",
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "TransactionConflictException",
+    "InternalError",
+    "InternalServerError",
+    "ServiceUnavailable",
+    "RequestTimeout",
+}
+
+
+def handler(event, context):
+    """Entry point — SQS export chunks, or the API Gateway export routes."""
+    if event.get("Records"):
+        return _handle_job_messages(event, context)
+
+    try:
+        user_id = get_user_id(event)
+        http_method = event.get("httpMethod", "")
+        resource = event.get("resource", "")
+        path_params = event.get("pathParameters") or {}
+
+        if resource == "/user/export" and http_method == "POST":
+            return start_export(event, user_id)
+
+        if resource == "/user/export/{exportId}" and http_method == "GET":
+            return get_export(user_id, path_params.get("exportId"))
+
+        return error("Route not found", status_code=404, code="NOT_FOUND")
+
+    except ValueError as e:
+        return error(str(e), status_code=401, code="UNAUTHORIZED")
+    except ValidationError as e:
+        return error(e.message, status_code=400, code=e.code)
+    except NotFoundError as e:
+        return error(e.message, status_code=404, code=e.code)
+    except ConflictError as e:
+        return error(e.message, status_code=409, code="EXPORT_IN_PROGRESS")
+    except Exception as e:
+        logger.error(json.dumps({
+            "action": "export_error",
+            "error": str(e),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }))
+        return error("Export failed", status_code=500, code="INTERNAL_ERROR")
 
 
+# ---------------------------------------------------------------------------
+# API routes
+# ---------------------------------------------------------------------------
+
+def start_export(event, user_id):
+    """POST /user/export — create an export job and queue its first chunk."""
+    body = json.loads(event.get("body") or "{}")
+    export_format = body.get("format", "json")
+    include_images = body.get("includeImages", True)
+    date_from = body.get("dateFrom")
+    date_to = body.get("dateTo")
+    since_export_id = body.get("sinceExportId")
+
+    if since_export_id:
+        if date_from or date_to or "includeImages" in body:
+            raise ValidationError(
+                "Incremental exports inherit dateFrom, dateTo and includeImages "
+                "from the base export"
+            )
+        base_manifest = _load_manifest(user_id, since_export_id)
+        if base_manifest is None:
+            raise ValidationError(f"No manifest found for export {since_export_id}")
+        date_from = base_manifest.get("dateFrom")
+        date_to = base_manifest.get("dateTo")
+        include_images = base_manifest.get("includeImages", True)
+
+    if export_format not in SUPPORTED_FORMATS:
+        raise ValidationError(f"Unsupported export format: {export_format}")
+    if not isinstance(include_images, bool):
+        raise ValidationError("includeImages must be a boolean")
+    if date_from and date_to and date_from > date_to:
+        raise ValidationError("dateFrom must not be after dateTo")
+
+    if not EXPORT_QUEUE_URL and os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        # Inline chunks are for local runs; in Lambda they would outlive the request
+        raise RuntimeError("EXPORT_QUEUE_URL is not configured")
+    if _has_export_in_progress(user_id):
+        raise ConflictError("An export is already in progress for this user")
+
+    export_id = f"exp-{uuid.uuid4()}"
+    now = datetime.now(timezone.utc)
+    item = {
+        "PK": build_pk(user_id),
+        "SK": _build_export_sk(export_id),
+        "exportId": export_id,
+        "status": STATUS_PROCESSING,
+        "format": export_format,
+        "includeImages": include_images,
+        "createdAt": now.isoformat(),
+        "updatedAt": now.isoformat(),
+        "sequence": 0,
+        "receiptsTotal": 0,
+        "receiptsProcessed": 0,
+        "imagesProcessed": 0,
+        "bytesWritten": 0,
+        "ttl": int(time.time()) + EXPORT_TTL_DAYS * 86400,
+    }
+    if date_from:
+        item["dateFrom"] = date_from
+    if date_to:
+        item["dateTo"] = date_to
+    if since_export_id:
+        item["sinceExportId"] = since_export_id
+    table.put_item(Item=item)
+
+    logger.info(json.dumps({
+        "action": "export_start",
+        "userId": user_id,
+        "exportId": export_id,
+        "dateFrom": date_from,
+        "dateTo": date_to,
+        "includeImages": include_images,
+        "sinceExportId": since_export_id,
+        "timestamp": now.isoformat(),
+    }))
+
+    _enqueue_chunk(user_id, export_id, 0)
+
+    return accepted({
+        "exportId": export_id,
+        "status": STATUS_PROCESSING,
+        "message": (
+            "Export initiated. You will receive a push notification when "
+            "your data is ready for download."
+        ),
+    })
+
+
+def get_export(user_id, export_id):
+    """GET /user/export/{exportId} — job status, progress and download URL."""
+    job = _get_job(user_id, export_id)
+    if not job:
+        raise NotFoundError(f"Export {export_id} not found")
+
+    result = {
+        "exportId": job["exportId"],
+        "status": job["status"],
+        "createdAt": job["createdAt"],
+        "updatedAt": job["updatedAt"],
+        "progress": {
+            "receiptsTotal": job.get("receiptsTotal", 0),
+            "receiptsProcessed": job.get("receiptsProcessed", 0),
+            "imagesProcessed": job.get("imagesProcessed", 0),
+            "bytesWritten": job.get("bytesWritten", 0),
+        },
+    }
+    if job.get("sinceExportId"):
+        result["sinceExportId"] = job["sinceExportId"]
+    if job["status"] == STATUS_COMPLETED:
+        download_url, expires_at = _presign_export(job["exportKey"])
+        result.update({
+            "downloadUrl": download_url,
+            "expiresAt": expires_at,
+            "receiptCount": job.get("receiptCount", 0),
+            "imagesSkipped": job.get("imagesSkipped", 0),
+            "fileSizeMb": _size_mb(job.get("fileSize", 0)),
+            "completedAt": job.get("completedAt"),
+        })
+    elif job["status"] == STATUS_FAILED:
+        result["error"] = job.get("error", "Export failed")
+
+    return success(result)
+
+
+def _has_export_in_progress(user_id):
+    """Return True if the user has an export job that is still making progress."""
+    stale_before = (
+        datetime.now(timezone.utc) - timedelta(minutes=STALE_JOB_MINUTES)
+    ).isoformat()
+    resp = table.query(
+        KeyConditionExpression=(
+            Key("PK").eq(build_pk(user_id)) & Key("SK").begins_with("META#EXPORT#")
+        ),
+        FilterExpression=(
+            Attr("status").eq(STATUS_PROCESSING) & Attr("updatedAt").gt(stale_before)
+        ),
+        ProjectionExpression="exportId",
+    )
+    return bool(resp.get("Items"))
+
+
+# ---------------------------------------------------------------------------
+# Job bookkeeping
+# ---------------------------------------------------------------------------
+
+def _build_export_sk(export_id):
+    return f"META#EXPORT#{export_id}"
+
+
+def _get_job(user_id, export_id):
+    resp = table.get_item(
+        Key={"PK": build_pk(user_id), "SK": _build_export_sk(export_id)},
+        ConsistentRead=True,
+    )
+    return resp.get("Item")
+
+
+def _claim_chunk(user_id, export_id, sequence, context):
+    """Take the lease on a chunk so duplicate deliveries do not run it twice.
+
+    Returns the job item, or None if the chunk was already handled or is
+    being run by another invocation. A lease left by a crashed invocation
+    expires with that invocation's timeout, so the SQS retry can claim it.
+    """
+    now_ms = int(time.time() * 1000)
+    remaining_ms = (
+        context.get_remaining_time_in_millis()
+        if context is not None and hasattr(context, "get_remaining_time_in_millis")
+        else 900000
+    )
+    try:
+        resp = table.update_item(
+            Key={"PK": build_pk(user_id), "SK": _build_export_sk(export_id)},
+            UpdateExpression="SET #lease = :lease, #updatedAt = :now",
+            ConditionExpression=(
+                "#status = :processing AND #sequence = :sequence "
+                "AND (attribute_not_exists(#lease) OR #lease < :nowMs)"
+            ),
+            ExpressionAttributeNames={
+                "#lease": "leaseExpiresAt",
+                "#updatedAt": "updatedAt",
+                "#status": "status",
+                "#sequence": "sequence",
+            },
+            ExpressionAttributeValues={
+                ":lease": now_ms + remaining_ms,
+                ":nowMs": now_ms,
+                ":now": datetime.now(timezone.utc).isoformat(),
+                ":processing": STATUS_PROCESSING,
+                ":sequence": sequence,
+            },
+            ReturnValues="ALL_NEW",
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        return None
+    return resp["Attributes"]
+
+
+def _update_job(user_id, export_id, fields, remove=(), expected_sequence=None):
+    """SET ``fields`` (and REMOVE ``remove``) on a job item."""
+    fields = {**fields, "updatedAt": datetime.now(timezone.utc).isoformat()}
+    names = {f"#{k}": k for k in [*fields, *remove]}
+    values = {f":{k}": v for k, v in fields.items()}
+    update_expr = "SET " + ", ".join(f"#{k} = :{k}" for k in fields)
+    if remove:
+        update_expr += " REMOVE " + ", ".join(f"#{k}" for k in remove)
+
+    params = {
+        "Key": {"PK": build_pk(user_id), "SK": _build_export_sk(export_id)},
+        "UpdateExpression": update_expr,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+    if expected_sequence is not None:
+        names["#expectedSequence"] = "sequence"
+        values[":expectedSequence"] = expected_sequence
+        params["ConditionExpression"] = "#expectedSequence = :expectedSequence"
+    table.update_item(**params)
+
+
+def _enqueue_chunk(user_id, export_id, sequence):
+    """Queue the next chunk of a job.
+
+    Without a queue (local runs only; start_export refuses in Lambda) the
+    chunk runs inline, with no time limit and no retries.
+    """
+    message = {"userId": user_id, "exportId": export_id, "sequence": sequence}
+    if EXPORT_QUEUE_URL:
+        sqs_client.send_message(QueueUrl=EXPORT_QUEUE_URL, MessageBody=json.dumps(message))
+    elif os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        raise RuntimeError("EXPORT_QUEUE_URL is not configured")
+    else:
+        _run_export_chunk(user_id, export_id, sequence, None)
+
+
+def _release_lease(user_id, export_id, sequence):
+    """Drop the chunk's lease so the SQS retry can claim it straight away."""
+    try:
+        table.update_item(
+            Key={"PK": build_pk(user_id), "SK": _build_export_sk(export_id)},
+            UpdateExpression="REMOVE #lease",
+            ConditionExpression="#status = :processing AND #sequence = :sequence",
+            ExpressionAttributeNames={
+                "#lease": "leaseExpiresAt",
+                "#status": "status",
+                "#sequence": "sequence",
+            },
+            ExpressionAttributeValues={
+                ":processing": STATUS_PROCESSING,
+                ":sequence": sequence,
+            },
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+
+
+def _is_retryable(exc):
+    """Return True for throttling, 5xx and connection errors from AWS calls."""
+    if isinstance(exc, (BotoConnectionError, HTTPClientError)):
+        return True
+    if isinstance(exc, ClientError):
+        response = exc.response or {}
+        code = response.get("Error", {}).get("Code")
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return code in _RETRYABLE_ERROR_CODES or status >= 500
+    return False
+
+
+# ---------------------------------------------------------------------------
+# Checkpoint state in S3
+# ---------------------------------------------------------------------------
+
+def _export_key(user_id, export_id):
+    return f"exports/{user_id}/{export_id}.zip"
+
+
+def _state_key(user_id, export_id):
+    return f"exports/{user_id}/{export_id}.state.json"
+
+
+def _tail_key(user_id, export_id):
+    return f"exports/{user_id}/{export_id}.tail"
+
+
+def _manifest_key(user_id, export_id):
+    return f"manifests/{user_id}/{export_id}.json"
+
+
+def _load_manifest(user_id, export_id):
+    """Return the manifest written by a completed export, or None."""
+    try:
+        obj = s3_client.get_object(
+            Bucket=EXPORT_BUCKET, Key=_manifest_key(user_id, export_id)
+        )
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(obj["Body"].read())
+
+
+def _load_state(user_id, export_id):
+    """Return the saved job state and unflushed tail bytes, or (None, b"")."""
+    try:
+        state_obj = s3_client.get_object(
+            Bucket=EXPORT_BUCKET, Key=_state_key(user_id, export_id)
+        )
+        tail_obj = s3_client.get_object(
+            Bucket=EXPORT_BUCKET, Key=_tail_key(user_id, export_id)
+        )
+    except s3_client.exceptions.NoSuchKey:
+        return None, b""
+    return json.loads(state_obj["Body"].read()), tail_obj["Body"].read()
+
+
+def _save_state(user_id, export_id, state, tail):
+    s3_client.put_object(
+        Bucket=EXPORT_BUCKET, Key=_tail_key(user_id, export_id), Body=tail
+    )
+    s3_client.put_object(
+        Bucket=EXPORT_BUCKET,
+        Key=_state_key(user_id, export_id),
+        Body=json.dumps(state).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def _delete_state(user_id, export_id):
+    s3_client.delete_objects(
+        Bucket=EXPORT_BUCKET,
+        Delete={
+            "Objects": [
+                {"Key": _state_key(user_id, export_id)},
+                {"Key": _tail_key(user_id, export_id)},
+            ],
+            "Quiet": True,
+        },
+    )
+
+
+# ---------------------------------------------------------------------------
+# Export data
+# ---------------------------------------------------------------------------
+
 def _query_user_receipts(user_id, date_from=None, date_to=None):
     """Query all receipts for a user, optionally filtered by date range."""
     pk = build_pk(user_id)
@@ -74,23 +514,41 @@ def _query_user_receipts(user_id, date_from=None, date_to=None):
     return items
 
 
-def _list_receipt_images(user_id, receipt_id):
-    """List all original images for a receipt in S3."""
-    prefix = f"users/{user_id}/receipts/{receipt_id}/original/"
-    keys = []
+def _list_user_images(user_id):
+    """List every original receipt image for a user, grouped by receipt ID.
+
+    Keys look like users/{userId}/receipts/{receiptId}/original/{filename}.
+    """
+    prefix = f"users/{user_id}/receipts/"
+    images = {}
     paginator = s3_client.get_paginator("list_objects_v2")
     for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=prefix):
         for obj in page.get("Contents", []):
-            keys.append(obj["Key"])
-    return keys
+            parts = obj["Key"][len(prefix):].split("/")
+            if len(parts) != 3 or parts[1] != "original":
+                continue
+            images.setdefault(parts[0], []).append(
+                {"Key": obj["Key"], "Size": obj["Size"], "ETag": obj["ETag"]}
+            )
+    return images
 
 
-def _download_s3_object(key):
+def _fetch_s3_object(obj):
     """Download an S3 object and return its bytes."""
-    resp = s3_client.get_object(Bucket=S3_BUCKET, Key=key)
+    resp = s3_client.get_object(Bucket=S3_BUCKET, Key=obj["Key"])
     return resp["Body"].read()
 
 
+def _write_image(zf, arcname, data):
+    """Add image bytes to the archive.
+
+    Images are already compressed, so they are stored rather than deflated.
+    """
+    zinfo = zipfile.ZipInfo(arcname, date_time=time.gmtime()[:6])
+    zinfo.compress_type = zipfile.ZIP_STORED
+    zf.writestr(zinfo, data)
+
+
 def _serialize_receipt(item):
     """Convert a DynamoDB item to JSON-serializable dict."""
     serialized = {}
@@ -102,103 +560,390 @@ def _serialize_receipt(item):
     return serialized
 
 
-def handler(event, context):
-    """API Gateway handler — export user data as a downloadable ZIP."""
-    try:
-        user_id = get_user_id(event)
-
-        # Parse optional date filters
-        body = json.loads(event.get("body") or "{}")
-        date_from = body.get("dateFrom")
-        date_to = body.get("dateTo")
+def _query_changed_receipts(user_id, since):
+    """Fetch receipts whose GSI-6 (ByUpdatedAt) timestamp is at or after ``since``."""
+    params = {
+        "IndexName": "ByUpdatedAt",
+        "KeyConditionExpression": (
+            Key("GSI6PK").eq(build_pk(user_id)) & Key("GSI6SK").gte(since)
+        ),
+    }
+    keys = []
+    while True:
+        resp = table.query(**params)
+        keys.extend(
+            {"PK": item["PK"], "SK": item["SK"]}
+            for item in resp.get("Items", [])
+            if item["SK"].startswith("RECEIPT#")
+        )
+        if "LastEvaluatedKey" not in resp:
+            break
+        params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
 
-        logger.info(json.dumps({
-            "action": "export_start",
-            "userId": user_id,
-            "dateFrom": date_from,
-            "dateTo": date_to,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-        }))
+    # GSI-6 is KEYS_ONLY — read the items themselves from the table
+    items = list(batch_get(dynamodb_client, TABLE_NAME, keys).values())
+    items.sort(key=lambda item: item["SK"])
+    return items
 
-        # Query all user receipts
-        receipts = _query_user_receipts(user_id, date_from, date_to)
 
-        if not receipts:
-            return success({"message": "No receipts found for export", "receiptCount": 0})
+def _in_date_range(receipt, date_from, date_to):
+    purchase_date = receipt.get("purchaseDate", "")
+    if date_from and purchase_date < date_from:
+        return False
+    if date_to and purchase_date > date_to:
+        return False
+    return True
 
-        # Create ZIP in /tmp
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-        zip_filename = f"export_{timestamp}.zip"
-        zip_path = os.path.join(tempfile.gettempdir(), zip_filename)
 
-        serialized_receipts = []
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            for receipt in receipts:
-                serialized = _serialize_receipt(receipt)
-                serialized_receipts.append(serialized)
-                receipt_id = extract_receipt_id(receipt.get("SK", ""))
+def _initial_state(user_id, job):
+    """Snapshot the receipts and images a job will export.
 
-                # Add individual receipt JSON
-                receipt_json = json.dumps(serialized, indent=2, default=str)
-                zf.writestr(f"receipts/{receipt_id}.json", receipt_json)
+    The snapshot is taken once, by the first chunk, so later chunks export
+    exactly the same set in the same order even if the vault changes. For an
+    incremental job only receipts and images that changed since the base
+    export's manifest are selected; the new manifest still covers everything.
+    """
+    date_from, date_to = job.get("dateFrom"), job.get("dateTo")
+    include_images = job.get("includeImages", True)
+    snapshot_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
 
-                # Download and add original images
-                image_keys = _list_receipt_images(user_id, receipt_id)
-                for key in image_keys:
-                    image_name = key.split("/")[-1]
-                    image_data = _download_s3_object(key)
-                    zf.writestr(f"receipts/{receipt_id}/images/{image_name}", image_data)
-
-            # Add combined receipts.json
-            all_receipts_json = json.dumps(serialized_receipts, indent=2, default=str)
-            zf.writestr("receipts.json", all_receipts_json)
-
-        # Upload ZIP to export bucket
-        export_key = f"exports/{user_id}/{timestamp}.zip"
-        s3_client.upload_file(
-            zip_path,
-            EXPORT_BUCKET,
-            export_key,
-            ExtraArgs={"ContentType": "application/zip"},
-        )
+    base = None
+    if job.get("sinceExportId"):
+        base = _load_manifest(user_id, job["sinceExportId"])
+        if base is None:
+            raise NotFoundError(f"No manifest found for export {job['sinceExportId']}")
 
-        # Clean up /tmp
-        os.remove(zip_path)
+    if base is None:
+        receipts = _query_user_receipts(user_id, date_from, date_to)
+        manifest_receipts = {}
+    else:
+        since = (
+            datetime.strptime(base["snapshotAt"], "%Y-%m-%dT%H:%M:%SZ")
+            - timedelta(seconds=INDEX_LAG_SECONDS)
+        ).strftime("%Y-%m-%dT%H:%M:%SZ")
+        receipts = [
+            r for r in _query_changed_receipts(user_id, since)
+            if _in_date_range(r, date_from, date_to)
+        ]
+        manifest_receipts = dict(base["receipts"])
 
-        # Generate presigned download URL (24-hour expiry)
-        download_url = s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": EXPORT_BUCKET, "Key": export_key},
-            ExpiresIn=PRESIGNED_URL_EXPIRY,
+    serialized = {}
+    for receipt in receipts:
+        receipt_id = extract_receipt_id(receipt.get("SK", ""))
+        serialized[receipt_id] = _serialize_receipt(receipt)
+        manifest_receipts[receipt_id] = receipt.get("updatedAt", "")
+
+    manifest_images = {}
+    images = {}
+    if include_images:
+        base_images = base["images"] if base else {}
+        for receipt_id, objs in _list_user_images(user_id).items():
+            if receipt_id not in manifest_receipts:
+                continue
+            for obj in objs:
+                manifest_images[obj["Key"]] = obj["ETag"]
+                if base_images.get(obj["Key"]) != obj["ETag"]:
+                    images.setdefault(receipt_id, []).append(obj)
+
+    return {
+        # Receipts in query order, then receipts with only new images
+        "receiptIds": list(serialized) + [rid for rid in images if rid not in serialized],
+        "receipts": serialized,
+        "images": images,
+        "imagesSkipped": len(manifest_images) - sum(len(v) for v in images.values()),
+        "manifest": {
+            "exportId": job["exportId"],
+            "sinceExportId": job.get("sinceExportId"),
+            "snapshotAt": snapshot_at,
+            "dateFrom": date_from,
+            "dateTo": date_to,
+            "includeImages": include_images,
+            "receipts": manifest_receipts,
+            "images": manifest_images,
+        },
+        "nextIndex": 0,
+        "imagesProcessed": 0,
+        "upload": None,
+        "entries": [],
+    }
+
+
+def _presign_export(export_key):
+    download_url = s3_client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": EXPORT_BUCKET, "Key": export_key},
+        ExpiresIn=PRESIGNED_URL_EXPIRY,
+    )
+    expires_at = (
+        datetime.now(timezone.utc) + timedelta(seconds=PRESIGNED_URL_EXPIRY)
+    ).isoformat()
+    return download_url, expires_at
+
+
+def _size_mb(size):
+    return round(int(size) / (1024 * 1024), 1)
+
+
+# ---------------------------------------------------------------------------
+# SQS worker
+# ---------------------------------------------------------------------------
+
+def _handle_job_messages(event, context):
+    """SQS handler — run each export chunk carried by the event.
+
+    A retryable error propagates, so SQS delivers the message again (and
+    moves it to the DLQ after EXPORT_MAX_RECEIVES receives).
+    """
+    for record in event.get("Records", []):
+        message = json.loads(record["body"])
+        receive_count = int((record.get("attributes") or {}).get("ApproximateReceiveCount", 1))
+        _run_export_chunk(
+            message["userId"], message["exportId"], int(message["sequence"]), context,
+            final_attempt=receive_count >= EXPORT_MAX_RECEIVES,
         )
+    return {"processed": len(event.get("Records", []))}
 
-        expires_at = datetime.now(timezone.utc).isoformat()
 
-        # TODO: Send SNS notification with download URL
-        # sns_client.publish(...)
+def _run_export_chunk(user_id, export_id, sequence, context, final_attempt=True):
+    """Run one chunk of an export job, resuming from its checkpoint.
 
+    On a retryable error that is not the final attempt the lease is
+    released and the error re-raised; the saved checkpoint is kept, so the
+    retry resumes from the last one. Any other error fails the job.
+    """
+    job = _claim_chunk(user_id, export_id, sequence, context)
+    if job is None:
         logger.info(json.dumps({
-            "action": "export_complete",
-            "userId": user_id,
-            "receiptCount": len(receipts),
-            "exportKey": export_key,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "action": "export_chunk_skipped",
+            "exportId": export_id,
+            "sequence": sequence,
         }))
+        _resend_handoff(user_id, export_id, sequence)
+        return
 
-        return success({
-            "downloadUrl": download_url,
-            "expiresAt": expires_at,
-            "receiptCount": len(receipts),
-        })
+    writer = None
+    zf = None
+    try:
+        state, tail = _load_state(user_id, export_id) if sequence else (None, b"")
+        if state is None:
+            state = _initial_state(user_id, job)
+
+        writer = S3MultipartWriter(
+            s3_client,
+            EXPORT_BUCKET,
+            _export_key(user_id, export_id),
+            part_size=EXPORT_PART_SIZE,
+            content_type="application/zip",
+            resume_state=state["upload"],
+            resume_buffer=tail,
+        )
+        zf = zipfile.ZipFile(writer, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+        restore_entries(zf, state["entries"])
+
+        finished = _write_receipts(user_id, export_id, zf, writer, state, context)
+        if finished:
+            _complete_export(user_id, export_id, zf, writer, state)
+        else:
+            _pause_export(user_id, export_id, sequence, zf, writer, state)
 
-    except ValueError as e:
-        return error(str(e), status_code=401, code="UNAUTHORIZED")
-    except ValidationError as e:
-        return error(e.message, status_code=400, code=e.code)
     except Exception as e:
+        retry = _is_retryable(e) and not final_attempt
         logger.error(json.dumps({
-            "action": "export_error",
+            "action": "export_chunk_retry" if retry else "export_error",
+            "userId": user_id,
+            "exportId": export_id,
+            "sequence": sequence,
             "error": str(e),
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }))
-        return error("Export failed", status_code=500, code="INTERNAL_ERROR")
+        if zf is not None:
+            detach_archive(zf)
+        if retry:
+            # The upload may already be in a saved checkpoint, so it is left
+            # open; one no checkpoint names is aborted by the bucket's
+            # lifecycle rule
+            if writer is not None:
+                writer.release()
+            _release_lease(user_id, export_id, sequence)
+            raise
+        if writer is not None:
+            writer.abort()
+        _delete_state(user_id, export_id)
+        _update_job(
+            user_id, export_id,
+            {"status": STATUS_FAILED, "error": "Export failed"},
+            remove=("leaseExpiresAt",),
+        )
+
+
+def _resend_handoff(user_id, export_id, sequence):
+    """Queue chunk ``sequence + 1`` again if this chunk paused but lost its hand-off.
+
+    A chunk that checkpointed and advanced the job but then failed to send
+    the next message is retried by SQS; the retry cannot claim the chunk,
+    so it repeats the send. A duplicate next message is harmless, as only
+    one delivery can claim a chunk.
+    """
+    if not EXPORT_QUEUE_URL:
+        return
+    job = _get_job(user_id, export_id)
+    if (
+        job
+        and job.get("status") == STATUS_PROCESSING
+        and int(job.get("sequence", 0)) == sequence + 1
+        and "leaseExpiresAt" not in job
+    ):
+        _enqueue_chunk(user_id, export_id, sequence + 1)
+
+
+def _write_receipts(user_id, export_id, zf, writer, state, context):
+    """Append receipts to the archive until done or out of time.
+
+    Returns True once every selected receipt has been written.
+    """
+    receipts = state["receipts"]
+    images = state["images"]
+    start = state["nextIndex"]
+    receipt_ids = state["receiptIds"]
+
+    image_objects = [
+        obj for receipt_id in receipt_ids[start:] for obj in images.get(receipt_id, [])
+    ]
+    fetched_images = ordered_prefetch(
+        image_objects,
+        _fetch_s3_object,
+        lambda obj: obj["Size"],
+        max_workers=PREFETCH_WORKERS,
+        memory_budget=PREFETCH_BUDGET,
+    )
+
+    try:
+        for index in range(start, len(receipt_ids)):
+            receipt_id = receipt_ids[index]
+            # Unchanged receipts with changed images only contribute images
+            if receipt_id in receipts:
+                receipt_json = json.dumps(receipts[receipt_id], indent=2, default=str)
+                zf.writestr(f"receipts/{receipt_id}.json", receipt_json)
+
+            # Prefetched images arrive in the same order as image_objects
+            for _ in images.get(receipt_id, []):
+                obj, image_data = next(fetched_images)
+                image_name = obj["Key"].split("/")[-1]
+                _write_image(
+                    zf, f"receipts/{receipt_id}/images/{image_name}", image_data
+                )
+                state["imagesProcessed"] += 1
+
+            state["nextIndex"] = index + 1
+            if state["nextIndex"] % PROGRESS_INTERVAL == 0:
+                _update_job(user_id, export_id, _progress(state, writer))
+            if state["nextIndex"] < len(receipt_ids) and not has_time_left(
+                context, CHUNK_RESERVE_MS
+            ):
+                return False
+    finally:
+        fetched_images.close()
+
+    return True
+
+
+def _progress(state, writer):
+    return {
+        "receiptsTotal": len(state["receiptIds"]),
+        "receiptsProcessed": state["nextIndex"],
+        "imagesProcessed": state["imagesProcessed"],
+        "bytesWritten": writer.tell(),
+    }
+
+
+def _pause_export(user_id, export_id, sequence, zf, writer, state):
+    """Checkpoint the archive and hand the rest of the job to the next chunk."""
+    # The archive is detached, not closed: closing it would write the
+    # central directory
+    state["entries"] = snapshot_entries(zf)
+    detach_archive(zf)
+    state["upload"], tail = writer.checkpoint()
+    _save_state(user_id, export_id, state, tail)
+
+    _update_job(
+        user_id, export_id,
+        {**_progress(state, writer), "sequence": sequence + 1},
+        remove=("leaseExpiresAt",),
+        expected_sequence=sequence,
+    )
+
+    logger.info(json.dumps({
+        "action": "export_chunk_paused",
+        "userId": user_id,
+        "exportId": export_id,
+        "sequence": sequence,
+        **_progress(state, writer),
+    }))
+
+    _enqueue_chunk(user_id, export_id, sequence + 1)
+
+
+def _complete_export(user_id, export_id, zf, writer, state):
+    """Finish the archive, mark the job complete and notify the user."""
+    # Add combined receipts.json
+    all_receipts_json = json.dumps(list(state["receipts"].values()), indent=2, default=str)
+    zf.writestr("receipts.json", all_receipts_json)
+    zf.close()
+    writer.close()
+
+    # The manifest outlives the export so later exports can diff against it
+    s3_client.put_object(
+        Bucket=EXPORT_BUCKET,
+        Key=_manifest_key(user_id, export_id),
+        Body=json.dumps(state["manifest"]).encode("utf-8"),
+        ContentType="application/json",
+    )
+    _delete_state(user_id, export_id)
+
+    export_key = _export_key(user_id, export_id)
+    progress = _progress(state, writer)
+    completed_at = datetime.now(timezone.utc).isoformat()
+    _update_job(
+        user_id, export_id,
+        {
+            **progress,
+            "status": STATUS_COMPLETED,
+            "exportKey": export_key,
+            "fileSize": progress["bytesWritten"],
+            "receiptCount": len(state["receipts"]),
+            "imagesSkipped": state["imagesSkipped"],
+            "completedAt": completed_at,
+        },
+        remove=("leaseExpiresAt",),
+    )
+
+    download_url, expires_at = _presign_export(export_key)
+    if SNS_TOPIC_ARN:
+        sns_client.publish(
+            TopicArn=SNS_TOPIC_ARN,
+            Message=json.dumps({
+                "event": "export.ready",
+                "exportId": export_id,
+                "downloadUrl": download_url,
+                "expiresAt": expires_at,
+                "fileSizeMb": _size_mb(progress["bytesWritten"]),
+                "receiptCount": len(state["receipts"]),
+                "incremental": bool(state["manifest"]["sinceExportId"]),
+                "timestamp": completed_at,
+            }),
+            MessageAttributes={
+                "userId": {"DataType": "String", "StringValue": user_id},
+                "notificationType": {"DataType": "String", "StringValue": "EXPORT_READY"},
+            },
+        )
+
+    logger.info(json.dumps({
+        "action": "export_complete",
+        "userId": user_id,
+        "exportId": export_id,
+        "receiptCount": len(state["receipts"]),
+        "imagesExported": state["imagesProcessed"],
+        "imagesSkipped": state["imagesSkipped"],
+        "exportKey": export_key,
+        "timestamp": completed_at,
+    }))
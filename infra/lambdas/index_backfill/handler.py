@@ -0,0 +1,199 @@
+"""Index backfill — repairs derived attributes on existing receipts.
+
+Receipts written before shared.indexing derived their GSI keys may have a
+missing warrantyExpiryDate, stale GSI-3/4/5 keys or no GSI-8 key at all.
+This job walks every receipt and rewrites the derived attributes that do not
+match what shared.indexing computes. It is invoked manually (no schedule);
+the invocation is the coordinator: it splits a parallel Scan into segments
+and hands each one to a worker through SQS, or runs them on a local thread
+pool when no queue is configured. Segment progress is checkpointed, so a
+timed-out run resumes, and repairs are conditional on serverVersion, so
+running it alongside live traffic is safe. A repair that corrects
+warrantyExpiryDate bumps serverVersion, so devices pull the receipt (see
+shared.indexing). Users without stats items get them built from their
+receipts (see shared.stats).
+
+Event fields (all optional):
+    runId    checkpoint namespace; re-use the ID logged by an interrupted run
+             to resume it (a fresh one is generated when omitted)
+    dryRun   count the receipts that need repair without writing
+"""
+
+import json
+import os
+import logging
+import time
+from datetime import datetime, timezone
+
+from boto3.dynamodb.conditions import Attr
+
+from shared.clients import lazy_client
+from shared.fastpath import FastTable
+from shared.dynamodb import extract_user_id
+from shared.indexing import DERIVED_ATTRIBUTES, repair_item, repair_update
+from shared.stats import load_stats
+from shared.fanout import (
+    SegmentTimeout,
+    dispatch_segments,
+    get_run_id,
+    parse_segment_messages,
+    requeue_segment,
+    run_segment,
+    scan_segment,
+    sum_counters,
+)
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+TABLE_NAME = os.environ["TABLE_NAME"]
+REGION = os.environ.get("REGION", "eu-west-1")
+WORKER_QUEUE_URL = os.environ.get("WORKER_QUEUE_URL", "")
+TOTAL_SEGMENTS = int(os.environ.get("TOTAL_SEGMENTS", "8"))
+
+dynamodb_client = lazy_client("dynamodb", region_name=REGION)
+table = FastTable(dynamodb_client, TABLE_NAME)
+sqs_client = lazy_client("sqs", region_name=REGION)
+
+JOB_NAME = "index_backfill"
+
+# Everything derive_attributes() reads or writes
+_SOURCE_ATTRIBUTES = (
+    "PK", "SK", "receiptId", "status", "purchaseDate", "warrantyMonths",
+    "category", "merchantName", "updatedAt", "serverVersion",
+)
+
+
+def _receipt_pages(segment, total_segments):
+    """Page source for one Scan segment over receipt items."""
+    names = {
+        f"#a{i}": name
+        for i, name in enumerate(dict.fromkeys(_SOURCE_ATTRIBUTES + DERIVED_ATTRIBUTES))
+    }
+    params = {
+        "FilterExpression": Attr("SK").begins_with("RECEIPT#"),
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+    }
+
+    def pages(cursor):
+        return scan_segment(table, segment, total_segments, params, cursor)
+
+    return pages
+
+
+def _run_worker(run_id, segment, total_segments, dry_run, context):
+    """Repair one segment of a run and return its counters."""
+    seen_users = set()
+
+    def process_page(items):
+        repaired = 0
+        for item in items:
+            if dry_run:
+                fields, remove = repair_update(item)
+                repaired += bool(fields or remove)
+            elif repair_item(table, item):
+                repaired += 1
+
+        # Users whose receipts predate the stats items get them built here
+        user_ids = {extract_user_id(item["PK"]) for item in items} - seen_users
+        seen_users.update(user_ids)
+        if not dry_run:
+            now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            for user_id in user_ids:
+                load_stats(table, user_id, now_iso)
+        return {"receiptsScanned": len(items), "receiptsRepaired": repaired}
+
+    job_name = f"{JOB_NAME}_dry_run" if dry_run else JOB_NAME
+    return run_segment(
+        table,
+        job_name,
+        run_id,
+        segment,
+        _receipt_pages(segment, total_segments),
+        process_page,
+        context=context,
+    )
+
+
+def _handle_segment_messages(event, context):
+    """SQS worker — process the segments delivered in an SQS event."""
+    for message in parse_segment_messages(event):
+        try:
+            counters = _run_worker(
+                message["runId"],
+                message["segment"],
+                message["totalSegments"],
+                bool(message.get("dryRun")),
+                context,
+            )
+        except SegmentTimeout:
+            requeue_segment(sqs_client, WORKER_QUEUE_URL, message)
+            logger.info(json.dumps({
+                "action": "index_backfill_segment_requeued",
+                "runId": message["runId"],
+                "segment": message["segment"],
+            }))
+            continue
+
+        logger.info(json.dumps({
+            "action": "index_backfill_segment_complete",
+            "runId": message["runId"],
+            "segment": message["segment"],
+            **counters,
+        }))
+
+    return {"statusCode": 200, "body": json.dumps({"status": "ok"})}
+
+
+def handler(event, context):
+    """Manual invocation — repair derived attributes on every receipt.
+
+    Also acts as the SQS worker when invoked with segment messages.
+    """
+    try:
+        event = event or {}
+        if "Records" in event:
+            return _handle_segment_messages(event, context)
+
+        now_iso = datetime.now(timezone.utc).isoformat()
+        run_id = get_run_id(event)
+        dry_run = bool(event.get("dryRun"))
+
+        logger.info(json.dumps({
+            "action": "index_backfill_start",
+            "runId": run_id,
+            "segments": TOTAL_SEGMENTS,
+            "dryRun": dry_run,
+            "timestamp": now_iso,
+        }))
+
+        results = dispatch_segments(
+            JOB_NAME,
+            run_id,
+            TOTAL_SEGMENTS,
+            lambda segment: _run_worker(run_id, segment, TOTAL_SEGMENTS, dry_run, context),
+            sqs_client=sqs_client,
+            queue_url=WORKER_QUEUE_URL,
+            extra={"dryRun": dry_run},
+        )
+        totals = sum_counters(results)
+
+        logger.info(json.dumps({
+            "action": "index_backfill_complete",
+            "runId": run_id,
+            "dispatched": bool(WORKER_QUEUE_URL),
+            "dryRun": dry_run,
+            **totals,
+            "timestamp": now_iso,
+        }))
+
+        return {"statusCode": 200, "body": json.dumps({"dryRun": dry_run, **totals})}
+
+    except Exception as e:
+        logger.error(json.dumps({
+            "action": "index_backfill_error",
+            "error": str(e),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }))
+        raise
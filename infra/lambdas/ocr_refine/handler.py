@@ -4,11 +4,18 @@ import logging
 import time
 import base64
 
-import boto3
+from shared.clients import lazy_client, lazy_resource, lazy_table
 from shared.response import success, error
 from shared.auth import get_user_id
-from shared.dynamodb import build_pk, build_receipt_sk
+from shared.dynamodb import (
+    RECEIPT_UPDATE,
+    build_pk,
+    build_receipt_sk,
+)
 from shared.errors import NotFoundError, ValidationError
+from shared.indexing import repair_item
+from shared.streams import derived_views_inline
+from shared.synctree import record_version
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -20,10 +27,10 @@ BEDROCK_FALLBACK_MODEL_ID = os.environ.get("BEDROCK_FALLBACK_MODEL_ID", "anthrop
 S3_BUCKET = os.environ.get("S3_BUCKET", "")
 CONFIDENCE_THRESHOLD = float(os.environ.get("CONFIDENCE_THRESHOLD", "0.7"))
 
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-table = dynamodb.Table(TABLE_NAME)
-bedrock_client = boto3.client("bedrock-runtime", region_name=REGION)
-s3_client = boto3.client("s3", region_name=REGION)
+dynamodb = lazy_resource("dynamodb", region_name=REGION)
+table = lazy_table(TABLE_NAME, region_name=REGION)
+bedrock_client = lazy_client("bedrock-runtime", region_name=REGION)
+s3_client = lazy_client("s3", region_name=REGION)
 
 EXTRACTION_PROMPT = """Extract structured receipt data from this receipt image and/or OCR text.
 Return a JSON object with exactly these fields:
@@ -112,21 +119,7 @@ def handler(event, context):
         # 5. Update receipt in DynamoDB with extracted fields
         now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
 
-        update_expr_parts = [
-            "#updatedAt = :now",
-            "#sv = #sv + :one",
-            "#llmConfidence = :confidence",
-        ]
-        expr_names = {
-            "#updatedAt": "updatedAt",
-            "#sv": "serverVersion",
-            "#llmConfidence": "llmConfidence",
-        }
-        expr_values = {
-            ":now": now_iso,
-            ":one": 1,
-            ":confidence": str(extracted.get("confidence", 0)),
-        }
+        fields = {"llmConfidence": str(extracted.get("confidence", 0))}
 
         field_mapping = {
             "merchantName": "extractedMerchantName",
@@ -140,18 +133,35 @@ def handler(event, context):
         for source_field, db_field in field_mapping.items():
             value = extracted.get(source_field)
             if value is not None:
-                safe_name = f"#f_{db_field}"
-                safe_value = f":v_{db_field}"
-                update_expr_parts.append(f"{safe_name} = {safe_value}")
-                expr_names[safe_name] = db_field
-                expr_values[safe_value] = value if not isinstance(value, float) else str(value)
+                fields[db_field] = value if not isinstance(value, float) else str(value)
+
+        update_expr, expr_names, expr_values = RECEIPT_UPDATE.build(fields)
+        expr_values.update({":now": now_iso, ":one": 1})
 
-        table.update_item(
+        result = table.update_item(
             Key={"PK": build_pk(user_id), "SK": build_receipt_sk(receipt_id)},
-            UpdateExpression="SET " + ", ".join(update_expr_parts),
+            UpdateExpression=update_expr,
             ExpressionAttributeNames=expr_names,
             ExpressionAttributeValues=expr_values,
+            ReturnValues="ALL_NEW",
         )
+        refined = result["Attributes"]
+
+        # The refine runs for seconds without a version check, so derived
+        # attributes are brought in line from the written item afterwards
+        # (a corrected warranty expiry is one more version, folded in there)
+        repair_item(table, refined)
+
+        # Keep the sync tree in step (unless the stream processor does);
+        # a failure only makes the tree drift
+        if derived_views_inline():
+            try:
+                record_version(table, user_id, receipt_id, refined["serverVersion"])
+            except Exception:
+                logger.exception(json.dumps({
+                    "action": "sync_tree_update_failed",
+                    "receipt_id": receipt_id,
+                }))
 
         logger.info(json.dumps({
             "action": "ocr_refine_complete",
@@ -2,8 +2,7 @@ import json
 import os
 import logging
 
-import boto3
-from botocore.config import Config
+from shared.clients import lazy_client, lazy_resource, lazy_table
 from shared.response import success, error
 from shared.auth import get_user_id
 from shared.dynamodb import build_pk, build_receipt_sk
@@ -18,14 +17,14 @@ KMS_KEY_ID = os.environ.get("KMS_KEY_ID", "")
 URL_EXPIRY_SECONDS = int(os.environ.get("URL_EXPIRY_SECONDS", "600"))  # 10 minutes
 MAX_FILE_SIZE = int(os.environ.get("MAX_FILE_SIZE", "10485760"))  # 10 MB
 
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-table = dynamodb.Table(os.environ.get("TABLE_NAME", "ReceiptVault"))
+dynamodb = lazy_resource("dynamodb", region_name=REGION)
+table = lazy_table(os.environ.get("TABLE_NAME", "ReceiptVault"), region_name=REGION)
 
 # S3 client with signature version for KMS
-s3_client = boto3.client(
+s3_client = lazy_client(
     "s3",
     region_name=REGION,
-    config=Config(signature_version="s3v4"),
+    signature_version="s3v4",
 )
 
 ALLOWED_CONTENT_TYPES = {"image/jpeg", "image/png"}
@@ -1,31 +1,82 @@
+import datetime
+import hashlib
 import json
 import os
 import logging
 import time
 import uuid
 
-import boto3
-from boto3.dynamodb.conditions import Key
-from shared.response import success, error, created, no_content
+from boto3.dynamodb.conditions import Attr, Key
+from shared.clients import lazy_client
+from shared.fastpath import FastTable
+from shared.response import success, error, created, no_content, conditional, make_etag
 from shared.auth import get_user_id
 from shared.dynamodb import (
     build_pk,
     build_receipt_sk,
     build_categories_sk,
     build_settings_sk,
+    build_profile_sk,
+    build_stats_sk,
+    build_store_stats_sk,
+    META_UPDATE,
+    RECEIPT_UPDATE,
     extract_receipt_id,
     extract_user_id,
 )
-from shared.errors import NotFoundError, ForbiddenError, ConflictError, ValidationError
+from shared.errors import (
+    NotFoundError,
+    ForbiddenError,
+    ConflictError,
+    ValidationError,
+    InvalidCursorError,
+    InvalidDateFormatError,
+)
+from shared.pagination import decode_cursor, encode_cursor
+from shared.indexing import index_update, with_derived_attributes
+from shared.synctree import record_version
+from shared.stats import EXPIRY_PREFIX, STORE_PREFIX, record_stats
+from shared.streams import derived_views_inline
+from shared.cache import META_CACHE
+from shared.batch_io import batch_get
+from shared.categories import DEFAULT_CATEGORIES
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 TABLE_NAME = os.environ.get("TABLE_NAME", "ReceiptVault")
 REGION = os.environ.get("REGION", "eu-west-1")
+# False while GSI-8 (ByUserListView) is not yet deployed; lists use GSI-1
+LIST_VIEW_INDEX = os.environ.get("LIST_VIEW_INDEX", "true").lower() == "true"
+
+dynamodb_client = lazy_client("dynamodb", region_name=REGION)
+table = FastTable(dynamodb_client, TABLE_NAME)
+
+# GET /receipts page size and query budget
+LIST_DEFAULT_LIMIT = 20
+LIST_MAX_LIMIT = 100
+LIST_MAX_QUERIES = 5
+
+LIST_STATUSES = ("active", "returned", "expired", "archived", "deleted")
 
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-table = dynamodb.Table(TABLE_NAME)
+# Store counters returned by GET /user/bootstrap, most receipts first
+BOOTSTRAP_STORE_LIMIT = 20
+
+# Attributes a list view may request with fields= (never OCR text,
+# extracted line items or index keys)
+LIST_FIELDS = (
+    "receiptId", "displayName", "merchantName", "purchaseDate", "totalAmount",
+    "currency", "category", "status", "warrantyMonths", "warrantyExpiryDate",
+    "notes", "tags", "imageKeys", "isFavorite", "userEditedFields",
+    "serverVersion", "createdAt", "updatedAt",
+)
+
+# Attributes projected into GSI-8 (ByUserListView); the default projection
+SUMMARY_FIELDS = (
+    "receiptId", "displayName", "merchantName", "purchaseDate", "totalAmount",
+    "currency", "category", "status", "warrantyExpiryDate", "imageKeys",
+    "isFavorite", "serverVersion", "updatedAt",
+)
 
 
 def handler(event, context):
@@ -83,11 +134,14 @@ def handler(event, context):
         if resource == "/user/settings" and http_method == "PUT":
             return update_user_settings(event, user_id)
 
+        if resource == "/user/bootstrap" and http_method == "GET":
+            return get_user_bootstrap(event, user_id)
+
         return error("Route not found", status_code=404, code="NOT_FOUND")
 
     except ValidationError as exc:
         logger.warning(json.dumps({"error": "validation", "message": str(exc)}))
-        return error(str(exc), status_code=400, code="VALIDATION_ERROR")
+        return error(str(exc), status_code=400, code=exc.code)
     except NotFoundError as exc:
         logger.warning(json.dumps({"error": "not_found", "message": str(exc)}))
         return error(str(exc), status_code=404, code="NOT_FOUND")
@@ -129,78 +183,181 @@ def create_receipt(event, user_id):
         "currency": body.get("currency", "EUR"),
         "category": body.get("category", "Uncategorized"),
         "warrantyMonths": body.get("warrantyMonths"),
+        "warrantyExpiryDate": body.get("warrantyExpiryDate"),
         "notes": body.get("notes", ""),
         "tags": body.get("tags", []),
         "imageKeys": body.get("imageKeys", []),
         "userEditedFields": body.get("userEditedFields", []),
     }
 
-    # Compute warrantyExpiryDate if warrantyMonths is set
-    if item.get("warrantyMonths") and item.get("purchaseDate"):
-        # TODO: compute actual expiry from purchaseDate + warrantyMonths
-        pass
-
-    # GSI-4: ByWarrantyExpiry (sparse — only if warranty exists)
-    if item.get("warrantyExpiryDate"):
-        item["GSI4PK"] = f"{build_pk(user_id)}#ACTIVE"
-
-    # GSI attributes
-    item["GSI1PK"] = build_pk(user_id)
-    item["GSI1SK"] = item["purchaseDate"]
-    item["GSI2PK"] = build_pk(user_id)
-    item["GSI2SK"] = f"CAT#{item['category']}"
-    if item.get("merchantName"):
-        item["GSI3PK"] = build_pk(user_id)
-        item["GSI3SK"] = f"STORE#{item['merchantName']}"
-    item["GSI5PK"] = build_pk(user_id)
-    item["GSI5SK"] = f"STATUS#active#{item['purchaseDate']}"
-    item["GSI6PK"] = build_pk(user_id)
-    item["GSI6SK"] = now_iso
-
-    # Remove None values — DynamoDB does not accept them
+    # Remove None values — DynamoDB does not accept them — then derive
+    # warrantyExpiryDate and the GSI keys from what is left
     item = {k: v for k, v in item.items() if v is not None}
+    item = with_derived_attributes(item)
 
     table.put_item(
         Item=item,
         ConditionExpression="attribute_not_exists(PK)",
     )
 
+    _record_receipt_write(None, item, now_iso)
+
     logger.info(json.dumps({"action": "create_receipt", "receipt_id": receipt_id}))
     return created({"receiptId": receipt_id, "receipt": item})
 
 
 def list_receipts(event, user_id):
-    """GET /receipts — paginated list of user receipts."""
+    """GET /receipts — filtered, paginated list of user receipts.
+
+    A status filter is served by GSI-5 (ByUserStatus), whose sort key
+    ``STATUS#<status>#<purchaseDate>`` also carries the date range. Otherwise
+    the compact GSI-8 (ByUserListView), which holds only non-deleted receipts,
+    is queried by purchase date when the requested fields are all projected
+    into it (the default), and GSI-1 (ByUserDate) when they are not, when
+    deleted receipts are included or when LIST_VIEW_INDEX is off. Category and store are filter expressions
+    on whichever index is used.
+    """
     qs = event.get("queryStringParameters") or {}
-    limit = int(qs.get("limit", "25"))
-    last_key_raw = qs.get("lastEvaluatedKey")
+    limit = _parse_limit(qs.get("limit"))
+    date_from = _parse_date(qs.get("dateFrom"), "dateFrom")
+    date_to = _parse_date(qs.get("dateTo"), "dateTo")
+    if date_from and date_to and date_from > date_to:
+        raise ValidationError("dateFrom must not be after dateTo")
+
+    status = qs.get("status")
+    if status and status not in LIST_STATUSES:
+        raise ValidationError(f"Invalid status. Must be one of: {', '.join(LIST_STATUSES)}")
+    order = qs.get("order", "desc")
+    if order not in ("asc", "desc"):
+        raise ValidationError("order must be 'asc' or 'desc'")
+    include_deleted = qs.get("includeDeleted", "false").lower() == "true"
+    category = qs.get("category")
+    store = qs.get("store")
+
+    fields = _list_fields(qs.get("fields"))
+
+    pk = build_pk(user_id)
+    filters = []
+    if status:
+        index_name = "ByUserStatus"
+        prefix = f"STATUS#{status}#"
+        if date_from or date_to:
+            date_range = Key("GSI5SK").between(prefix + (date_from or ""), prefix + (date_to or "~"))
+        else:
+            date_range = Key("GSI5SK").begins_with(prefix)
+        key_condition = Key("GSI5PK").eq(pk) & date_range
+    else:
+        if LIST_VIEW_INDEX and not include_deleted and set(fields) <= set(SUMMARY_FIELDS):
+            index_name, pk_attr, sk_attr = "ByUserListView", "GSI8PK", "purchaseDate"
+        else:
+            index_name, pk_attr, sk_attr = "ByUserDate", "GSI1PK", "GSI1SK"
+            if not include_deleted:
+                filters.append(Attr("status").ne("deleted"))
+        key_condition = Key(pk_attr).eq(pk)
+        if date_from and date_to:
+            key_condition &= Key(sk_attr).between(date_from, date_to)
+        elif date_from:
+            key_condition &= Key(sk_attr).gte(date_from)
+        elif date_to:
+            key_condition &= Key(sk_attr).lte(date_to)
+    if category:
+        filters.append(Attr("category").eq(category))
+    if store:
+        filters.append(Attr("merchantName").eq(store))
+
+    # A cursor is only valid for the user and query that produced it
+    query_id = hashlib.sha256(json.dumps(
+        [pk, index_name, status, date_from, date_to, order, include_deleted, category, store]
+    ).encode("utf-8")).hexdigest()[:16]
+
+    start_key = None
+    if qs.get("cursor"):
+        state = decode_cursor(qs["cursor"], signed=True)
+        if state.get("q") != query_id or not isinstance(state.get("key"), dict):
+            raise InvalidCursorError("Cursor does not belong to this query")
+        start_key = state["key"]
 
     query_kwargs = {
-        "KeyConditionExpression": Key("PK").eq(build_pk(user_id))
-            & Key("SK").begins_with("RECEIPT#"),
-        "Limit": limit,
-        "ScanIndexForward": False,
+        "IndexName": index_name,
+        "KeyConditionExpression": key_condition,
+        "ScanIndexForward": order == "asc",
     }
+    if filters:
+        condition = filters[0]
+        for extra in filters[1:]:
+            condition &= extra
+        query_kwargs["FilterExpression"] = condition
+    projection_names = {f"#p{i}": field for i, field in enumerate(fields)}
+    query_kwargs["ProjectionExpression"] = ", ".join(projection_names)
+    query_kwargs["ExpressionAttributeNames"] = projection_names
+
+    # Limit applies before the filter, so keep reading until the page is full
+    # or the query budget is spent, then hand back a cursor to continue from
+    items = []
+    for _ in range(LIST_MAX_QUERIES):
+        query_kwargs["Limit"] = limit - len(items)
+        if start_key:
+            query_kwargs["ExclusiveStartKey"] = start_key
+        response = table.query(**query_kwargs)
+        items.extend(response.get("Items", []))
+        start_key = response.get("LastEvaluatedKey")
+        if not start_key or len(items) >= limit:
+            break
+
+    next_cursor = None
+    if start_key:
+        next_cursor = encode_cursor({"key": start_key, "q": query_id}, signed=True)
 
-    if last_key_raw:
-        query_kwargs["ExclusiveStartKey"] = json.loads(last_key_raw)
-
-    response = table.query(**query_kwargs)
-    items = response.get("Items", [])
-    result = {
-        "receipts": items,
+    logger.info(json.dumps({
+        "action": "list_receipts",
+        "index": index_name,
         "count": len(items),
-    }
-    if "LastEvaluatedKey" in response:
-        result["lastEvaluatedKey"] = response["LastEvaluatedKey"]
+        "has_more": next_cursor is not None,
+    }))
+    return success({
+        "items": items,
+        "count": len(items),
+        "nextCursor": next_cursor,
+    })
 
-    return success(result)
+
+def _parse_limit(raw):
+    if raw is None:
+        return LIST_DEFAULT_LIMIT
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ValidationError("limit must be an integer")
+    if not 1 <= limit <= LIST_MAX_LIMIT:
+        raise ValidationError(f"limit must be between 1 and {LIST_MAX_LIMIT}")
+    return limit
+
+
+def _parse_date(raw, name):
+    if not raw:
+        return None
+    try:
+        return datetime.date.fromisoformat(raw).isoformat()
+    except ValueError:
+        raise InvalidDateFormatError(f"{name} must be an ISO 8601 date (YYYY-MM-DD)")
+
+
+def _list_fields(raw):
+    """Return the attributes to project for a ``fields=`` parameter."""
+    if not raw:
+        return SUMMARY_FIELDS
+    requested = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = sorted(set(requested) - set(LIST_FIELDS))
+    if unknown:
+        raise ValidationError(f"Unknown fields: {', '.join(unknown)}")
+    return ["receiptId"] + [f for f in dict.fromkeys(requested) if f != "receiptId"]
 
 
 def get_receipt(event, user_id, receipt_id):
     """GET /receipts/{receiptId}"""
     item = _get_receipt_or_raise(user_id, receipt_id)
-    return success(item)
+    etag = make_etag("receipt", user_id, receipt_id, item.get("serverVersion"), item.get("updatedAt"))
+    return conditional(event, item, etag)
 
 
 def update_receipt(event, user_id, receipt_id):
@@ -212,41 +369,25 @@ def update_receipt(event, user_id, receipt_id):
 
     now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
 
-    # Build update expression dynamically from allowed fields
     allowed_fields = [
         "displayName", "merchantName", "purchaseDate", "totalAmount",
         "currency", "category", "warrantyMonths", "notes", "tags",
         "imageKeys", "userEditedFields", "warrantyExpiryDate",
     ]
-    expr_parts = ["#updatedAt = :updatedAt", "#sv = #sv + :one"]
-    expr_names = {
-        "#updatedAt": "updatedAt",
-        "#sv": "serverVersion",
-    }
-    expr_values = {
-        ":updatedAt": now_iso,
+    fields = {field: body[field] for field in allowed_fields if field in body}
+
+    # Derived attributes depend on fields the body may not carry (status,
+    # purchaseDate, ...); the version condition below rejects the write if
+    # the receipt changed since this read
+    current = _get_receipt_or_raise(user_id, receipt_id)
+    fields, remove = index_update(current, fields)
+
+    update_expr, expr_names, expr_values = RECEIPT_UPDATE.build(fields, remove)
+    expr_values.update({
+        ":now": now_iso,
         ":one": 1,
         ":expectedVersion": int(expected_version),
-    }
-
-    for field in allowed_fields:
-        if field in body:
-            safe = f"#f_{field}"
-            expr_parts.append(f"{safe} = :v_{field}")
-            expr_names[safe] = field
-            expr_values[f":v_{field}"] = body[field]
-
-    # Update GSI projections as needed
-    if "purchaseDate" in body:
-        expr_parts.append("#gsi1sk = :gsi1sk")
-        expr_names["#gsi1sk"] = "GSI1SK"
-        expr_values[":gsi1sk"] = body["purchaseDate"]
-    if "category" in body:
-        expr_parts.append("#gsi2sk = :gsi2sk")
-        expr_names["#gsi2sk"] = "GSI2SK"
-        expr_values[":gsi2sk"] = f"CAT#{body['category']}"
-
-    update_expr = "SET " + ", ".join(expr_parts)
+    })
 
     try:
         result = table.update_item(
@@ -257,41 +398,21 @@ def update_receipt(event, user_id, receipt_id):
             ConditionExpression="#sv = :expectedVersion",
             ReturnValues="ALL_NEW",
         )
-    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+    except table.exceptions.ConditionalCheckFailedException:
         raise ConflictError("Version conflict — receipt was modified by another client")
 
+    _record_receipt_write(current, result["Attributes"], now_iso)
+
     logger.info(json.dumps({"action": "update_receipt", "receipt_id": receipt_id}))
     return success(result["Attributes"])
 
 
 def delete_receipt(event, user_id, receipt_id):
     """DELETE /receipts/{receiptId} — soft delete with 30-day TTL."""
-    _get_receipt_or_raise(user_id, receipt_id)
+    item = _get_receipt_or_raise(user_id, receipt_id)
 
-    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
     ttl_epoch = int(time.time()) + 2592000  # 30 days
-
-    table.update_item(
-        Key={"PK": build_pk(user_id), "SK": build_receipt_sk(receipt_id)},
-        UpdateExpression=(
-            "SET #status = :deleted, #ttl = :ttl, #updatedAt = :now, "
-            "#gsi5sk = :gsi5sk, #sv = #sv + :one"
-        ),
-        ExpressionAttributeNames={
-            "#status": "status",
-            "#ttl": "ttl",
-            "#updatedAt": "updatedAt",
-            "#gsi5sk": "GSI5SK",
-            "#sv": "serverVersion",
-        },
-        ExpressionAttributeValues={
-            ":deleted": "deleted",
-            ":ttl": ttl_epoch,
-            ":now": now_iso,
-            ":gsi5sk": f"STATUS#deleted#{now_iso[:10]}",
-            ":one": 1,
-        },
-    )
+    _update_with_indexes(item, {"status": "deleted", "ttl": ttl_epoch})
 
     logger.info(json.dumps({"action": "soft_delete_receipt", "receipt_id": receipt_id}))
     return no_content()
@@ -303,30 +424,7 @@ def restore_receipt(event, user_id, receipt_id):
     if item.get("status") != "deleted":
         raise ValidationError("Receipt is not deleted")
 
-    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-    purchase_date = item.get("purchaseDate", now_iso[:10])
-
-    table.update_item(
-        Key={"PK": build_pk(user_id), "SK": build_receipt_sk(receipt_id)},
-        UpdateExpression=(
-            "SET #status = :active, #updatedAt = :now, "
-            "#gsi5sk = :gsi5sk, #sv = #sv + :one "
-            "REMOVE #ttl"
-        ),
-        ExpressionAttributeNames={
-            "#status": "status",
-            "#ttl": "ttl",
-            "#updatedAt": "updatedAt",
-            "#gsi5sk": "GSI5SK",
-            "#sv": "serverVersion",
-        },
-        ExpressionAttributeValues={
-            ":active": "active",
-            ":now": now_iso,
-            ":gsi5sk": f"STATUS#active#{purchase_date}",
-            ":one": 1,
-        },
-    )
+    _update_with_indexes(item, {"status": "active"}, remove=["ttl"])
 
     logger.info(json.dumps({"action": "restore_receipt", "receipt_id": receipt_id}))
     return success({"receiptId": receipt_id, "status": "active"})
@@ -343,34 +441,47 @@ def update_status(event, user_id, receipt_id):
     if new_status not in valid_statuses:
         raise ValidationError(f"Invalid status. Must be one of: {', '.join(valid_statuses)}")
 
-    _get_receipt_or_raise(user_id, receipt_id)
-
-    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    item = _get_receipt_or_raise(user_id, receipt_id)
 
-    table.update_item(
-        Key={"PK": build_pk(user_id), "SK": build_receipt_sk(receipt_id)},
-        UpdateExpression=(
-            "SET #status = :status, #updatedAt = :now, "
-            "#gsi5sk = :gsi5sk, #sv = #sv + :one"
-        ),
-        ExpressionAttributeNames={
-            "#status": "status",
-            "#updatedAt": "updatedAt",
-            "#gsi5sk": "GSI5SK",
-            "#sv": "serverVersion",
-        },
-        ExpressionAttributeValues={
-            ":status": new_status,
-            ":now": now_iso,
-            ":gsi5sk": f"STATUS#{new_status}#{now_iso[:10]}",
-            ":one": 1,
-        },
-    )
+    _update_with_indexes(item, {"status": new_status})
 
     logger.info(json.dumps({"action": "update_status", "receipt_id": receipt_id, "status": new_status}))
     return success({"receiptId": receipt_id, "status": new_status})
 
 
+def _update_with_indexes(current, fields, remove=()):
+    """Apply a server-side change to a receipt read as ``current``.
+
+    Derived attributes (GSI keys, warranty expiry) follow the change in the
+    same write, which is conditional on the version that was read, and the
+    sync tree and stats follow it. Returns the updated item.
+    """
+    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    fields, remove = index_update(current, fields, remove)
+
+    update_expr, expr_names, expr_values = RECEIPT_UPDATE.build(fields, remove)
+    expr_values.update({
+        ":now": now_iso,
+        ":one": 1,
+        ":expectedVersion": current.get("serverVersion", 0),
+    })
+
+    try:
+        result = table.update_item(
+            Key={"PK": current["PK"], "SK": current["SK"]},
+            UpdateExpression=update_expr,
+            ExpressionAttributeNames=expr_names,
+            ExpressionAttributeValues=expr_values,
+            ConditionExpression="#sv = :expectedVersion",
+            ReturnValues="ALL_NEW",
+        )
+    except table.exceptions.ConditionalCheckFailedException:
+        raise ConflictError("Version conflict — receipt was modified by another client")
+
+    _record_receipt_write(current, result["Attributes"], now_iso)
+    return result["Attributes"]
+
+
 # ---------------------------------------------------------------------------
 # Warranty queries
 # ---------------------------------------------------------------------------
@@ -407,14 +518,12 @@ def get_expiring_warranties(event, user_id):
 
 def get_user_profile(event, user_id):
     """GET /user/profile"""
-    response = table.get_item(
-        Key={"PK": build_pk(user_id), "SK": "META#PROFILE"},
-    )
-    item = response.get("Item")
+    item = META_CACHE.get_item(table, {"PK": build_pk(user_id), "SK": build_profile_sk()})
     if not item:
         # Return empty profile shell
-        return success({"userId": user_id, "profile": {}})
-    return success(item)
+        return conditional(event, {"userId": user_id, "profile": {}}, make_etag("profile", user_id))
+    etag = make_etag("profile", user_id, item.get("version"), item.get("updatedAt"))
+    return conditional(event, item, etag)
 
 
 def update_user_profile(event, user_id):
@@ -423,23 +532,20 @@ def update_user_profile(event, user_id):
     now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
 
     allowed = ["displayName", "preferredCurrency", "locale", "timezone"]
-    expr_parts = ["#updatedAt = :now"]
-    expr_names = {"#updatedAt": "updatedAt"}
-    expr_values = {":now": now_iso}
-
-    for field in allowed:
-        if field in body:
-            safe = f"#f_{field}"
-            expr_parts.append(f"{safe} = :v_{field}")
-            expr_names[safe] = field
-            expr_values[f":v_{field}"] = body[field]
+    update_expr, expr_names, expr_values = META_UPDATE.build(
+        {field: body[field] for field in allowed if field in body}
+    )
+    expr_values[":now"] = now_iso
+    expr_values[":zero"] = 0
+    expr_values[":one"] = 1
 
     table.update_item(
-        Key={"PK": build_pk(user_id), "SK": "META#PROFILE"},
-        UpdateExpression="SET " + ", ".join(expr_parts),
+        Key={"PK": build_pk(user_id), "SK": build_profile_sk()},
+        UpdateExpression=update_expr,
         ExpressionAttributeNames=expr_names,
         ExpressionAttributeValues=expr_values,
     )
+    META_CACHE.invalidate_item(build_pk(user_id), build_profile_sk())
 
     logger.info(json.dumps({"action": "update_user_profile", "user_id": user_id}))
     return success({"message": "Profile updated"})
@@ -447,13 +553,11 @@ def update_user_profile(event, user_id):
 
 def get_user_settings(event, user_id):
     """GET /user/settings"""
-    response = table.get_item(
-        Key={"PK": build_pk(user_id), "SK": build_settings_sk()},
-    )
-    item = response.get("Item")
+    item = META_CACHE.get_item(table, {"PK": build_pk(user_id), "SK": build_settings_sk()})
     if not item:
-        return success({"userId": user_id, "settings": {}})
-    return success(item)
+        return conditional(event, {"userId": user_id, "settings": {}}, make_etag("settings", user_id))
+    etag = make_etag("settings", user_id, item.get("version"), item.get("updatedAt"))
+    return conditional(event, item, etag)
 
 
 def update_user_settings(event, user_id):
@@ -465,32 +569,124 @@ def update_user_settings(event, user_id):
         "storageMode", "notificationsEnabled", "reminderDaysBefore",
         "autoArchiveDays", "theme", "locale",
     ]
-    expr_parts = ["#updatedAt = :now"]
-    expr_names = {"#updatedAt": "updatedAt"}
-    expr_values = {":now": now_iso}
-
-    for field in allowed:
-        if field in body:
-            safe = f"#f_{field}"
-            expr_parts.append(f"{safe} = :v_{field}")
-            expr_names[safe] = field
-            expr_values[f":v_{field}"] = body[field]
+    update_expr, expr_names, expr_values = META_UPDATE.build(
+        {field: body[field] for field in allowed if field in body}
+    )
+    expr_values[":now"] = now_iso
+    expr_values[":zero"] = 0
+    expr_values[":one"] = 1
 
     table.update_item(
         Key={"PK": build_pk(user_id), "SK": build_settings_sk()},
-        UpdateExpression="SET " + ", ".join(expr_parts),
+        UpdateExpression=update_expr,
         ExpressionAttributeNames=expr_names,
         ExpressionAttributeValues=expr_values,
     )
+    META_CACHE.invalidate_item(build_pk(user_id), build_settings_sk())
 
     logger.info(json.dumps({"action": "update_user_settings", "user_id": user_id}))
     return success({"message": "Settings updated"})
 
 
+def get_user_bootstrap(event, user_id):
+    """GET /user/bootstrap — profile, settings, categories and stats at once.
+
+    Replaces three calls at app launch with one BatchGetItem of all five
+    items and writes nothing. Nothing is served from the container's META
+    cache: the stats items change with every receipt write and categories
+    are written by category-handler, whose invalidations never reach this
+    container, and the BatchGetItem is made for the stats items anyway. The
+    profile and settings read here refresh the cache. Stats items are built
+    and pruned elsewhere (see shared.stats); a missing one contributes no
+    counters. Only the BOOTSTRAP_STORE_LIMIT largest store counters are
+    returned.
+    """
+    pk = build_pk(user_id)
+    stats_sk, stores_sk = build_stats_sk(), build_store_stats_sk()
+    meta_sks = (build_profile_sk(), build_settings_sk(), build_categories_sk())
+    all_sks = (stats_sk, stores_sk, *meta_sks)
+
+    fetched = batch_get(dynamodb_client, TABLE_NAME, [{"PK": pk, "SK": sk} for sk in all_sks])
+    items = {sk: fetched.get((pk, sk)) for sk in all_sks}
+    for sk in (build_profile_sk(), build_settings_sk()):
+        META_CACHE.put_item(pk, sk, items[sk])
+
+    profile = items[build_profile_sk()] or {}
+    settings = items[build_settings_sk()] or {}
+    categories = items[build_categories_sk()] or {}
+
+    versions = [
+        (items[sk] or {}).get(attr)
+        for sk in all_sks
+        for attr in ("version", "updatedAt")
+    ]
+    etag = make_etag("bootstrap", user_id, *versions, *DEFAULT_CATEGORIES)
+    return conditional(event, {
+        "userId": user_id,
+        "profile": profile,
+        "settings": settings,
+        "categories": {
+            "defaults": DEFAULT_CATEGORIES,
+            "custom": categories.get("categories", []),
+            "version": categories.get("version", 0),
+        },
+        "stats": _bootstrap_stats(items[stats_sk] or {}, items[stores_sk] or {}),
+    }, etag)
+
+
+def _bootstrap_stats(stats, stores):
+    """Merge the stats counters and the largest store counters.
+
+    Zero counters and past expiry months, which wait for the weekly prune,
+    are left out.
+    """
+    current_month = time.strftime("%Y-%m", time.gmtime())
+    result = {
+        k: v for k, v in stats.items()
+        if k not in ("PK", "SK") and v != 0 and not k.startswith(STORE_PREFIX)
+        and not (k.startswith(EXPIRY_PREFIX) and k[len(EXPIRY_PREFIX):] < current_month)
+    }
+    top_stores = sorted(
+        ((k, v) for k, v in stores.items() if k.startswith(STORE_PREFIX) and v > 0),
+        key=lambda kv: (-kv[1], kv[0]),
+    )[:BOOTSTRAP_STORE_LIMIT]
+    result.update(top_stores)
+    return result
+
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
+def _record_receipt_write(old_item, new_item, now_iso):
+    """Fold a receipt write into the user's sync tree and stats items.
+
+    The receipt write has already succeeded, so failures here are logged
+    rather than surfaced: a drifted sync tree only costs the client extra
+    round-trips and is rebuilt on request by POST /sync/tree, and drifted
+    stats are corrected by rebuilding META#STATS. With DERIVED_VIEWS_MODE
+    "stream" both are left to the stream processor.
+    """
+    if not derived_views_inline():
+        return
+    user_id = extract_user_id(new_item["PK"])
+    receipt_id = new_item.get("receiptId") or extract_receipt_id(new_item["SK"])
+    try:
+        record_version(table, user_id, receipt_id, new_item["serverVersion"])
+    except Exception:
+        logger.exception(json.dumps({
+            "action": "sync_tree_update_failed",
+            "receipt_id": receipt_id,
+        }))
+    try:
+        record_stats(table, old_item, new_item, now_iso)
+    except Exception:
+        logger.exception(json.dumps({
+            "action": "stats_update_failed",
+            "receipt_id": receipt_id,
+        }))
+
+
 def _get_receipt_or_raise(user_id, receipt_id):
     """Fetch a receipt or raise NotFoundError."""
     response = table.get_item(
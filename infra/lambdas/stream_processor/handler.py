@@ -0,0 +1,134 @@
+"""Stream processor — maintains derived views from the table's change stream.
+
+Consumes the ReceiptVault stream (NEW_AND_OLD_IMAGES, receipt items only)
+in batches and runs every change through the processors below, one per
+derived view, via shared.streams.ChangePipeline: records are handled in
+order per user, redelivered records are skipped by their markers, and a
+failing record is isolated by bisection and reported back to Lambda as a
+batch item failure (ReportBatchItemFailures), so only the rest of its shard
+is retried.
+
+    index      rewrites a receipt's warranty expiry and GSI keys when they
+               do not match its fields (writes that skipped shared.indexing);
+               a corrected expiry is a new serverVersion, whose own record
+               then reaches the sync tree and stats
+    sync_tree  the (receiptId, serverVersion) hash tree on META#SYNCTREE
+    stats      the per-user counters on META#STATS and META#STATS#STORES,
+               whose items a user's first receipt creates
+
+The sync tree and stats are only maintained here when DERIVED_VIEWS_MODE is
+"stream"; otherwise the API handlers still ADD them inline. A REMOVE by TTL
+(a soft-deleted receipt expiring) takes the receipt out of the sync tree;
+any other REMOVE is an account deletion, whose META items go with it.
+
+Replay recorded records locally with tools/replay_stream.py.
+"""
+
+import json
+import os
+import logging
+import time
+
+from shared.clients import lazy_client
+from shared.dynamodb import build_stats_sk, build_store_stats_sk, extract_receipt_id
+from shared.indexing import repair_item
+from shared.stats import split_store_counters, start_stats, stats_delta
+from shared.streams import ChangePipeline, Processor, active_processors, derived_views_mode
+from shared.synctree import SYNC_TREE_SK, add_delta
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+TABLE_NAME = os.environ["TABLE_NAME"]
+REGION = os.environ.get("REGION", "eu-west-1")
+GROUP_WORKERS = int(os.environ.get("STREAM_GROUP_WORKERS", "4"))
+
+dynamodb_client = lazy_client("dynamodb", region_name=REGION)
+
+
+class IndexKeysProcessor(Processor):
+    name = "index"
+
+    def apply(self, table, change):
+        if change.new is not None:
+            repair_item(table, change.new)
+
+
+class SyncTreeProcessor(Processor):
+    name = "sync_tree"
+    stream_only = True
+
+    def contribute(self, updates, change):
+        if change.new is None and not change.expired:
+            return
+        item = change.new or change.old
+        receipt_id = item.get("receiptId") or extract_receipt_id(change.sk)
+        deltas = add_delta(
+            {},
+            receipt_id,
+            (change.old or {}).get("serverVersion"),
+            (change.new or {}).get("serverVersion"),
+        )
+        if deltas:
+            # The tree is built on the user's first POST /sync/tree, so an
+            # item that is missing needs no delta; requiring it keeps a late
+            # record from re-creating the tree of a deleted account
+            updates.add(
+                change.pk, SYNC_TREE_SK, {f"b{b}": d for b, d in deltas.items()},
+                must_exist=True,
+            )
+
+
+class StatsProcessor(Processor):
+    name = "stats"
+    stream_only = True
+
+    def apply(self, table, change):
+        # A user's first receipt creates their stats items, which the
+        # receipt's own delta then updates
+        if change.old is None and change.new is not None:
+            now_iso = change.new.get("updatedAt") or time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime()
+            )
+            start_stats(table, change.new, now_iso)
+
+    def contribute(self, updates, change):
+        if change.new is None and not change.expired:
+            return
+        deltas = stats_delta(change.old, change.new)
+        if deltas:
+            counters, stores = split_store_counters(deltas)
+            updated_at = (change.new or change.old).get("updatedAt")
+            sets = {"updatedAt": updated_at} if updated_at else None
+            updates.add(
+                change.pk, build_stats_sk(), {**counters, "version": 1},
+                sets=sets, must_exist=True,
+            )
+            if stores:
+                updates.add(change.pk, build_store_stats_sk(), stores, sets=sets, must_exist=True)
+
+
+# One instance per derived view; new views register here
+PROCESSORS = (
+    IndexKeysProcessor(),
+    SyncTreeProcessor(),
+    StatsProcessor(),
+)
+
+
+def handler(event, context):
+    records = event.get("Records", [])
+    processors = active_processors(PROCESSORS)
+    pipeline = ChangePipeline(
+        dynamodb_client, TABLE_NAME, processors, group_workers=GROUP_WORKERS
+    )
+    failed = pipeline.process(records)
+
+    logger.info(json.dumps({
+        "action": "stream_batch",
+        "records": len(records),
+        "failed": len(failed),
+        "mode": derived_views_mode(),
+        "processors": [p.name for p in processors],
+    }))
+    return {"batchItemFailures": [{"itemIdentifier": seq} for seq in failed]}
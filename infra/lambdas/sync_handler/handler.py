@@ -2,24 +2,59 @@ import json
 import os
 import logging
 import time
+from decimal import Decimal
 
-import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
+from shared.clients import lazy_client
+from shared.fastpath import FastTable
 from shared.response import success, error
 from shared.auth import get_user_id
-from shared.dynamodb import build_pk, build_receipt_sk
-from shared.errors import ValidationError, ConflictError
+from shared.dynamodb import (
+    RECEIPT_UPDATE,
+    build_pk,
+    build_receipt_sk,
+)
+from shared.errors import ValidationError, ConflictError, InvalidCursorError
+from shared.pagination import decode_cursor, encode_cursor
+from shared.indexing import INDEX_ATTRIBUTES, index_update, with_derived_attributes
+from shared.merge import MergePlan
+from shared.stats import add_stats_delta, apply_stats_delta
+from shared.streams import derived_views_inline
+from shared.batch_io import TRANSACT_SIZE, batch_get, serialize_item, transact_write
+from shared.synctree import (
+    GROUPS,
+    OVERFLOW_BUCKET,
+    SYNC_TREE_SK,
+    add_version_delta,
+    apply_deltas,
+    bucket_digest,
+    bucket_of,
+    build_tree_item,
+    group_buckets,
+    group_digest,
+    root_digest,
+)
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 TABLE_NAME = os.environ.get("TABLE_NAME", "ReceiptVault")
 REGION = os.environ.get("REGION", "eu-west-1")
-MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "25"))
-
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-table = dynamodb.Table(TABLE_NAME)
-dynamodb_client = boto3.client("dynamodb", region_name=REGION)
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "250"))
+# Times a push re-merges an item that changed between the read and the write
+PUSH_ROUNDS = 3
+PULL_DEFAULT_LIMIT = 50
+PULL_MAX_LIMIT = 200
+FULL_DEFAULT_LIMIT = 100
+FULL_MAX_LIMIT = 200
+# Fingerprint mode skips matching items; cap how many one page may read
+FULL_MAX_SCANNED = 2000
+# Keep a pull page well under the 6 MB Lambda response payload limit
+PULL_PAGE_MAX_BYTES = int(os.environ.get("PULL_PAGE_MAX_BYTES", str(1024 * 1024)))
+TREE_FETCH_MAX = 100
+
+dynamodb_client = lazy_client("dynamodb", region_name=REGION)
+table = FastTable(dynamodb_client, TABLE_NAME)
 
 # Field-level merge tiers
 TIER_1_SERVER_WINS = {
@@ -32,6 +67,18 @@ TIER_2_CLIENT_WINS = {
 TIER_3_CONDITIONAL = {
     "displayName", "category", "warrantyMonths",
 }
+# Server-managed attributes a push never writes directly
+PROTECTED_FIELDS = {
+    "PK", "SK", "receiptId", "userId", "serverVersion", "updatedAt",
+    *INDEX_ATTRIBUTES,
+}
+
+MERGE_PLAN = MergePlan(
+    server_wins=TIER_1_SERVER_WINS,
+    client_wins=TIER_2_CLIENT_WINS,
+    conditional=TIER_3_CONDITIONAL,
+    skip=PROTECTED_FIELDS | {"createdAt", "userEditedFields"},
+)
 
 
 def handler(event, context):
@@ -57,11 +104,14 @@ def handler(event, context):
         if resource == "/sync/full" and http_method == "POST":
             return full_reconciliation(event, user_id)
 
+        if resource == "/sync/tree" and http_method == "POST":
+            return sync_tree(event, user_id)
+
         return error("Route not found", status_code=404, code="NOT_FOUND")
 
     except ValidationError as exc:
         logger.warning(json.dumps({"error": "validation", "message": str(exc)}))
-        return error(str(exc), status_code=400, code="VALIDATION_ERROR")
+        return error(str(exc), status_code=400, code=exc.code)
     except ConflictError as exc:
         logger.warning(json.dumps({"error": "conflict", "message": str(exc)}))
         return error(str(exc), status_code=409, code="CONFLICT")
@@ -71,70 +121,122 @@ def handler(event, context):
 
 
 def delta_pull(event, user_id):
-    """POST /sync/pull — return items updated since lastSyncTimestamp."""
-    body = json.loads(event.get("body") or "{}")
-    last_sync = body.get("lastSyncTimestamp")
+    """POST /sync/pull — return one page of items updated since lastSyncTimestamp.
 
-    if not last_sync:
-        raise ValidationError("lastSyncTimestamp is required")
-
-    # Query GSI-6 (ByUpdatedAt) for items updated after lastSyncTimestamp
-    response = table.query(
-        IndexName="ByUpdatedAt",
-        KeyConditionExpression=(
+    Pages are bounded by ``limit`` items and by PULL_PAGE_MAX_BYTES of item
+    data. ``nextCursor`` resumes GSI-6 right after the last item served, and
+    ``newSyncTimestamp`` is the highest GSI6SK served so far, so the client
+    never skips changes that landed while it was paging.
+    """
+    body = json.loads(event.get("body") or "{}")
+    cursor = body.get("cursor")
+    limit = body.get("limit", PULL_DEFAULT_LIMIT)
+
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        raise ValidationError("limit must be a positive integer")
+    limit = min(limit, PULL_MAX_LIMIT)
+
+    if cursor:
+        state = decode_cursor(cursor)
+        if not isinstance(state.get("since"), str) or not isinstance(state.get("key"), dict):
+            raise InvalidCursorError()
+        if state["key"].get("GSI6PK") != build_pk(user_id):
+            raise InvalidCursorError()
+        last_sync = state["since"]
+        high_water = state.get("high", last_sync)
+        start_key = state["key"]
+    else:
+        last_sync = body.get("lastSyncTimestamp")
+        if not last_sync:
+            raise ValidationError("lastSyncTimestamp is required")
+        high_water = last_sync
+        start_key = None
+
+    query_kwargs = {
+        "IndexName": "ByUpdatedAt",
+        "KeyConditionExpression": (
             Key("GSI6PK").eq(build_pk(user_id))
             & Key("GSI6SK").gt(last_sync)
         ),
-    )
-
-    key_items = response.get("Items", [])
+    }
 
-    # GSI-6 is KEYS_ONLY — need to BatchGetItem for full data
     full_items = []
-    if key_items:
-        keys = [
-            {"PK": item["PK"], "SK": item["SK"]}
-            for item in key_items
-        ]
-        # Process in batches of 100 (DynamoDB BatchGetItem limit)
-        for i in range(0, len(keys), 100):
-            batch_keys = keys[i:i + 100]
-            batch_response = dynamodb_client.batch_get_item(
-                RequestItems={
-                    TABLE_NAME: {
-                        "Keys": [
-                            {
-                                "PK": {"S": k["PK"]},
-                                "SK": {"S": k["SK"]},
-                            }
-                            for k in batch_keys
-                        ],
-                    },
-                },
-            )
-            # Convert from low-level format
-            raw_items = batch_response.get("Responses", {}).get(TABLE_NAME, [])
-            for raw in raw_items:
-                full_items.append(_deserialize_item(raw))
+    page_bytes = 0
+    last_served_key = start_key
+    has_more = False
+
+    while len(full_items) < limit:
+        query_kwargs["Limit"] = limit - len(full_items)
+        if last_served_key:
+            query_kwargs["ExclusiveStartKey"] = last_served_key
+        response = table.query(**query_kwargs)
+        key_items = response.get("Items", [])
+
+        # GSI-6 is KEYS_ONLY — fetch the full items, then serve them in index order
+        fetched = batch_get(dynamodb_client, TABLE_NAME, key_items)
+
+        budget_hit = False
+        for key_item in key_items:
+            item = fetched.get((key_item["PK"], key_item["SK"]))
+            if item is not None:
+                item_bytes = len(json.dumps(item, default=str))
+                if full_items and page_bytes + item_bytes > PULL_PAGE_MAX_BYTES:
+                    budget_hit = True
+                    break
+                full_items.append(item)
+                page_bytes += item_bytes
+            # Items deleted since the index read are skipped but still consumed
+            last_served_key = {
+                "PK": key_item["PK"],
+                "SK": key_item["SK"],
+                "GSI6PK": key_item["GSI6PK"],
+                "GSI6SK": key_item["GSI6SK"],
+            }
+            high_water = max(high_water, key_item["GSI6SK"])
+
+        if budget_hit:
+            has_more = True
+            break
+        if "LastEvaluatedKey" not in response:
+            break
+        if len(full_items) >= limit:
+            has_more = True
 
-    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor({
+            "since": last_sync,
+            "high": high_water,
+            "key": last_served_key,
+        })
 
     logger.info(json.dumps({
         "action": "delta_pull",
         "items_count": len(full_items),
+        "page_bytes": page_bytes,
+        "has_more": has_more,
         "since": last_sync,
     }))
 
     return success({
         "items": full_items,
         "count": len(full_items),
-        "newSyncTimestamp": now_iso,
+        "newSyncTimestamp": high_water,
+        "hasMore": has_more,
+        "nextCursor": next_cursor,
     })
 
 
 def batch_push(event, user_id):
-    """POST /sync/push — apply client changes with field-level merge."""
-    body = json.loads(event.get("body") or "{}")
+    """POST /sync/push — apply client changes with field-level merge.
+
+    All server states are read with one BatchGetItem, merges are computed in
+    memory and the writes go out as conditional TransactWriteItems. A write
+    whose condition fails because the item changed underneath it is merged
+    again against the item returned with the cancellation, up to PUSH_ROUNDS
+    times; a direct (version-matched) write that fails is a conflict.
+    """
+    body = json.loads(event.get("body") or "{}", parse_float=Decimal)
     items = body.get("items", [])
 
     if not items:
@@ -143,95 +245,512 @@ def batch_push(event, user_id):
     if len(items) > MAX_BATCH_SIZE:
         raise ValidationError(f"Batch size exceeds maximum of {MAX_BATCH_SIZE}")
 
-    outcomes = []
+    outcomes = [None] * len(items)
+    pending = {}
+    seen_ids = set()
 
-    for client_item in items:
+    for index, client_item in enumerate(items):
         receipt_id = client_item.get("receiptId")
         if not receipt_id:
-            outcomes.append({
+            outcomes[index] = {
                 "receiptId": None,
                 "outcome": "rejected",
                 "reason": "Missing receiptId",
-            })
-            continue
+            }
+        elif receipt_id in seen_ids:
+            # A transaction cannot touch the same item twice
+            outcomes[index] = {
+                "receiptId": receipt_id,
+                "outcome": "rejected",
+                "reason": "Duplicate receiptId in batch",
+            }
+        else:
+            seen_ids.add(receipt_id)
+            pending[index] = client_item
 
-        client_version = client_item.get("serverVersion", 0)
+    pk = build_pk(user_id)
 
-        # Fetch current server state
-        server_response = table.get_item(
-            Key={"PK": build_pk(user_id), "SK": build_receipt_sk(receipt_id)},
-        )
-        server_item = server_response.get("Item")
+    # Fetch current server state for every item in one pass
+    server_items = batch_get(
+        dynamodb_client,
+        TABLE_NAME,
+        [{"PK": pk, "SK": build_receipt_sk(item["receiptId"])} for item in pending.values()],
+        consistent_read=True,
+    )
 
-        if not server_item:
-            # New item from client — accept as-is
-            outcome = _accept_new_item(user_id, receipt_id, client_item)
-            outcomes.append(outcome)
-            continue
+    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    transact_calls = 0
+    written = 0
+    tree_deltas = {}
+    stats_deltas = {}
+
+    for _ in range(PUSH_ROUNDS):
+        writes = []
+        for index, client_item in pending.items():
+            receipt_id = client_item["receiptId"]
+            server_item = server_items.get((pk, build_receipt_sk(receipt_id)))
+            action, outcome, new_item, remerge = _plan_push(
+                user_id, receipt_id, client_item, server_item, now_iso
+            )
+            if action is None:
+                outcomes[index] = outcome
+            else:
+                writes.append((index, action, outcome, remerge, server_item, new_item))
+
+        try:
+            results = transact_write(dynamodb_client, [w[1] for w in writes])
+        except Exception:
+            # Earlier rounds committed: report this round instead of failing the push
+            if not written:
+                raise
+            logger.exception(json.dumps({"action": "batch_push_round_failed", "user_id": user_id}))
+            results = [{"code": "InternalError", "item": None}] * len(writes)
+        transact_calls += (len(writes) + TRANSACT_SIZE - 1) // TRANSACT_SIZE
+
+        retry = {}
+        for (index, action, outcome, remerge, server_item, new_item), result in zip(writes, results):
+            if result is None:
+                written += 1
+                outcomes[index] = outcome
+                add_version_delta(tree_deltas, outcome["receiptId"], outcome["serverVersion"])
+                add_stats_delta(stats_deltas, server_item, new_item)
+                continue
+
+            receipt_id = outcome["receiptId"]
+            current = result["item"]
+            if result["code"] != "ConditionalCheckFailed":
+                outcomes[index] = {
+                    "receiptId": receipt_id,
+                    "outcome": "rejected",
+                    "reason": result["code"],
+                }
+            elif not remerge or current is None:
+                outcomes[index] = {
+                    "receiptId": receipt_id,
+                    "outcome": "conflict",
+                    "serverVersion": (current or {}).get(
+                        "serverVersion", outcome["serverVersion"] - 1
+                    ),
+                }
+            else:
+                # The item changed since it was read — merge again against it
+                server_items[(pk, build_receipt_sk(receipt_id))] = current
+                retry[index] = pending[index]
 
-        server_version = server_item.get("serverVersion", 0)
+        pending = retry
+        if not pending:
+            break
 
-        if client_version == server_version:
-            # Versions match — apply client changes directly
-            outcome = _apply_direct(user_id, receipt_id, client_item, server_version)
-            outcomes.append(outcome)
-        else:
-            # Version mismatch — field-level merge
-            outcome = _field_level_merge(
-                user_id, receipt_id, client_item, server_item
-            )
-            outcomes.append(outcome)
+    for index, client_item in pending.items():
+        server_item = server_items.get((pk, build_receipt_sk(client_item["receiptId"])), {})
+        outcomes[index] = {
+            "receiptId": client_item["receiptId"],
+            "outcome": "conflict",
+            "serverVersion": server_item.get("serverVersion", 0),
+        }
+
+    # One ADD each for the whole push (unless the stream processor keeps
+    # them); a failure only makes the sync tree or the stats drift
+    if derived_views_inline():
+        try:
+            apply_deltas(table, user_id, tree_deltas)
+        except Exception:
+            logger.exception(json.dumps({"action": "sync_tree_update_failed", "user_id": user_id}))
+        try:
+            apply_stats_delta(table, user_id, stats_deltas, now_iso)
+        except Exception:
+            logger.exception(json.dumps({"action": "stats_update_failed", "user_id": user_id}))
 
     logger.info(json.dumps({
         "action": "batch_push",
         "total": len(items),
         "outcomes": {o["outcome"] for o in outcomes} if outcomes else set(),
+        "transact_calls": transact_calls,
     }, default=list))
 
     return success({"outcomes": outcomes})
 
 
 def full_reconciliation(event, user_id):
-    """POST /sync/full — return all items for user (paginated)."""
-    all_items = []
-    last_key = None
+    """POST /sync/full — return the user's receipts one page at a time.
+
+    Only RECEIPT# items are returned; soft-deleted receipts are skipped unless
+    ``includeDeleted`` is true. Pages are bounded by ``limit`` items and by
+    PULL_PAGE_MAX_BYTES. ``syncTimestamp`` is fixed when the first page is
+    served and carried in the cursor, so changes made while the client pages
+    are picked up by the next delta pull.
+
+    Fingerprint mode: if the client sends ``fingerprints`` ({receiptId:
+    serverVersion}), only receipts whose serverVersion differs (or that the
+    client lacks) are returned, plus ``removed`` — fingerprinted receipt IDs
+    in this page's key range that the server no longer returns.
+    """
+    body = json.loads(event.get("body") or "{}")
+    cursor = body.get("cursor")
+    limit = body.get("limit", FULL_DEFAULT_LIMIT)
+    include_deleted = bool(body.get("includeDeleted", False))
+    fingerprints = body.get("fingerprints")
+
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        raise ValidationError("limit must be a positive integer")
+    limit = min(limit, FULL_MAX_LIMIT)
+    if fingerprints is not None and not isinstance(fingerprints, dict):
+        raise ValidationError("fingerprints must be an object of receiptId to serverVersion")
+
+    pk = build_pk(user_id)
+    if cursor:
+        state = decode_cursor(cursor)
+        start_key = state.get("key")
+        sync_timestamp = state.get("syncTimestamp")
+        if not isinstance(start_key, dict) or start_key.get("PK") != pk or not sync_timestamp:
+            raise InvalidCursorError()
+    else:
+        start_key = None
+        sync_timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+    query_kwargs = {
+        "KeyConditionExpression": Key("PK").eq(pk) & Key("SK").begins_with("RECEIPT#"),
+    }
+    if not include_deleted:
+        query_kwargs["FilterExpression"] = Attr("status").ne("deleted")
+
+    page_items = []
+    page_bytes = 0
+    scanned = 0
+    scanned_to = start_key
+    seen_ids = set()
+
+    while len(page_items) < limit and scanned < FULL_MAX_SCANNED:
+        query_kwargs["Limit"] = limit - len(page_items)
+        if scanned_to:
+            query_kwargs["ExclusiveStartKey"] = scanned_to
+        response = table.query(**query_kwargs)
+        scanned += response.get("ScannedCount", 0)
+
+        budget_hit = False
+        for item in response.get("Items", []):
+            receipt_id = item.get("receiptId") or item["SK"].removeprefix("RECEIPT#")
+            if fingerprints is None or _fingerprint_mismatch(item, fingerprints.get(receipt_id)):
+                item_bytes = len(json.dumps(item, default=str))
+                if page_items and page_bytes + item_bytes > PULL_PAGE_MAX_BYTES:
+                    budget_hit = True
+                    break
+                page_items.append(item)
+                page_bytes += item_bytes
+            seen_ids.add(receipt_id)
+            scanned_to = {"PK": item["PK"], "SK": item["SK"]}
+
+        if budget_hit:
+            break
+        # Filtered-out items still advance the scan position
+        scanned_to = response.get("LastEvaluatedKey")
+        if not scanned_to:
+            break
 
-    while True:
-        query_kwargs = {
-            "KeyConditionExpression": Key("PK").eq(build_pk(user_id)),
-        }
-        if last_key:
-            query_kwargs["ExclusiveStartKey"] = last_key
+    has_more = scanned_to is not None
 
-        response = table.query(**query_kwargs)
-        all_items.extend(response.get("Items", []))
+    result = {
+        "items": page_items,
+        "count": len(page_items),
+        "hasMore": has_more,
+        "nextCursor": (
+            encode_cursor({"key": scanned_to, "syncTimestamp": sync_timestamp})
+            if has_more else None
+        ),
+        "syncTimestamp": sync_timestamp,
+    }
 
-        last_key = response.get("LastEvaluatedKey")
-        if not last_key:
-            break
+    if fingerprints is not None:
+        low = start_key["SK"] if start_key else None
+        high = scanned_to["SK"] if has_more else None
+        result["removed"] = sorted(
+            receipt_id for receipt_id in fingerprints
+            if receipt_id not in seen_ids
+            and _sk_in_range(build_receipt_sk(receipt_id), low, high)
+        )
 
-    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    if not cursor:
+        result["totalCount"] = _count_receipts(pk, include_deleted)
 
     logger.info(json.dumps({
         "action": "full_reconciliation",
-        "items_count": len(all_items),
+        "items_count": len(page_items),
+        "page_bytes": page_bytes,
+        "has_more": has_more,
+        "fingerprint_mode": fingerprints is not None,
+    }))
+
+    return success(result)
+
+
+def sync_tree(event, user_id):
+    """POST /sync/tree — walk the per-user hash tree to find divergent receipts.
+
+    The client keeps the same tree over its local (receiptId, serverVersion)
+    pairs and descends only where digests differ:
+
+        {}                      -> root and the 17 group digests
+        {"group": "a"}          -> digests of buckets a0 … af
+        {"bucket": "a3"}        -> every (receiptId, serverVersion) in bucket a3
+        {"receiptIds": [...]}   -> the full items, at most TREE_FETCH_MAX
+
+    A receipt the client holds but the bucket no longer lists was removed.
+    The tree is built from a full query the first time it is requested, or
+    when the client sends ``rebuild: true`` after digests fail to converge.
+    """
+    body = json.loads(event.get("body") or "{}")
+    receipt_ids = body.get("receiptIds")
+    if receipt_ids is not None:
+        return _fetch_tree_items(user_id, receipt_ids)
+
+    tree_item = _load_tree(user_id, rebuild=bool(body.get("rebuild", False)))
+    result = {"root": root_digest(tree_item), "builtAt": tree_item.get("builtAt")}
+
+    group = body.get("group")
+    bucket = body.get("bucket")
+    if bucket is not None:
+        if not isinstance(bucket, str) or bucket_of(bucket) != bucket:
+            raise ValidationError("bucket must be two lowercase hex characters or 'xx'")
+        entries = _bucket_entries(user_id, bucket)
+        result.update({
+            "bucket": bucket,
+            "digest": bucket_digest(tree_item, bucket),
+            "entries": entries,
+            "count": len(entries),
+        })
+    elif group is not None:
+        if group not in GROUPS:
+            raise ValidationError("group must be one lowercase hex character or 'x'")
+        result.update({
+            "group": group,
+            "buckets": {b: bucket_digest(tree_item, b) for b in group_buckets(group)},
+        })
+    else:
+        result["groups"] = {g: group_digest(tree_item, g) for g in GROUPS}
+
+    logger.info(json.dumps({
+        "action": "sync_tree",
+        "group": group,
+        "bucket": bucket,
     }))
 
+    return success(result)
+
+
+def _load_tree(user_id, rebuild=False):
+    """Return the user's sync tree item, building it from the receipts if needed.
+
+    Writes that land between the rebuild's query and its put are lost from
+    the tree; the client sees a digest mismatch and can ask for a rebuild.
+    """
+    key = {"PK": build_pk(user_id), "SK": SYNC_TREE_SK}
+    if not rebuild:
+        tree_item = table.get_item(Key=key, ConsistentRead=True).get("Item")
+        # Deltas applied before the first build create a partial item
+        if tree_item and tree_item.get("builtAt"):
+            return tree_item
+
+    entries = [
+        (entry["receiptId"], entry["serverVersion"])
+        for entry in _query_entries(Key("SK").begins_with("RECEIPT#"), user_id)
+    ]
+    tree_item = build_tree_item(user_id, entries)
+    table.put_item(Item=tree_item)
+
+    logger.info(json.dumps({
+        "action": "sync_tree_built",
+        "user_id": user_id,
+        "receipts": len(entries),
+    }))
+    return tree_item
+
+
+def _bucket_entries(user_id, bucket):
+    """List (receiptId, serverVersion) for every receipt in one bucket."""
+    if bucket == OVERFLOW_BUCKET:
+        # IDs that are not hex-prefixed have no common key prefix to query
+        entries = [
+            entry for entry in _query_entries(Key("SK").begins_with("RECEIPT#"), user_id)
+            if bucket_of(entry["receiptId"]) == OVERFLOW_BUCKET
+        ]
+    else:
+        # Bucketing ignores case, key prefixes do not
+        prefixes = {
+            f"RECEIPT#{a}{b}"
+            for a in {bucket[0], bucket[0].upper()}
+            for b in {bucket[1], bucket[1].upper()}
+        }
+        entries = []
+        for prefix in sorted(prefixes):
+            entries.extend(_query_entries(Key("SK").begins_with(prefix), user_id))
+    return sorted(entries, key=lambda entry: entry["receiptId"])
+
+
+def _query_entries(sk_condition, user_id):
+    """Query receiptId / serverVersion pairs for receipts matching a sort key condition."""
+    query_kwargs = {
+        "KeyConditionExpression": Key("PK").eq(build_pk(user_id)) & sk_condition,
+        "ProjectionExpression": "SK, serverVersion",
+    }
+    entries = []
+    while True:
+        response = table.query(**query_kwargs)
+        for item in response.get("Items", []):
+            entries.append({
+                "receiptId": item["SK"].removeprefix("RECEIPT#"),
+                "serverVersion": int(item.get("serverVersion", 0)),
+            })
+        if "LastEvaluatedKey" not in response:
+            return entries
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def _fetch_tree_items(user_id, receipt_ids):
+    """Return full items for receipts the client found divergent in the tree."""
+    if not isinstance(receipt_ids, list) or not all(
+        isinstance(receipt_id, str) and receipt_id for receipt_id in receipt_ids
+    ):
+        raise ValidationError("receiptIds must be an array of receipt IDs")
+    if len(receipt_ids) > TREE_FETCH_MAX:
+        raise ValidationError(f"At most {TREE_FETCH_MAX} receiptIds per request")
+
+    pk = build_pk(user_id)
+    found = batch_get(
+        dynamodb_client,
+        TABLE_NAME,
+        [{"PK": pk, "SK": build_receipt_sk(receipt_id)} for receipt_id in receipt_ids],
+    )
+
+    items = []
+    not_found = []
+    remaining = []
+    page_bytes = 0
+    for receipt_id in dict.fromkeys(receipt_ids):
+        item = found.get((pk, build_receipt_sk(receipt_id)))
+        if item is None:
+            not_found.append(receipt_id)
+            continue
+        item_bytes = len(json.dumps(item, default=str))
+        if remaining or (items and page_bytes + item_bytes > PULL_PAGE_MAX_BYTES):
+            remaining.append(receipt_id)
+            continue
+        items.append(item)
+        page_bytes += item_bytes
+
     return success({
-        "items": all_items,
-        "count": len(all_items),
-        "newSyncTimestamp": now_iso,
+        "items": items,
+        "count": len(items),
+        "notFound": not_found,
+        "remaining": remaining,
     })
 
 
+def _fingerprint_mismatch(item, client_version):
+    """Return True if the client's serverVersion for an item is missing or stale."""
+    if client_version is None:
+        return True
+    try:
+        return int(client_version) != int(item.get("serverVersion", 0))
+    except (TypeError, ValueError):
+        return True
+
+
+def _sk_in_range(sk, low, high):
+    """Return True if low < sk <= high, treating None as an open bound."""
+    return (low is None or sk > low) and (high is None or sk <= high)
+
+
+def _count_receipts(pk, include_deleted):
+    """Count the receipts a full reconciliation will return."""
+    query_kwargs = {
+        "KeyConditionExpression": Key("PK").eq(pk) & Key("SK").begins_with("RECEIPT#"),
+        "Select": "COUNT",
+    }
+    if not include_deleted:
+        query_kwargs["FilterExpression"] = Attr("status").ne("deleted")
+
+    total = 0
+    while True:
+        response = table.query(**query_kwargs)
+        total += response.get("Count", 0)
+        if "LastEvaluatedKey" not in response:
+            return total
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
 # ---------------------------------------------------------------------------
 # Merge helpers
 # ---------------------------------------------------------------------------
 
-def _accept_new_item(user_id, receipt_id, client_item):
-    """Accept a new item from client that doesn't exist on server."""
-    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+def _plan_push(user_id, receipt_id, client_item, server_item, now_iso):
+    """Decide how to apply one pushed item against the current server state.
+
+    Returns ``(action, outcome, new_item, remerge)``: a low-level
+    TransactWriteItems action (or None when nothing needs writing), the
+    outcome to report if it succeeds, the item as it will be stored, and
+    whether a failed condition should trigger another merge rather than a
+    conflict.
+    """
+    if not server_item:
+        # New item from client — accept as-is
+        return (*_accept_new_item(user_id, receipt_id, client_item, now_iso), True)
+
+    server_version = server_item.get("serverVersion", 0)
+    if client_item.get("serverVersion", 0) == server_version:
+        # Versions match — apply client changes directly
+        return (
+            *_apply_direct(user_id, receipt_id, client_item, server_item, now_iso),
+            False,
+        )
+
+    # Version mismatch — field-level merge
+    return (
+        *_field_level_merge(user_id, receipt_id, client_item, server_item, now_iso),
+        True,
+    )
+
+
+def _update_action(user_id, receipt_id, fields, server_item, now_iso):
+    """Build a conditional Update action that sets fields and bumps serverVersion.
+
+    Derived attributes (GSI keys, warranty expiry) are recomputed against
+    ``server_item``; the version condition guarantees it is still current.
+    Returns ``(action, new_item)`` with the item as the update will leave it.
+    """
+    fields, remove = index_update(server_item, fields)
+    new_item = {**server_item, **fields}
+    for name in remove:
+        new_item.pop(name, None)
+    new_item.update(
+        updatedAt=now_iso,
+        GSI6SK=now_iso,
+        serverVersion=server_item.get("serverVersion", 0) + 1,
+    )
+    update_expr, expr_names, expr_values = RECEIPT_UPDATE.build(fields, remove)
+    expr_values.update({
+        ":now": now_iso,
+        ":one": 1,
+        ":expectedVersion": server_item.get("serverVersion", 0),
+    })
+
+    action = {
+        "Update": {
+            "TableName": TABLE_NAME,
+            "Key": serialize_item(
+                {"PK": build_pk(user_id), "SK": build_receipt_sk(receipt_id)}
+            ),
+            "UpdateExpression": update_expr,
+            "ExpressionAttributeNames": expr_names,
+            "ExpressionAttributeValues": serialize_item(expr_values),
+            "ConditionExpression": "#sv = :expectedVersion",
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+        }
+    }
+    return action, new_item
+
 
+def _accept_new_item(user_id, receipt_id, client_item, now_iso):
+    """Accept a new item from client that doesn't exist on server."""
     item = dict(client_item)
     item["PK"] = build_pk(user_id)
     item["SK"] = build_receipt_sk(receipt_id)
@@ -239,152 +758,64 @@ def _accept_new_item(user_id, receipt_id, client_item):
     item["receiptId"] = receipt_id
     item["serverVersion"] = 1
     item["updatedAt"] = now_iso
-    item["GSI6PK"] = build_pk(user_id)
-    item["GSI6SK"] = now_iso
+    item.setdefault("status", "active")
+    for name in INDEX_ATTRIBUTES:
+        item.pop(name, None)
 
-    # Remove None values
+    # Remove None values, then derive warranty expiry and the GSI keys
     item = {k: v for k, v in item.items() if v is not None}
-
-    table.put_item(Item=item)
-
-    return {"receiptId": receipt_id, "outcome": "accepted", "serverVersion": 1}
+    item = with_derived_attributes(item)
+
+    action = {
+        "Put": {
+            "TableName": TABLE_NAME,
+            "Item": serialize_item(item),
+            # Another device may have created it since it was read
+            "ConditionExpression": "attribute_not_exists(PK)",
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+        }
+    }
+    return action, {"receiptId": receipt_id, "outcome": "accepted", "serverVersion": 1}, item
 
 
-def _apply_direct(user_id, receipt_id, client_item, server_version):
+def _apply_direct(user_id, receipt_id, client_item, server_item, now_iso):
     """Apply client changes directly when versions match."""
-    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-
+    server_version = server_item.get("serverVersion", 0)
     update_fields = {
         k: v for k, v in client_item.items()
-        if k not in {"PK", "SK", "receiptId", "userId", "serverVersion"}
+        if k not in PROTECTED_FIELDS
         and v is not None
     }
 
     if not update_fields:
-        return {"receiptId": receipt_id, "outcome": "accepted", "serverVersion": server_version}
-
-    expr_parts = ["#updatedAt = :now", "#sv = #sv + :one", "#gsi6sk = :now"]
-    expr_names = {
-        "#updatedAt": "updatedAt",
-        "#sv": "serverVersion",
-        "#gsi6sk": "GSI6SK",
-    }
-    expr_values = {
-        ":now": now_iso,
-        ":one": 1,
-        ":expectedVersion": server_version,
-    }
-
-    for field, value in update_fields.items():
-        safe_name = f"#f_{field}"
-        safe_value = f":v_{field}"
-        expr_parts.append(f"{safe_name} = {safe_value}")
-        expr_names[safe_name] = field
-        expr_values[safe_value] = value
-
-    try:
-        table.update_item(
-            Key={"PK": build_pk(user_id), "SK": build_receipt_sk(receipt_id)},
-            UpdateExpression="SET " + ", ".join(expr_parts),
-            ExpressionAttributeNames=expr_names,
-            ExpressionAttributeValues=expr_values,
-            ConditionExpression="#sv = :expectedVersion",
-        )
-    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
-        return {"receiptId": receipt_id, "outcome": "conflict", "serverVersion": server_version}
+        return None, {"receiptId": receipt_id, "outcome": "accepted",
+                      "serverVersion": server_version}, None
 
-    return {
+    action, new_item = _update_action(user_id, receipt_id, update_fields, server_item, now_iso)
+    return action, {
         "receiptId": receipt_id,
         "outcome": "accepted",
         "serverVersion": server_version + 1,
-    }
+    }, new_item
 
 
-def _field_level_merge(user_id, receipt_id, client_item, server_item):
+def _field_level_merge(user_id, receipt_id, client_item, server_item, now_iso):
     """Merge client and server using conflict resolution tiers."""
-    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-    user_edited_fields = set(client_item.get("userEditedFields", []))
-    merged_fields = {}
-    conflicts = []
-
-    all_fields = set(client_item.keys()) | set(server_item.keys())
-    skip_fields = {"PK", "SK", "receiptId", "userId", "serverVersion",
-                   "createdAt", "updatedAt", "userEditedFields"}
-
-    for field in all_fields:
-        if field in skip_fields:
-            continue
-
-        client_val = client_item.get(field)
-        server_val = server_item.get(field)
-
-        # No conflict if values are the same
-        if client_val == server_val:
-            continue
-
-        if field in TIER_1_SERVER_WINS:
-            # Server (LLM) wins
-            merged_fields[field] = server_val
-        elif field in TIER_2_CLIENT_WINS:
-            # Client (user) wins
-            merged_fields[field] = client_val
-        elif field in TIER_3_CONDITIONAL:
-            # Client wins IF user explicitly edited the field
-            if field in user_edited_fields:
-                merged_fields[field] = client_val
-            else:
-                merged_fields[field] = server_val
-        else:
-            # Unknown field — default to server
-            merged_fields[field] = server_val
-            if client_val != server_val and client_val is not None:
-                conflicts.append({
-                    "field": field,
-                    "clientValue": client_val,
-                    "serverValue": server_val,
-                    "resolution": "server_wins_default",
-                })
-
-    # Apply merged fields
-    if merged_fields:
-        expr_parts = ["#updatedAt = :now", "#sv = #sv + :one", "#gsi6sk = :now"]
-        expr_names = {
-            "#updatedAt": "updatedAt",
-            "#sv": "serverVersion",
-            "#gsi6sk": "GSI6SK",
-        }
-        expr_values = {":now": now_iso, ":one": 1}
-
-        for field, value in merged_fields.items():
-            if value is not None:
-                safe_name = f"#f_{field}"
-                safe_value = f":v_{field}"
-                expr_parts.append(f"{safe_name} = {safe_value}")
-                expr_names[safe_name] = field
-                expr_values[safe_value] = value
-
-        table.update_item(
-            Key={"PK": build_pk(user_id), "SK": build_receipt_sk(receipt_id)},
-            UpdateExpression="SET " + ", ".join(expr_parts),
-            ExpressionAttributeNames=expr_names,
-            ExpressionAttributeValues=expr_values,
-        )
-
-    new_version = server_item.get("serverVersion", 0) + 1
+    write_fields, conflicts = MERGE_PLAN.merge(client_item, server_item)
 
+    server_version = server_item.get("serverVersion", 0)
     outcome = "merged" if conflicts else "accepted"
     result = {
         "receiptId": receipt_id,
         "outcome": outcome,
-        "serverVersion": new_version,
+        "serverVersion": server_version,
     }
     if conflicts:
         result["conflicts"] = conflicts
 
-    return result
-
+    if not write_fields:
+        return None, result, None
 
-def _deserialize_item(raw):
-    """Convert low-level DynamoDB item format to Python dict."""
-    deserializer = boto3.dynamodb.types.TypeDeserializer()
-    return {k: deserializer.deserialize(v) for k, v in raw.items()}
+    result["serverVersion"] = server_version + 1
+    action, new_item = _update_action(user_id, receipt_id, write_fields, server_item, now_iso)
+    return action, result, new_item
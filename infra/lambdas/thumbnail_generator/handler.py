@@ -2,8 +2,7 @@ import json
 import os
 import logging
 
-import boto3
-from PIL import Image
+from shared.clients import lazy_client
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -13,7 +12,7 @@ THUMBNAIL_WIDTH = int(os.environ.get("THUMBNAIL_WIDTH", "200"))
 THUMBNAIL_HEIGHT = int(os.environ.get("THUMBNAIL_HEIGHT", "300"))
 THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", "70"))
 
-s3_client = boto3.client("s3")
+s3_client = lazy_client("s3")
 
 
 def handler(event, context):
@@ -38,7 +37,10 @@ def handler(event, context):
             local_input = f"/tmp/{os.path.basename(key)}"
             s3_client.download_file(bucket, key, local_input)
 
-            # Open and create thumbnail with center crop
+            # Open and create thumbnail with center crop. PIL is imported
+            # here so invocations that only skip thumbnails never load it.
+            from PIL import Image
+
             img = Image.open(local_input)
             thumbnail = _center_crop_resize(img, THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT)
 
@@ -86,6 +88,8 @@ def handler(event, context):
 
 def _center_crop_resize(img, target_width, target_height):
     """Resize image with center crop to maintain aspect ratio."""
+    from PIL import Image
+
     img_width, img_height = img.size
     target_ratio = target_width / target_height
     img_ratio = img_width / img_height
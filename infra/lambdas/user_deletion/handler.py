@@ -7,15 +7,16 @@ No PII in logs — user ID is SHA-256 hashed for audit trail.
 import json
 import os
 import logging
-import time
 import hashlib
 from datetime import datetime, timezone
 
-import boto3
+from boto3.dynamodb.conditions import Key
 
+from shared.clients import lazy_client, lazy_resource, lazy_table
 from shared.response import success, error, no_content
 from shared.auth import get_user_id
 from shared.dynamodb import build_pk
+from shared.batch_io import batch_write
 from shared.errors import NotFoundError, ForbiddenError, ValidationError
 
 logger = logging.getLogger()
@@ -24,13 +25,14 @@ logger.setLevel(logging.INFO)
 TABLE_NAME = os.environ["TABLE_NAME"]
 REGION = os.environ.get("REGION", "eu-west-1")
 S3_BUCKET = os.environ["S3_BUCKET"]
+EXPORT_BUCKET = os.environ.get("EXPORT_BUCKET", "")
 USER_POOL_ID = os.environ["USER_POOL_ID"]
 
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-table = dynamodb.Table(TABLE_NAME)
-dynamodb_client = boto3.client("dynamodb", region_name=REGION)
-s3_client = boto3.client("s3", region_name=REGION)
-cognito_client = boto3.client("cognito-idp", region_name=REGION)
+dynamodb = lazy_resource("dynamodb", region_name=REGION)
+table = lazy_table(TABLE_NAME, region_name=REGION)
+dynamodb_client = lazy_client("dynamodb", region_name=REGION)
+s3_client = lazy_client("s3", region_name=REGION)
+cognito_client = lazy_client("cognito-idp", region_name=REGION)
 
 
 def _hash_user_id(user_id):
@@ -49,10 +51,9 @@ def _delete_cognito_user(user_id):
 def _delete_dynamodb_items(user_id):
     """Delete all DynamoDB items for a user using batch writes of 25."""
     pk = build_pk(user_id)
-    deleted_count = 0
 
     params = {
-        "KeyConditionExpression": boto3.dynamodb.conditions.Key("PK").eq(pk),
+        "KeyConditionExpression": Key("PK").eq(pk),
         "ProjectionExpression": "PK, SK",
     }
 
@@ -64,40 +65,12 @@ def _delete_dynamodb_items(user_id):
             break
         params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
 
-    # BatchWriteItem in chunks of 25
-    for i in range(0, len(items_to_delete), 25):
-        batch = items_to_delete[i : i + 25]
-        request_items = {
-            TABLE_NAME: [
-                {"DeleteRequest": {"Key": {"PK": item["PK"], "SK": item["SK"]}}}
-                for item in batch
-            ]
-        }
-        resp = dynamodb_client.batch_write_item(
-            RequestItems={
-                TABLE_NAME: [
-                    {
-                        "DeleteRequest": {
-                            "Key": {
-                                "PK": {"S": item["PK"]},
-                                "SK": {"S": item["SK"]},
-                            }
-                        }
-                    }
-                    for item in batch
-                ]
-            }
-        )
-        deleted_count += len(batch)
-
-        # Handle unprocessed items
-        unprocessed = resp.get("UnprocessedItems", {}).get(TABLE_NAME, [])
-        while unprocessed:
-            time.sleep(0.5)
-            resp = dynamodb_client.batch_write_item(
-                RequestItems={TABLE_NAME: unprocessed}
-            )
-            unprocessed = resp.get("UnprocessedItems", {}).get(TABLE_NAME, [])
+    # BatchWriteItem in chunks of 25, retrying unprocessed items
+    deleted_count = batch_write(
+        dynamodb_client,
+        TABLE_NAME,
+        delete_keys=[{"PK": item["PK"], "SK": item["SK"]} for item in items_to_delete],
+    )
 
     return deleted_count
 
@@ -136,6 +109,26 @@ def _delete_s3_objects(user_id):
     return deleted_count
 
 
+def _delete_export_objects(user_id):
+    """Delete the user's exports, export checkpoints and export manifests."""
+    if not EXPORT_BUCKET:
+        return 0
+
+    deleted_count = 0
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for prefix in (f"exports/{user_id}/", f"manifests/{user_id}/"):
+        for page in paginator.paginate(Bucket=EXPORT_BUCKET, Prefix=prefix):
+            objects_to_delete = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if objects_to_delete:
+                s3_client.delete_objects(
+                    Bucket=EXPORT_BUCKET,
+                    Delete={"Objects": objects_to_delete, "Quiet": True},
+                )
+                deleted_count += len(objects_to_delete)
+
+    return deleted_count
+
+
 def handler(event, context):
     """API Gateway handler — GDPR cascade delete of user account."""
     try:
@@ -170,8 +163,8 @@ def handler(event, context):
             "itemsDeleted": dynamo_deleted,
         }))
 
-        # Step 3: Delete all S3 objects and versions
-        s3_deleted = _delete_s3_objects(user_id)
+        # Step 3: Delete all S3 objects and versions, plus exports and manifests
+        s3_deleted = _delete_s3_objects(user_id) + _delete_export_objects(user_id)
         logger.info(json.dumps({
             "action": "s3_objects_deleted",
             "hashedUserId": hashed_id,
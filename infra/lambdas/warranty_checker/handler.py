@@ -1,21 +1,50 @@
 """Warranty expiry checker — EventBridge scheduled trigger.
 
-Scans all users, checks for warranties approaching expiry,
-and sends SNS notifications at configured reminder windows.
+Finds warranties approaching expiry and sends SNS notifications at
+configured reminder windows. Two modes are supported:
+
+- "scan": scan the table for every USER# partition, then query GSI-4 per user.
+- "index": walk the date-sharded ByExpiryDate index (GSI-7) for the days inside
+  the largest reminder window, so only expiring items are read.
+
+The scheduled invocation is the coordinator: it splits the run into segments
+(parallel Scan segments, or GSI-7 shards in index mode) and hands each one to
+a worker through SQS, or runs them on a local thread pool when no queue is
+configured. Segment progress is checkpointed, so a timed-out run resumes.
 """
 
 import json
 import os
 import logging
 import time
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
 
-import boto3
 from boto3.dynamodb.conditions import Key, Attr
 
+from shared.clients import lazy_client, lazy_resource
+from shared.fastpath import FastTable
 from shared.response import success, error
-from shared.dynamodb import build_pk, build_settings_sk, extract_user_id
+from shared.dynamodb import (
+    EXPIRY_SHARD_COUNT,
+    build_pk,
+    build_settings_sk,
+    build_expiry_pk,
+    extract_user_id,
+)
 from shared.errors import NotFoundError, ValidationError
+from shared.notifications import NotificationBatcher
+from shared.cache import META_CACHE
+from shared.fanout import (
+    SegmentTimeout,
+    dispatch_segments,
+    get_run_id,
+    parse_segment_messages,
+    requeue_segment,
+    run_segment,
+    scan_segment,
+    sum_counters,
+)
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -23,37 +52,31 @@ logger.setLevel(logging.INFO)
 TABLE_NAME = os.environ["TABLE_NAME"]
 REGION = os.environ.get("REGION", "eu-west-1")
 SNS_TOPIC_ARN = os.environ["SNS_TOPIC_ARN"]
-
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-table = dynamodb.Table(TABLE_NAME)
-sns_client = boto3.client("sns", region_name=REGION)
-
+CHECK_MODE = os.environ.get("WARRANTY_CHECK_MODE", "scan")
+# Index mode only walks this many days ahead; larger user windows are ignored.
+MAX_REMINDER_WINDOW_DAYS = int(os.environ.get("MAX_REMINDER_WINDOW_DAYS", "30"))
+WORKER_QUEUE_URL = os.environ.get("WORKER_QUEUE_URL", "")
+TOTAL_SEGMENTS = int(os.environ.get("TOTAL_SEGMENTS", "4"))
+
+dynamodb = lazy_resource("dynamodb", region_name=REGION)
+dynamodb_client = lazy_client("dynamodb", region_name=REGION)
+table = FastTable(dynamodb_client, TABLE_NAME)
+sns_client = lazy_client("sns", region_name=REGION)
+sqs_client = lazy_client("sqs", region_name=REGION)
+
+JOB_NAME = "warranty_checker"
 DEFAULT_REMINDER_WINDOWS = [30, 7, 1, 0]
 
 
-def _get_distinct_user_ids():
-    """Scan the table for all distinct USER# partition keys."""
-    user_ids = set()
-    params = {
-        "ProjectionExpression": "PK",
-        "FilterExpression": Attr("PK").begins_with("USER#"),
-    }
-    while True:
-        resp = table.scan(**params)
-        for item in resp.get("Items", []):
-            user_ids.add(extract_user_id(item["PK"]))
-        if "LastEvaluatedKey" not in resp:
-            break
-        params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
-    return user_ids
-
-
 def _get_user_settings(user_id):
-    """Fetch user settings, return reminder windows config."""
-    resp = table.get_item(
-        Key={"PK": build_pk(user_id), "SK": build_settings_sk()},
-    )
-    item = resp.get("Item", {})
+    """Fetch user settings, return reminder windows config.
+
+    Index mode meets the same user once per expiring date and shard, so the
+    settings come from the container's META cache after the first read.
+    """
+    item = META_CACHE.get_item(
+        table, {"PK": build_pk(user_id), "SK": build_settings_sk()}
+    ) or {}
     windows = item.get("reminderWindows", DEFAULT_REMINDER_WINDOWS)
     return [int(w) for w in windows]
 
@@ -77,51 +100,128 @@ def _query_active_warranties(user_id, max_expiry_date):
     return items
 
 
-def _send_notification(user_id, receipt_id, merchant_name, expiry_date, days_remaining):
-    """Publish an SNS notification for an expiring warranty."""
+def _query_expiring_on(expiry_date, shard):
+    """Query GSI-7 for all warranties expiring on a date in one shard."""
+    items = []
+    params = {
+        "IndexName": "ByExpiryDate",
+        "KeyConditionExpression": Key("GSI7PK").eq(
+            build_expiry_pk(expiry_date, shard)
+        ),
+    }
+    while True:
+        resp = table.query(**params)
+        items.extend(resp.get("Items", []))
+        if "LastEvaluatedKey" not in resp:
+            break
+        params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    return items
+
+
+def _scan_pages(segment, total_segments):
+    """Page source for one parallel Scan segment over USER# partitions."""
+    params = {
+        "ProjectionExpression": "PK",
+        "FilterExpression": Attr("PK").begins_with("USER#"),
+    }
+
+    def pages(cursor):
+        return scan_segment(table, segment, total_segments, params, cursor)
+
+    return pages
+
+
+def _index_pages(shard, now, max_window):
+    """Page source that walks one GSI-7 shard, one expiry day per page."""
+
+    def pages(cursor):
+        start = int(cursor["offset"]) if cursor else 0
+        for offset in range(start, max_window + 1):
+            expiry_date = (now + timedelta(days=offset)).strftime("%Y-%m-%d")
+            items = _query_expiring_on(expiry_date, shard)
+            next_cursor = {"offset": offset + 1} if offset < max_window else None
+            yield items, next_cursor
+
+    return pages
+
+
+def _queue_notification(batcher, item, user_id, days_remaining, now_iso):
+    """Queue an SNS notification and its lastNotifiedExpiry marker update."""
     message = {
         "userId": user_id,
-        "receiptId": receipt_id,
-        "merchantName": merchant_name,
-        "warrantyExpiryDate": expiry_date,
+        "receiptId": item.get("SK", "").removeprefix("RECEIPT#"),
+        "merchantName": item.get("merchantName", "Unknown"),
+        "warrantyExpiryDate": item["warrantyExpiryDate"],
         "daysRemaining": days_remaining,
     }
-    sns_client.publish(
-        TopicArn=SNS_TOPIC_ARN,
-        Message=json.dumps(message),
-        MessageAttributes={
+    batcher.add(
+        message,
+        attributes={
             "userId": {"DataType": "String", "StringValue": user_id},
             "notificationType": {"DataType": "String", "StringValue": "WARRANTY_EXPIRY"},
         },
+        update={
+            "TableName": TABLE_NAME,
+            "Key": {"PK": item["PK"], "SK": item["SK"]},
+            "UpdateExpression": "SET lastNotifiedExpiry = :ts",
+            "ExpressionAttributeValues": {":ts": now_iso},
+        },
     )
 
 
-def _update_last_notified(pk, sk, timestamp):
-    """Mark the receipt as notified at this expiry threshold."""
-    table.update_item(
-        Key={"PK": pk, "SK": sk},
-        UpdateExpression="SET lastNotifiedExpiry = :ts",
-        ExpressionAttributeValues={":ts": timestamp},
-    )
+def _notify_user(batcher, user_id, warranties, reminder_windows, now, now_iso):
+    """Queue reminders for a user's warranties that fall inside a reminder window."""
+    for item in warranties:
+        expiry_str = item.get("warrantyExpiryDate", "")
+        if not expiry_str:
+            continue
 
+        try:
+            expiry_date = datetime.strptime(expiry_str, "%Y-%m-%d").replace(
+                tzinfo=timezone.utc
+            )
+        except ValueError:
+            continue
 
-def handler(event, context):
-    """EventBridge scheduled handler — check all warranties for expiry."""
-    try:
-        now = datetime.now(timezone.utc)
-        now_iso = now.isoformat()
-        notifications_sent = 0
-        users_scanned = 0
+        days_remaining = (expiry_date - now).days
+        last_notified = item.get("lastNotifiedExpiry", "")
 
-        user_ids = _get_distinct_user_ids()
-        users_scanned = len(user_ids)
+        for window in sorted(reminder_windows, reverse=True):
+            if days_remaining <= window:
+                if last_notified and last_notified >= now_iso[:10]:
+                    break
 
-        logger.info(json.dumps({
-            "action": "warranty_check_start",
-            "usersFound": users_scanned,
-            "timestamp": now_iso,
-        }))
+                _queue_notification(batcher, item, user_id, days_remaining, now_iso)
+                break
+
+
+def _new_batcher():
+    """Create a notification batcher for one page of work."""
+    return NotificationBatcher(sns_client, SNS_TOPIC_ARN, dynamodb.meta.client)
 
+
+def _batch_counters(batcher):
+    """Return the additive throughput counters of a flushed batcher."""
+    stats = batcher.stats()
+    return {
+        "notificationsSent": stats["messagesSent"],
+        "notificationsFailed": stats["messagesFailed"],
+        "publishCalls": stats["publishCalls"],
+        "writeCalls": stats["writeCalls"],
+        "apiCallsSaved": stats["apiCallsSaved"],
+    }
+
+
+def _run_worker(mode, run_id, segment, total_segments, context):
+    """Process one segment of a run from its checkpoint and return its counters."""
+    now = datetime.now(timezone.utc)
+    now_iso = now.isoformat()
+    seen_users = set()
+
+    def process_scanned_users(items):
+        user_ids = {extract_user_id(item["PK"]) for item in items} - seen_users
+        seen_users.update(user_ids)
+        batcher = _new_batcher()
         for user_id in user_ids:
             reminder_windows = _get_user_settings(user_id)
             if not reminder_windows:
@@ -129,46 +229,120 @@ def handler(event, context):
 
             max_window = max(reminder_windows)
             max_expiry = (now + timedelta(days=max_window)).strftime("%Y-%m-%d")
-
             warranties = _query_active_warranties(user_id, max_expiry)
+            _notify_user(batcher, user_id, warranties, reminder_windows, now, now_iso)
+        batcher.flush()
+        return {"usersScanned": len(user_ids), **_batch_counters(batcher)}
+
+    def process_indexed_warranties(items):
+        warranties_by_user = defaultdict(list)
+        for item in items:
+            if item.get("status", "active") != "active":
+                continue
+            warranties_by_user[extract_user_id(item["PK"])].append(item)
+
+        batcher = _new_batcher()
+        for user_id, warranties in warranties_by_user.items():
+            reminder_windows = _get_user_settings(user_id)
+            if not reminder_windows:
+                continue
+            _notify_user(batcher, user_id, warranties, reminder_windows, now, now_iso)
+        batcher.flush()
+        new_users = set(warranties_by_user) - seen_users
+        seen_users.update(new_users)
+        return {"usersScanned": len(new_users), **_batch_counters(batcher)}
+
+    if mode == "index":
+        pages = _index_pages(segment, now, MAX_REMINDER_WINDOW_DAYS)
+        process_page = process_indexed_warranties
+    else:
+        pages = _scan_pages(segment, total_segments)
+        process_page = process_scanned_users
+
+    return run_segment(
+        table, JOB_NAME, run_id, segment, pages, process_page, context=context
+    )
+
+
+def _handle_segment_messages(event, context):
+    """SQS worker — process the segments delivered in an SQS event."""
+    for message in parse_segment_messages(event):
+        try:
+            counters = _run_worker(
+                message["mode"],
+                message["runId"],
+                message["segment"],
+                message["totalSegments"],
+                context,
+            )
+        except SegmentTimeout:
+            requeue_segment(sqs_client, WORKER_QUEUE_URL, message)
+            logger.info(json.dumps({
+                "action": "warranty_check_segment_requeued",
+                "runId": message["runId"],
+                "segment": message["segment"],
+            }))
+            continue
+
+        logger.info(json.dumps({
+            "action": "warranty_check_segment_complete",
+            "runId": message["runId"],
+            "segment": message["segment"],
+            **counters,
+        }))
+        META_CACHE.log_stats(runId=message["runId"])
+
+    return {"statusCode": 200, "body": json.dumps({"status": "ok"})}
+
+
+def handler(event, context):
+    """EventBridge scheduled handler — check all warranties for expiry.
+
+    Also acts as the SQS worker when invoked with segment messages.
+    """
+    try:
+        event = event or {}
+        if "Records" in event:
+            return _handle_segment_messages(event, context)
+
+        now_iso = datetime.now(timezone.utc).isoformat()
+        started = time.monotonic()
+        mode = event.get("mode", CHECK_MODE)
+        run_id = get_run_id(event)
+        total_segments = EXPIRY_SHARD_COUNT if mode == "index" else TOTAL_SEGMENTS
+
+        logger.info(json.dumps({
+            "action": "warranty_check_start",
+            "mode": mode,
+            "runId": run_id,
+            "segments": total_segments,
+            "timestamp": now_iso,
+        }))
 
-            for item in warranties:
-                expiry_str = item.get("warrantyExpiryDate", "")
-                if not expiry_str:
-                    continue
-
-                try:
-                    expiry_date = datetime.strptime(expiry_str, "%Y-%m-%d").replace(
-                        tzinfo=timezone.utc
-                    )
-                except ValueError:
-                    continue
-
-                days_remaining = (expiry_date - now).days
-                last_notified = item.get("lastNotifiedExpiry", "")
-
-                for window in sorted(reminder_windows, reverse=True):
-                    if days_remaining <= window:
-                        threshold_key = f"{window}d"
-                        if last_notified and last_notified >= now_iso[:10]:
-                            break
-
-                        receipt_id = item.get("SK", "").removeprefix("RECEIPT#")
-                        merchant = item.get("merchantName", "Unknown")
-
-                        _send_notification(
-                            user_id, receipt_id, merchant, expiry_str, days_remaining
-                        )
-                        _update_last_notified(item["PK"], item["SK"], now_iso)
-                        notifications_sent += 1
-                        break
+        results = dispatch_segments(
+            JOB_NAME,
+            run_id,
+            total_segments,
+            lambda segment: _run_worker(mode, run_id, segment, total_segments, context),
+            sqs_client=sqs_client,
+            queue_url=WORKER_QUEUE_URL,
+            extra={"mode": mode},
+        )
+        totals = sum_counters(results)
+        users_scanned = totals.get("usersScanned", 0)
+        notifications_sent = totals.get("notificationsSent", 0)
+        elapsed = time.monotonic() - started
 
         logger.info(json.dumps({
             "action": "warranty_check_complete",
-            "usersScanned": users_scanned,
-            "notificationsSent": notifications_sent,
+            "mode": mode,
+            "runId": run_id,
+            "dispatched": bool(WORKER_QUEUE_URL),
+            **totals,
+            "messagesPerSecond": round(notifications_sent / elapsed, 2) if elapsed else 0,
             "timestamp": now_iso,
         }))
+        META_CACHE.log_stats(runId=run_id)
 
         return {
             "statusCode": 200,
@@ -1,7 +1,17 @@
 """Weekly summary sender — EventBridge trigger (Monday 9AM UTC).
 
 Sends a digest notification to users who have opted in,
-summarizing their active warranties and upcoming expirations.
+summarizing their active warranties and upcoming expirations. The figures
+come from each user's META#STATS item (see shared.stats) rather than from
+paging through their warranties; only a user with warranties expiring in
+the next 30 days, by the monthly expiry counters, has them queried. Each
+user's stats items are built if missing and pruned of zero and past
+counters on the way.
+
+The scheduled invocation is the coordinator: it splits the settings scan into
+parallel Scan segments and hands each one to a worker through SQS, or runs
+them on a local thread pool when no queue is configured. Segment progress is
+checkpointed, so a timed-out run resumes.
 """
 
 import json
@@ -11,12 +21,30 @@ import time
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 
-import boto3
 from boto3.dynamodb.conditions import Key, Attr
 
+from shared.clients import lazy_client
+from shared.fastpath import FastTable
 from shared.response import success, error
-from shared.dynamodb import build_pk, build_settings_sk, extract_user_id
+from shared.dynamodb import build_pk, build_settings_sk, build_store_stats_sk, extract_user_id
 from shared.errors import NotFoundError, ValidationError
+from shared.stats import (
+    EXPIRY_PREFIX,
+    WARRANTY_VALUE_PREFIX,
+    counters_with_prefix,
+    load_stats,
+    prune_stats,
+)
+from shared.fanout import (
+    SegmentTimeout,
+    dispatch_segments,
+    get_run_id,
+    parse_segment_messages,
+    requeue_segment,
+    run_segment,
+    scan_segment,
+    sum_counters,
+)
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -24,101 +52,114 @@ logger.setLevel(logging.INFO)
 TABLE_NAME = os.environ["TABLE_NAME"]
 REGION = os.environ.get("REGION", "eu-west-1")
 SNS_TOPIC_ARN = os.environ["SNS_TOPIC_ARN"]
+WORKER_QUEUE_URL = os.environ.get("WORKER_QUEUE_URL", "")
+TOTAL_SEGMENTS = int(os.environ.get("TOTAL_SEGMENTS", "4"))
+
+dynamodb_client = lazy_client("dynamodb", region_name=REGION)
+table = FastTable(dynamodb_client, TABLE_NAME)
+sns_client = lazy_client("sns", region_name=REGION)
+sqs_client = lazy_client("sqs", region_name=REGION)
 
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-table = dynamodb.Table(TABLE_NAME)
-sns_client = boto3.client("sns", region_name=REGION)
+JOB_NAME = "weekly_summary"
 
 
-def _get_digest_users():
-    """Scan for users who have weeklyDigestEnabled=true in their settings."""
-    user_ids = []
+def _digest_user_pages(segment, total_segments):
+    """Page source for one Scan segment over opted-in settings items."""
     params = {
         "FilterExpression": (
             Attr("SK").eq("META#SETTINGS") & Attr("weeklyDigestEnabled").eq(True)
         ),
         "ProjectionExpression": "PK",
     }
-    while True:
-        resp = table.scan(**params)
-        for item in resp.get("Items", []):
-            user_ids.append(extract_user_id(item["PK"]))
-        if "LastEvaluatedKey" not in resp:
-            break
-        params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
-    return user_ids
 
+    def pages(cursor):
+        return scan_segment(table, segment, total_segments, params, cursor)
+
+    return pages
+
+
+def _query_expiring_warranties(user_id, date_from, date_to=None, limit=None):
+    """Query GSI-4 for active warranties expiring from ``date_from``, soonest first."""
+    condition = Key("GSI4PK").eq(f"USER#{user_id}#ACTIVE")
+    if date_to:
+        condition &= Key("warrantyExpiryDate").between(date_from, date_to)
+    else:
+        condition &= Key("warrantyExpiryDate").gte(date_from)
+    params = {"IndexName": "ByWarrantyExpiry", "KeyConditionExpression": condition}
+    if limit:
+        params["Limit"] = limit
 
-def _get_active_warranties(user_id):
-    """Query GSI-4 for all active warranties for a user."""
     items = []
-    params = {
-        "IndexName": "ByWarrantyExpiry",
-        "KeyConditionExpression": Key("GSI4PK").eq(f"USER#{user_id}#ACTIVE"),
-    }
     while True:
         resp = table.query(**params)
         items.extend(resp.get("Items", []))
-        if "LastEvaluatedKey" not in resp:
-            break
+        if limit or "LastEvaluatedKey" not in resp:
+            return items
         params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
-    return items
 
 
-def _compute_stats(warranties, now):
-    """Compute summary statistics from a list of warranty items."""
+def _compute_stats(user_id, user_stats, now):
+    """Compute summary statistics from the user's META#STATS counters.
+
+    The expiry counters are per month, so they only say whether any
+    warranty expires in the next 30 days; if one does, those warranties
+    are read from GSI-4 to count the week and the month. Otherwise only
+    the soonest later warranty is fetched, when the counters show one.
+    """
     seven_days = (now + timedelta(days=7)).strftime("%Y-%m-%d")
     thirty_days = (now + timedelta(days=30)).strftime("%Y-%m-%d")
     today_str = now.strftime("%Y-%m-%d")
 
-    expiring_this_week = 0
-    expiring_this_month = 0
-    total_active = len(warranties)
-    total_warranty_value = Decimal("0")
-    soonest_item = None
-    soonest_days = None
+    expiries = {}
+    for suffix, count in counters_with_prefix(user_stats, EXPIRY_PREFIX).items():
+        # [:7] also buckets per-day counters left from before the monthly ones
+        month = suffix[:7]
+        if month >= today_str[:7]:
+            expiries[month] = expiries.get(month, 0) + int(count)
+    values = counters_with_prefix(user_stats, WARRANTY_VALUE_PREFIX)
 
-    for item in warranties:
-        expiry_str = item.get("warrantyExpiryDate", "")
-        if not expiry_str:
-            continue
-
-        amount = item.get("totalAmount", Decimal("0"))
-        if isinstance(amount, (int, float)):
-            amount = Decimal(str(amount))
-        total_warranty_value += amount
-
-        if expiry_str <= seven_days and expiry_str >= today_str:
-            expiring_this_week += 1
+    upcoming = []
+    if any(expiries.get(month, 0) > 0 for month in {today_str[:7], thirty_days[:7]}):
+        upcoming = _query_expiring_warranties(user_id, today_str, thirty_days)
+    expiring_this_week = sum(
+        1 for item in upcoming if item["warrantyExpiryDate"] <= seven_days
+    )
+    expiring_this_month = len(upcoming)
 
-        if expiry_str <= thirty_days and expiry_str >= today_str:
-            expiring_this_month += 1
+    soonest = upcoming[0] if upcoming else None
+    if soonest is None and any(count > 0 for count in expiries.values()):
+        later = _query_expiring_warranties(user_id, today_str, limit=1)
+        soonest = later[0] if later else None
 
-        try:
-            expiry_date = datetime.strptime(expiry_str, "%Y-%m-%d").replace(
-                tzinfo=timezone.utc
-            )
-            days_left = (expiry_date - now).days
-            if days_left >= 0 and (soonest_days is None or days_left < soonest_days):
-                soonest_days = days_left
-                soonest_item = {
-                    "receiptId": item.get("SK", "").removeprefix("RECEIPT#"),
-                    "merchantName": item.get("merchantName", "Unknown"),
-                    "warrantyExpiryDate": expiry_str,
-                    "daysRemaining": days_left,
-                }
-        except ValueError:
-            continue
+    soonest_item = None
+    if soonest is not None:
+        expiry_str = soonest["warrantyExpiryDate"]
+        expiry_date = datetime.strptime(expiry_str, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        soonest_item = {
+            "receiptId": soonest.get("SK", "").removeprefix("RECEIPT#"),
+            "merchantName": soonest.get("merchantName", "Unknown"),
+            "warrantyExpiryDate": expiry_str,
+            "daysRemaining": max((expiry_date - now).days, 0),
+        }
 
     return {
         "expiringThisWeek": expiring_this_week,
         "expiringThisMonth": expiring_this_month,
-        "totalActive": total_active,
-        "totalWarrantyValue": str(total_warranty_value),
+        "totalActive": int(user_stats.get("warranties", 0)),
+        "totalWarrantyValue": str(sum(values.values(), Decimal("0"))),
+        "warrantyValueByCurrency": {currency: str(value) for currency, value in values.items()},
         "soonestExpiring": soonest_item,
     }
 
 
+def _prune_store_stats(user_id, now_iso):
+    """Prune the zero counters of the stores item, which only bootstrap reads."""
+    stores = table.get_item(
+        Key={"PK": build_pk(user_id), "SK": build_store_stats_sk()}
+    ).get("Item")
+    prune_stats(table, stores, now_iso)
+
+
 def _send_summary(user_id, stats):
     """Publish a weekly summary notification via SNS."""
     message = {
@@ -136,26 +177,18 @@ def _send_summary(user_id, stats):
     )
 
 
-def handler(event, context):
-    """EventBridge scheduled handler — send weekly digest to opted-in users."""
-    try:
-        now = datetime.now(timezone.utc)
-        now_iso = now.isoformat()
-        users_processed = 0
-        summaries_sent = 0
-
-        user_ids = _get_digest_users()
+def _run_worker(run_id, segment, total_segments, context):
+    """Send summaries for one segment of a run and return its counters."""
+    now = datetime.now(timezone.utc)
 
-        logger.info(json.dumps({
-            "action": "weekly_summary_start",
-            "eligibleUsers": len(user_ids),
-            "timestamp": now_iso,
-        }))
-
-        for user_id in user_ids:
-            users_processed += 1
-            warranties = _get_active_warranties(user_id)
-            stats = _compute_stats(warranties, now)
+    def process_page(items):
+        summaries_sent = 0
+        for item in items:
+            user_id = extract_user_id(item["PK"])
+            now_iso = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+            user_stats = prune_stats(table, load_stats(table, user_id, now_iso), now_iso)
+            _prune_store_stats(user_id, now_iso)
+            stats = _compute_stats(user_id, user_stats, now)
             _send_summary(user_id, stats)
             summaries_sent += 1
 
@@ -165,9 +198,84 @@ def handler(event, context):
                 "totalActive": stats["totalActive"],
                 "expiringThisWeek": stats["expiringThisWeek"],
             }))
+        return {"usersProcessed": len(items), "summariesSent": summaries_sent}
+
+    return run_segment(
+        table,
+        JOB_NAME,
+        run_id,
+        segment,
+        _digest_user_pages(segment, total_segments),
+        process_page,
+        context=context,
+    )
+
+
+def _handle_segment_messages(event, context):
+    """SQS worker — process the segments delivered in an SQS event."""
+    for message in parse_segment_messages(event):
+        try:
+            counters = _run_worker(
+                message["runId"],
+                message["segment"],
+                message["totalSegments"],
+                context,
+            )
+        except SegmentTimeout:
+            requeue_segment(sqs_client, WORKER_QUEUE_URL, message)
+            logger.info(json.dumps({
+                "action": "weekly_summary_segment_requeued",
+                "runId": message["runId"],
+                "segment": message["segment"],
+            }))
+            continue
+
+        logger.info(json.dumps({
+            "action": "weekly_summary_segment_complete",
+            "runId": message["runId"],
+            "segment": message["segment"],
+            **counters,
+        }))
+
+    return {"statusCode": 200, "body": json.dumps({"status": "ok"})}
+
+
+def handler(event, context):
+    """EventBridge scheduled handler — send weekly digest to opted-in users.
+
+    Also acts as the SQS worker when invoked with segment messages.
+    """
+    try:
+        event = event or {}
+        if "Records" in event:
+            return _handle_segment_messages(event, context)
+
+        now_iso = datetime.now(timezone.utc).isoformat()
+        run_id = get_run_id(event)
+
+        logger.info(json.dumps({
+            "action": "weekly_summary_start",
+            "runId": run_id,
+            "segments": TOTAL_SEGMENTS,
+            "timestamp": now_iso,
+        }))
+
+        results = dispatch_segments(
+            JOB_NAME,
+            run_id,
+            TOTAL_SEGMENTS,
+            lambda segment: _run_worker(run_id, segment, TOTAL_SEGMENTS, context),
+            sqs_client=sqs_client,
+            queue_url=WORKER_QUEUE_URL,
+        )
+        totals = sum_counters(results)
+        users_processed = totals.get("usersProcessed", 0)
+        summaries_sent = totals.get("summariesSent", 0)
 
         logger.info(json.dumps({
             "action": "weekly_summary_complete",
+            "runId": run_id,
+            "dispatched": bool(WORKER_QUEUE_URL),
             "usersProcessed": users_processed,
             "summariesSent": summaries_sent,
             "timestamp": now_iso,
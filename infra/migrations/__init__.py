@@ -0,0 +1,35 @@
+"""Data migrations for the ReceiptVault table.
+
+A migration is a subclass of migrations.base.Migration with a ``transform``
+method that takes one item and returns the item as it should be stored (or
+None to leave it alone). migrations.runner.MigrationRunner applies it across
+the table through a parallel segmented Scan, paced by an adaptive limiter
+against the capacity DynamoDB reports as consumed, with per-segment
+checkpoints so an interrupted run resumes, an optional dry run, and
+throughput metrics.
+
+Migrations live in migrations/catalog as ``mNNNN_<name>.py`` modules and are
+run from infra/:
+
+    python -m migrations list
+    python -m migrations run normalize_currency --dry-run
+    python -m migrations run normalize_currency --read-rate 200 --write-rate 50
+
+On a table with a stream (the deployed one) the stream processor folds the
+writes into the sync tree and stats, so the runner sets DERIVED_VIEWS_MODE
+to "stream" and the after_write hooks leave them alone; ``--derived-views
+inline`` is refused there.
+
+``--endpoint-url http://localhost:8000`` points the runner at DynamoDB Local;
+under moto, pass a mocked client to MigrationRunner directly.
+"""
+
+import os
+import sys
+
+# The runner and catalog reuse the Lambda layer's helpers (shared.*)
+_LAYER_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda_layer", "python"
+)
+if _LAYER_DIR not in sys.path:
+    sys.path.insert(0, _LAYER_DIR)
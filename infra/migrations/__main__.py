@@ -0,0 +1,82 @@
+"""Command line for the migration runner; see migrations/__init__.py."""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import boto3
+
+from migrations.catalog import load_migrations
+from migrations.runner import DEFAULT_PAGE_SIZE, DEFAULT_SEGMENTS, MigrationRunner
+
+DEFAULT_TABLE = "ReceiptVault"
+DEFAULT_REGION = "eu-west-1"
+
+
+def table_has_stream(client, table_name):
+    """Return True if the table streams its changes (to the stream processor)."""
+    spec = client.describe_table(TableName=table_name)["Table"].get("StreamSpecification") or {}
+    return bool(spec.get("StreamEnabled"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="ReceiptVault data migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list the migrations in the catalog")
+
+    run = commands.add_parser("run", help="apply a migration to the table")
+    run.add_argument("name", help="migration name, as shown by 'list'")
+    run.add_argument("--dry-run", action="store_true", help="count changes without writing")
+    run.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS, help="parallel Scan segments")
+    run.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="items per Scan page")
+    run.add_argument("--read-rate", type=float, help="max read capacity units per second")
+    run.add_argument("--write-rate", type=float, help="max write capacity units per second")
+    run.add_argument("--run-id", help="checkpoint namespace; re-use it to resume a run")
+    run.add_argument("--table", default=DEFAULT_TABLE)
+    run.add_argument("--region", default=DEFAULT_REGION)
+    run.add_argument("--endpoint-url", help="e.g. http://localhost:8000 for DynamoDB Local")
+    run.add_argument(
+        "--derived-views", choices=("inline", "stream"),
+        help="who keeps the sync tree and stats (default: 'stream' if the table has a "
+             "stream, else 'inline'); 'inline' is refused on a table with a stream",
+    )
+    args = parser.parse_args(argv)
+
+    migrations = load_migrations()
+    if args.command == "list":
+        for name, cls in migrations.items():
+            print(f"{name:30} {cls.description}")
+        return 0
+
+    if args.name not in migrations:
+        parser.error(f"unknown migration {args.name!r}; see 'list'")
+
+    client = boto3.client("dynamodb", region_name=args.region, endpoint_url=args.endpoint_url)
+    streamed = table_has_stream(client, args.table)
+    if args.derived_views == "inline" and streamed:
+        parser.error(
+            f"{args.table} has a stream; its stream processor already folds writes into "
+            "the sync tree and stats, so --derived-views inline would apply them twice"
+        )
+    os.environ["DERIVED_VIEWS_MODE"] = args.derived_views or ("stream" if streamed else "inline")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    runner = MigrationRunner(
+        client,
+        args.table,
+        migrations[args.name](),
+        segments=args.segments,
+        page_size=args.page_size,
+        read_rate=args.read_rate,
+        write_rate=args.write_rate,
+        dry_run=args.dry_run,
+        run_id=args.run_id,
+    )
+    result = runner.run()
+    print(json.dumps({"migration": args.name, "runId": runner.run_id, "dryRun": args.dry_run, **result}, indent=2))
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Base class for data migrations."""
+
+KEY_ATTRIBUTES = ("PK", "SK")
+
+
+class Migration:
+    """One data fix, applied item by item.
+
+    Subclasses set ``name`` (used on the command line and in checkpoint
+    keys) and ``description``, and implement ``transform``. The runner hands
+    ``transform`` a copy of each scanned item; returning a changed dict
+    writes the difference back (new or changed attributes are SET, missing
+    ones REMOVEd) and returning None or an equal dict skips the item.
+
+    Every write is conditional on ``version_attribute`` still holding the
+    value that was read, so an item changed by live traffic mid-run is
+    re-read and transformed again rather than overwritten. Key attributes
+    may not change.
+    """
+
+    name = None
+    description = ""
+    # Attribute whose value must be unchanged for a write to apply
+    version_attribute = "serverVersion"
+
+    def scan_filter(self):
+        """Return a boto3 condition that narrows the Scan, or None for all items."""
+        return None
+
+    def projection(self):
+        """Return the attribute names ``transform`` needs, or None for whole items.
+
+        A projection shrinks the Scan's response, not its read capacity,
+        which DynamoDB charges on full item size.
+        """
+        return None
+
+    def transform(self, item):
+        """Return the item as it should be stored, or None to leave it as is."""
+        raise NotImplementedError
+
+    def after_write(self, table, old_item, new_item):
+        """Hook called after an item is written (not in dry runs)."""
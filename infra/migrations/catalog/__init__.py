@@ -0,0 +1,27 @@
+"""Catalog of migrations, one ``mNNNN_<name>.py`` module per migration.
+
+Each module defines a single Migration subclass. Modules are discovered by
+name, so adding a file here is all it takes to make a migration runnable;
+the number only orders the ``list`` output.
+"""
+
+import importlib
+import inspect
+import pkgutil
+
+from migrations.base import Migration
+
+
+def load_migrations():
+    """Return ``{name: Migration subclass}`` for every catalog module, in order."""
+    migrations = {}
+    for module_info in sorted(pkgutil.iter_modules(__path__), key=lambda m: m.name):
+        if not module_info.name.startswith("m"):
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            if issubclass(cls, Migration) and cls is not Migration and cls.__module__ == module.__name__:
+                if cls.name in migrations:
+                    raise ValueError(f"Duplicate migration name {cls.name!r}")
+                migrations[cls.name] = cls
+    return migrations
@@ -0,0 +1,49 @@
+"""Rewrite every receipt's warranty expiry and GSI keys from its own fields.
+
+The CLI counterpart of the index-backfill Lambda, for tables the Lambda
+cannot reach (DynamoDB Local, restored backups). A fix to GSI keys alone
+leaves serverVersion alone, as clients never see those keys. A changed
+warrantyExpiryDate is client-visible, so that write bumps serverVersion
+and updatedAt (and GSI6SK with them) and is folded into the user's sync
+tree and stats, like the repairs in shared.indexing (by the stream
+processor instead when the table has a stream; see migrations/__init__.py).
+"""
+
+import time
+
+from boto3.dynamodb.conditions import Attr
+
+from shared.indexing import DERIVED_ATTRIBUTES, record_repair, with_derived_attributes
+from shared.stats import RECEIPT_ATTRIBUTES
+
+from migrations.base import Migration
+
+# Everything shared.indexing.derive_attributes() reads
+_SOURCE_ATTRIBUTES = (
+    "receiptId", "status", "purchaseDate", "warrantyMonths", "category",
+    "merchantName", "updatedAt",
+)
+
+
+class RecomputeIndexKeys(Migration):
+    name = "recompute_index_keys"
+    description = "Re-derive warrantyExpiryDate and GSI1-8 keys on receipts"
+
+    def scan_filter(self):
+        return Attr("SK").begins_with("RECEIPT#")
+
+    def projection(self):
+        # The stats fields too, for the writes folded into the stats item
+        return _SOURCE_ATTRIBUTES + RECEIPT_ATTRIBUTES + DERIVED_ATTRIBUTES
+
+    def transform(self, item):
+        repaired = with_derived_attributes(item)
+        if repaired.get("warrantyExpiryDate") != item.get("warrantyExpiryDate"):
+            repaired["updatedAt"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            repaired["serverVersion"] = int(item.get("serverVersion", 0)) + 1
+            repaired = with_derived_attributes(repaired)  # GSI6SK follows updatedAt
+        return repaired
+
+    def after_write(self, table, old_item, new_item):
+        if new_item.get("serverVersion") != old_item.get("serverVersion"):
+            record_repair(table, old_item, new_item)
@@ -0,0 +1,64 @@
+"""Normalise receipt currencies to upper-case ISO 4217 codes.
+
+Older clients and OCR results stored values such as "eur", " EUR " or "€".
+Codes are trimmed and upper-cased and the common symbols mapped to their
+code; anything still not a three-letter code is left for manual review.
+The fix is client-visible, so each write bumps serverVersion and updatedAt
+(and GSI6SK with it) and is folded into the user's sync tree, which makes
+devices pull the corrected receipt on their next delta sync, and into the
+spend and warranty-value counters of the user's stats item (by the stream
+processor instead when the table has a stream; see migrations/__init__.py).
+"""
+
+import re
+import time
+
+from boto3.dynamodb.conditions import Attr
+
+from shared.dynamodb import extract_receipt_id, extract_user_id
+from shared.stats import record_stats
+from shared.streams import derived_views_inline
+from shared.synctree import record_version
+
+from migrations.base import Migration
+
+CURRENCY_SYMBOLS = {"€": "EUR", "$": "USD", "£": "GBP"}
+_ISO_CODE = re.compile(r"^[A-Z]{3}$")
+
+
+def normalize_currency(value):
+    """Return the ISO code for a stored currency value, or None if unknown."""
+    code = str(value).strip().upper()
+    code = CURRENCY_SYMBOLS.get(code, code)
+    return code if _ISO_CODE.match(code) else None
+
+
+class NormalizeCurrency(Migration):
+    name = "normalize_currency"
+    description = "Trim, upper-case and map symbols in receipt currency codes"
+
+    def scan_filter(self):
+        return Attr("SK").begins_with("RECEIPT#") & Attr("currency").exists()
+
+    def transform(self, item):
+        code = normalize_currency(item["currency"])
+        if code is None or code == item["currency"]:
+            return None
+        now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        item["currency"] = code
+        item["updatedAt"] = now_iso
+        item["serverVersion"] = int(item.get("serverVersion", 0)) + 1
+        if "GSI6SK" in item:
+            item["GSI6SK"] = now_iso
+        return item
+
+    def after_write(self, table, old_item, new_item):
+        if not derived_views_inline():
+            return  # the stream processor folds the write in
+        record_version(
+            table,
+            extract_user_id(new_item["PK"]),
+            new_item.get("receiptId") or extract_receipt_id(new_item["SK"]),
+            new_item["serverVersion"],
+        )
+        record_stats(table, old_item, new_item, new_item["updatedAt"])
@@ -0,0 +1,49 @@
+"""Move stats items to month expiry counters and a separate stores item.
+
+Stats items written before the change hold one ``expiry#<YYYY-MM-DD>``
+counter per day and every ``store#`` counter. The day counters are summed
+into ``expiry#<YYYY-MM>`` ones and the store counters dropped, bumping
+``version`` for the bootstrap ETag; the user's META#STATS#STORES item is
+then built from a Query of their receipts. Writes are conditional on the
+stats item's ``version``, which every counter ADD bumps, so a concurrent
+receipt write makes the item re-read.
+"""
+
+import time
+
+from boto3.dynamodb.conditions import Attr
+
+from shared.dynamodb import build_stats_sk, extract_user_id
+from shared.stats import EXPIRY_PREFIX, STORE_PREFIX, rebuild_stats
+
+from migrations.base import Migration
+
+
+class BucketStatsCounters(Migration):
+    name = "bucket_stats_counters"
+    description = "Sum per-day expiry counters by month and move store counters off META#STATS"
+    version_attribute = "version"
+
+    def scan_filter(self):
+        return Attr("SK").eq(build_stats_sk())
+
+    def transform(self, item):
+        changed = False
+        for name in list(item):
+            if name.startswith(STORE_PREFIX):
+                del item[name]
+                changed = True
+            elif name.startswith(EXPIRY_PREFIX) and len(name) > len(EXPIRY_PREFIX) + 7:
+                month = name[:len(EXPIRY_PREFIX) + 7]
+                item[month] = item.get(month, 0) + item.pop(name)
+                changed = True
+        if not changed:
+            return None
+        item["version"] = int(item.get("version", 0)) + 1
+        item["updatedAt"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        return item
+
+    def after_write(self, table, old_item, new_item):
+        # The stats item exists, so only a missing stores item is built
+        now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        rebuild_stats(table, extract_user_id(new_item["PK"]), now_iso)
@@ -0,0 +1,77 @@
+"""Adaptive capacity limiter for migration runs.
+
+Each limiter is a token bucket refilled at ``rate`` capacity units per
+second and shared by every segment thread. Threads debit the units a call
+actually consumed (as reported in ConsumedCapacity) and sleep while the
+bucket is in debt, so a run holds close to its target rate regardless of
+item size. The rate adapts AIMD-style: a throttling error halves it, and
+every ``increase_interval`` seconds without one it climbs back by 10% of
+the configured ceiling.
+"""
+
+import threading
+import time
+
+DEFAULT_INCREASE_INTERVAL = 10.0
+DECREASE_FACTOR = 0.5
+INCREASE_FRACTION = 0.1
+
+# Error codes DynamoDB returns when a request exceeds available capacity
+THROTTLE_CODES = frozenset({
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+})
+
+
+class AdaptiveRateLimiter:
+    """Token bucket of capacity units with an AIMD-adjusted refill rate."""
+
+    def __init__(self, max_rate, min_rate=1.0, increase_interval=DEFAULT_INCREASE_INTERVAL,
+                 clock=time.monotonic, sleep=time.sleep):
+        if max_rate <= 0:
+            raise ValueError("max_rate must be positive")
+        self.max_rate = float(max_rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.rate = self.max_rate
+        self.increase_interval = increase_interval
+        self.throttles = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # Start with one second of burst so the first page is not delayed
+        self._tokens = self.max_rate
+        self._refilled_at = clock()
+        self._last_change = self._refilled_at
+
+    def consume(self, units):
+        """Debit consumed units and sleep until the bucket is out of debt."""
+        with self._lock:
+            self._refill()
+            self._tokens -= units
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+
+    def throttled(self):
+        """Record a throttling error: halve the rate and drain the bucket."""
+        with self._lock:
+            self._refill()
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+            self._tokens = min(self._tokens, 0.0)
+            self._last_change = self._clock()
+
+    def _refill(self):
+        now = self._clock()
+        if now - self._last_change >= self.increase_interval and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * INCREASE_FRACTION)
+            self._last_change = now
+        self._tokens = min(self.rate, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+
+def is_throttle(exc):
+    """Return True if a botocore ClientError is a capacity throttle."""
+    response = getattr(exc, "response", None) or {}
+    return response.get("Error", {}).get("Code") in THROTTLE_CODES
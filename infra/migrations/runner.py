@@ -0,0 +1,292 @@
+"""Runs a Migration across the table with parallel segmented Scans.
+
+Each of ``segments`` threads scans one Scan segment in pages of
+``page_size`` items, transforms every item and writes back the ones that
+changed. Reads and writes are paced by separate AdaptiveRateLimiters fed
+with the ConsumedCapacity of each call; throttling errors are retried after
+the limiter backs off. After every page the segment's cursor and counters
+are saved as a shared.fanout checkpoint item (PK = JOB#migration_<name>),
+so running again with the same run ID resumes each segment where it
+stopped. Dry runs transform and count but write nothing, checkpoints
+included.
+"""
+
+import copy
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from shared.dynamodb import UpdateBuilder
+from shared.fanout import build_job_pk, load_checkpoint, save_checkpoint
+from shared.fastpath import FastTable
+
+from migrations.base import KEY_ATTRIBUTES
+from migrations.ratelimit import AdaptiveRateLimiter, is_throttle
+
+logger = logging.getLogger("migrations")
+
+DEFAULT_SEGMENTS = 8
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_PROGRESS_INTERVAL = 10.0
+# Times an item is re-read and re-transformed after losing a write race
+MAX_CONFLICT_RETRIES = 3
+MAX_THROTTLE_RETRIES = 10
+# Backoff between throttled retries when no limiter is configured
+THROTTLE_BACKOFF_SECONDS = 1.0
+
+MIGRATION_UPDATE = UpdateBuilder()
+
+COUNTERS = ("scanned", "changed", "unchanged", "conflicts", "failed")
+
+
+def item_diff(old, new):
+    """Return ``(fields, remove)`` that turn item ``old`` into ``new``."""
+    for key in KEY_ATTRIBUTES:
+        if new.get(key) != old.get(key):
+            raise ValueError(f"Migrations may not change key attribute {key}")
+    fields = {k: v for k, v in new.items() if k not in old or old[k] != v}
+    remove = [k for k in old if k not in new]
+    return fields, remove
+
+
+class Metrics:
+    """Thread-safe run counters plus consumed capacity and throughput."""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.started = clock()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.read_units = 0.0
+        self.write_units = 0.0
+        self.throttles = 0
+
+    def add(self, counters=None, read_units=0.0, write_units=0.0, throttles=0):
+        with self._lock:
+            for key, value in (counters or {}).items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            self.read_units += read_units
+            self.write_units += write_units
+            self.throttles += throttles
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(self._clock() - self.started, 1e-9)
+            return {
+                **self.counters,
+                "throttles": self.throttles,
+                "readUnits": round(self.read_units, 1),
+                "writeUnits": round(self.write_units, 1),
+                "elapsedSeconds": round(elapsed, 1),
+                "itemsPerSecond": round(self.counters["scanned"] / elapsed, 1),
+                "readUnitsPerSecond": round(self.read_units / elapsed, 1),
+                "writeUnitsPerSecond": round(self.write_units / elapsed, 1),
+            }
+
+
+class MigrationRunner:
+    """Applies one Migration to a table; see the module docstring."""
+
+    def __init__(self, client, table_name, migration, segments=DEFAULT_SEGMENTS,
+                 page_size=DEFAULT_PAGE_SIZE, read_rate=None, write_rate=None,
+                 dry_run=False, run_id=None, progress_interval=DEFAULT_PROGRESS_INTERVAL):
+        if not migration.name:
+            raise ValueError("Migration has no name")
+        self.table = FastTable(client, table_name)
+        self.migration = migration
+        self.segments = segments
+        self.page_size = page_size
+        self.dry_run = dry_run
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.progress_interval = progress_interval
+        self.job_name = f"migration_{migration.name}"
+        self.read_limiter = AdaptiveRateLimiter(read_rate) if read_rate else None
+        self.write_limiter = AdaptiveRateLimiter(write_rate) if write_rate else None
+        self.metrics = Metrics()
+
+    def run(self):
+        """Run every segment to completion and return the metrics snapshot."""
+        logger.info(
+            "migration %s run %s: %d segments%s", self.migration.name, self.run_id,
+            self.segments, " (dry run)" if self.dry_run else "",
+        )
+        stop = threading.Event()
+        reporter = threading.Thread(target=self._report_progress, args=(stop,), daemon=True)
+        reporter.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.segments) as pool:
+                list(pool.map(self._run_segment, range(self.segments)))
+        finally:
+            stop.set()
+            reporter.join()
+
+        result = self.metrics.snapshot()
+        logger.info("migration %s run %s finished: %s", self.migration.name, self.run_id, result)
+        return result
+
+    # ------------------------------------------------------------------
+    # Segments
+    # ------------------------------------------------------------------
+
+    def _run_segment(self, segment):
+        checkpoint = {}
+        if not self.dry_run:
+            checkpoint = load_checkpoint(self.table, self.job_name, self.run_id, segment) or {}
+            if checkpoint.get("done"):
+                return
+        counters = {k: int(v) for k, v in checkpoint.get("counters", {}).items()}
+
+        params = self._scan_params(segment)
+        start_key = checkpoint.get("cursor")
+        while True:
+            if start_key:
+                params["ExclusiveStartKey"] = start_key
+            resp = self._call(self.read_limiter, "read", self.table.scan, **params)
+
+            page = dict.fromkeys(COUNTERS, 0)
+            for item in resp.get("Items", []):
+                if item["PK"].startswith(build_job_pk("")):
+                    continue  # checkpoint items of this and other jobs
+                page["scanned"] += 1
+                page[self._migrate(item)] += 1
+            self.metrics.add(page)
+            for key, value in page.items():
+                counters[key] = counters.get(key, 0) + value
+
+            start_key = resp.get("LastEvaluatedKey")
+            if not self.dry_run:
+                save_checkpoint(
+                    self.table, self.job_name, self.run_id, segment,
+                    start_key, counters, done=start_key is None,
+                )
+            if not start_key:
+                return
+
+    def _scan_params(self, segment):
+        params = {
+            "Segment": segment,
+            "TotalSegments": self.segments,
+            "Limit": self.page_size,
+            "ReturnConsumedCapacity": "TOTAL",
+        }
+        condition = self.migration.scan_filter()
+        if condition is not None:
+            params["FilterExpression"] = condition
+        projection = self.migration.projection()
+        if projection:
+            names = dict.fromkeys(KEY_ATTRIBUTES + (self.migration.version_attribute,))
+            names.update(dict.fromkeys(projection))
+            placeholders = {f"#p{i}": name for i, name in enumerate(names)}
+            params["ProjectionExpression"] = ", ".join(placeholders)
+            params["ExpressionAttributeNames"] = placeholders
+        return params
+
+    # ------------------------------------------------------------------
+    # Items
+    # ------------------------------------------------------------------
+
+    def _migrate(self, item):
+        """Transform and write one item; return the counter it falls under."""
+        for _ in range(MAX_CONFLICT_RETRIES):
+            try:
+                new_item = self.migration.transform(copy.deepcopy(item))
+                if new_item is None:
+                    return "unchanged"
+                fields, remove = item_diff(item, new_item)
+            except Exception:
+                logger.exception("transform failed for %s / %s", item.get("PK"), item.get("SK"))
+                return "failed"
+            if not fields and not remove:
+                return "unchanged"
+            if self.dry_run:
+                return "changed"
+
+            try:
+                self._write(item, fields, remove)
+            except ClientError as exc:
+                if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    logger.exception("write failed for %s / %s", item["PK"], item["SK"])
+                    return "failed"
+                item = self._reload(item)
+                if item is None:
+                    return "conflicts"  # deleted since it was scanned
+                continue
+            try:
+                self.migration.after_write(self.table, item, new_item)
+            except Exception:
+                # The item itself is written; a re-run would see it as unchanged
+                logger.exception("after_write failed for %s / %s", item["PK"], item["SK"])
+                return "failed"
+            return "changed"
+        return "conflicts"
+
+    def _write(self, item, fields, remove):
+        update_expr, expr_names, expr_values = MIGRATION_UPDATE.build(fields, remove)
+        version_attribute = self.migration.version_attribute
+        expr_names["#cv"] = version_attribute
+        if version_attribute in item:
+            condition = "#cv = :cv"
+            expr_values[":cv"] = item[version_attribute]
+        else:
+            condition = "attribute_exists(PK) AND attribute_not_exists(#cv)"
+
+        kwargs = {
+            "Key": {key: item[key] for key in KEY_ATTRIBUTES},
+            "UpdateExpression": update_expr,
+            "ExpressionAttributeNames": expr_names,
+            "ConditionExpression": condition,
+            "ReturnConsumedCapacity": "TOTAL",
+        }
+        if expr_values:
+            kwargs["ExpressionAttributeValues"] = expr_values
+        self._call(self.write_limiter, "write", self.table.update_item, **kwargs)
+
+    def _reload(self, item):
+        resp = self._call(
+            self.read_limiter, "read", self.table.get_item,
+            Key={key: item[key] for key in KEY_ATTRIBUTES},
+            ConsistentRead=True,
+            ReturnConsumedCapacity="TOTAL",
+        )
+        return resp.get("Item")
+
+    def _call(self, limiter, kind, operation, **kwargs):
+        """Call a table operation, pacing it and retrying capacity throttles."""
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            try:
+                resp = operation(**kwargs)
+                break
+            except ClientError as exc:
+                if not is_throttle(exc) or attempt == MAX_THROTTLE_RETRIES:
+                    raise
+                self.metrics.add(throttles=1)
+                if limiter:
+                    limiter.throttled()
+                    limiter.consume(0)
+                else:
+                    time.sleep(THROTTLE_BACKOFF_SECONDS * (attempt + 1))
+
+        units = (resp.get("ConsumedCapacity") or {}).get("CapacityUnits", 0)
+        if kind == "read":
+            self.metrics.add(read_units=units)
+        else:
+            self.metrics.add(write_units=units)
+        if limiter:
+            limiter.consume(units)
+        return resp
+
+    def _report_progress(self, stop):
+        while not stop.wait(self.progress_interval):
+            snapshot = self.metrics.snapshot()
+            logger.info(
+                "%s: scanned %d, changed %d, conflicts %d, failed %d | "
+                "%.1f items/s, %.1f RCU/s, %.1f WCU/s, %d throttles",
+                self.migration.name, snapshot["scanned"], snapshot["changed"],
+                snapshot["conflicts"], snapshot["failed"], snapshot["itemsPerSecond"],
+                snapshot["readUnitsPerSecond"], snapshot["writeUnitsPerSecond"],
+                snapshot["throttles"],
+            )
@@ -10,6 +10,7 @@ from aws_cdk import (
     Stack,
     Duration,
     RemovalPolicy,
+    Size,
     CfnOutput,
     Tags,
     aws_dynamodb as dynamodb,
@@ -23,12 +24,15 @@ from aws_cdk import (
     aws_cloudfront_origins as origins,
     aws_sns as sns,
     aws_sns_subscriptions as subscriptions,
+    aws_sqs as sqs,
+    aws_lambda_event_sources as lambda_event_sources,
     aws_events as events,
     aws_events_targets as targets,
     aws_cloudwatch as cloudwatch,
     aws_cloudwatch_actions as cw_actions,
     aws_iam as iam,
     aws_logs as logs,
+    aws_secretsmanager as secretsmanager,
 )
 from constructs import Construct
 
@@ -62,6 +66,8 @@ class ReceiptVaultStack(Stack):
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
             point_in_time_recovery=True,
             time_to_live_attribute="ttl",
+            # Feeds the stream processor that maintains derived views
+            stream=dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
             deletion_protection=True,
             removal_policy=RemovalPolicy.RETAIN,
         )
@@ -138,6 +144,55 @@ class ReceiptVaultStack(Stack):
             projection_type=dynamodb.ProjectionType.KEYS_ONLY,
         )
 
+        # GSI-7: ByExpiryDate — Warranties by expiry day, write-sharded (sparse)
+        table.add_global_secondary_index(
+            index_name="ByExpiryDate",
+            partition_key=dynamodb.Attribute(
+                name="GSI7PK", type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="GSI7SK", type=dynamodb.AttributeType.STRING
+            ),
+            projection_type=dynamodb.ProjectionType.INCLUDE,
+            non_key_attributes=[
+                "merchantName",
+                "warrantyExpiryDate",
+                "lastNotifiedExpiry",
+                "status",
+            ],
+        )
+
+        # GSI-8: ByUserListView — Compact list-screen projection (sparse,
+        # only non-deleted receipts carry GSI8PK). A table update can create
+        # only one GSI, so a stack that does not have GSI-7 yet is first
+        # deployed with -c listViewIndex=false (see docs/08, Deployment).
+        list_view_index = str(self.node.try_get_context("listViewIndex")).lower() != "false"
+        if list_view_index:
+            table.add_global_secondary_index(
+                index_name="ByUserListView",
+                partition_key=dynamodb.Attribute(
+                    name="GSI8PK", type=dynamodb.AttributeType.STRING
+                ),
+                sort_key=dynamodb.Attribute(
+                    name="purchaseDate", type=dynamodb.AttributeType.STRING
+                ),
+                projection_type=dynamodb.ProjectionType.INCLUDE,
+                non_key_attributes=[
+                    "receiptId",
+                    "displayName",
+                    "merchantName",
+                    "totalAmount",
+                    "currency",
+                    "category",
+                    "status",
+                    "warrantyExpiryDate",
+                    "imageKeys",
+                    "isFavorite",
+                    "serverVersion",
+                    "updatedAt",
+                ],
+            )
+
         # ── Section 3: S3 Buckets ──────────────────────────────────────
 
         # Access logs bucket — must be created before image bucket
@@ -184,7 +239,8 @@ class ReceiptVaultStack(Stack):
             ],
         )
 
-        # Export bucket — transient exports (auto-expire after 7 days)
+        # Export bucket — transient exports (auto-expire after 7 days); the
+        # small per-export manifests are kept longer for incremental exports
         export_bucket = s3.Bucket(
             self,
             "ExportBucket",
@@ -196,7 +252,15 @@ class ReceiptVaultStack(Stack):
             auto_delete_objects=True,
             removal_policy=RemovalPolicy.DESTROY,
             lifecycle_rules=[
-                s3.LifecycleRule(expiration=Duration.days(7)),
+                s3.LifecycleRule(
+                    prefix="exports/",
+                    expiration=Duration.days(7),
+                    abort_incomplete_multipart_upload_after=Duration.days(1),
+                ),
+                s3.LifecycleRule(
+                    prefix="manifests/",
+                    expiration=Duration.days(400),
+                ),
             ],
         )
 
@@ -264,12 +328,26 @@ class ReceiptVaultStack(Stack):
             description="Shared utilities for Receipt Vault Lambdas",
         )
 
+        # HMAC key for signed pagination cursors (GET /receipts)
+        cursor_signing_secret = secretsmanager.Secret(
+            self,
+            "CursorSigningSecret",
+            secret_name="receiptvault/cursor-signing-key",
+            description="HMAC key used to sign list pagination cursors",
+            generate_secret_string=secretsmanager.SecretStringGenerator(
+                password_length=64,
+                exclude_punctuation=True,
+            ),
+        )
+
         # ── Section 6: Lambda Functions ─────────────────────────────────
 
         # Common environment variables
         common_env = {
             "TABLE_NAME": table.table_name,
             "REGION": "eu-west-1",
+            # Sync tree and stats are kept by the stream processor, not inline
+            "DERIVED_VIEWS_MODE": "stream",
         }
 
         # receipt-crud: CRUD operations on receipts, warranties, user profile/settings
@@ -285,6 +363,8 @@ class ReceiptVaultStack(Stack):
             timeout=Duration.seconds(10),
             environment={
                 **common_env,
+                "CURSOR_SECRET_ARN": cursor_signing_secret.secret_arn,
+                "LIST_VIEW_INDEX": "true" if list_view_index else "false",
             },
             layers=[shared_layer],
             description="CRUD operations for receipts, warranties, user profile and settings",
@@ -327,10 +407,10 @@ class ReceiptVaultStack(Stack):
             timeout=Duration.seconds(30),
             environment={
                 **common_env,
-                "MAX_BATCH_SIZE": "25",
+                "MAX_BATCH_SIZE": "250",
             },
             layers=[shared_layer],
-            description="Sync engine: delta pull, push, and full reconciliation",
+            description="Sync engine: delta pull, push, full reconciliation and hash tree",
             log_retention=logs.RetentionDays.ONE_MONTH,
         )
 
@@ -374,6 +454,10 @@ class ReceiptVaultStack(Stack):
             environment={
                 **common_env,
                 "SNS_TOPIC_ARN": "",  # Set after SNS topic creation
+                # "index" walks GSI-7; keep "scan" until existing items are backfilled
+                "WARRANTY_CHECK_MODE": "scan",
+                "MAX_REMINDER_WINDOW_DAYS": "30",
+                "TOTAL_SEGMENTS": "4",
             },
             layers=[shared_layer],
             description="Daily check for expiring warranties and send notifications",
@@ -394,12 +478,34 @@ class ReceiptVaultStack(Stack):
             environment={
                 **common_env,
                 "SNS_TOPIC_ARN": "",  # Set after SNS topic creation
+                "TOTAL_SEGMENTS": "4",
             },
             layers=[shared_layer],
             description="Weekly summary digest of warranties and receipts",
             log_retention=logs.RetentionDays.ONE_MONTH,
         )
 
+        # index-backfill: Repair derived GSI attributes on existing receipts
+        # (invoked manually)
+        index_backfill_fn = lambda_.Function(
+            self,
+            "IndexBackfillFn",
+            function_name="receiptvault-index-backfill-prod",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            architecture=lambda_.Architecture.ARM_64,
+            handler="handler.handler",
+            code=lambda_.Code.from_asset(os.path.join("lambdas", "index_backfill")),
+            memory_size=256,
+            timeout=Duration.seconds(300),
+            environment={
+                **common_env,
+                "TOTAL_SEGMENTS": "8",
+            },
+            layers=[shared_layer],
+            description="Backfill warranty expiry and GSI keys on existing receipts",
+            log_retention=logs.RetentionDays.ONE_MONTH,
+        )
+
         # user-deletion: GDPR cascade delete (Cognito -> DynamoDB -> S3)
         user_deletion_fn = lambda_.Function(
             self,
@@ -414,6 +520,7 @@ class ReceiptVaultStack(Stack):
             environment={
                 **common_env,
                 "S3_BUCKET": image_bucket.bucket_name,
+                "EXPORT_BUCKET": export_bucket.bucket_name,
                 "USER_POOL_ID": user_pool.user_pool_id,
             },
             layers=[shared_layer],
@@ -437,10 +544,13 @@ class ReceiptVaultStack(Stack):
                 "S3_BUCKET": image_bucket.bucket_name,
                 "EXPORT_BUCKET": export_bucket.bucket_name,
                 "EXPORT_TTL_DAYS": "7",
+                "EXPORT_PREFETCH_WORKERS": "8",
+                "EXPORT_PREFETCH_BUDGET_MB": "64",
+                "EXPORT_CHUNK_RESERVE_SECONDS": "30",
                 "SNS_TOPIC_ARN": "",  # Set after SNS topic creation
             },
             layers=[shared_layer],
-            description="Batch export receipts to ZIP with images",
+            description="Asynchronous, resumable export of receipts to ZIP with images",
             log_retention=logs.RetentionDays.ONE_MONTH,
         )
 
@@ -465,6 +575,29 @@ class ReceiptVaultStack(Stack):
             log_retention=logs.RetentionDays.ONE_MONTH,
         )
 
+        # stream-processor: Derived views (GSI key repair, sync tree, stats)
+        # from the table stream
+        stream_processor_fn = lambda_.Function(
+            self,
+            "StreamProcessorFn",
+            function_name="receiptvault-stream-processor-prod",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            architecture=lambda_.Architecture.ARM_64,
+            handler="handler.handler",
+            code=lambda_.Code.from_asset(
+                os.path.join("lambdas", "stream_processor")
+            ),
+            memory_size=256,
+            timeout=Duration.seconds(60),
+            environment={
+                **common_env,
+                "STREAM_GROUP_WORKERS": "4",
+            },
+            layers=[shared_layer],
+            description="Maintain derived views from the DynamoDB table stream",
+            log_retention=logs.RetentionDays.ONE_MONTH,
+        )
+
         # presigned-url-generator: Generate pre-signed S3 URLs for upload/download
         presigned_url_fn = lambda_.Function(
             self,
@@ -498,6 +631,8 @@ class ReceiptVaultStack(Stack):
             rest_api_name="receiptvault-api-prod",
             description="Receipt & Warranty Vault API",
             deploy_options=apigw.StageOptions(stage_name="prod"),
+            # gzip/deflate responses for clients that send Accept-Encoding
+            min_compression_size=Size.kibibytes(1),
             default_cors_preflight_options=apigw.CorsOptions(
                 allow_origins=apigw.Cors.ALL_ORIGINS,
                 allow_methods=[
@@ -514,6 +649,7 @@ class ReceiptVaultStack(Stack):
                     "X-Amz-Date",
                     "X-Api-Key",
                     "X-Amz-Security-Token",
+                    "If-None-Match",
                 ],
                 max_age=Duration.seconds(3600),
             ),
@@ -630,6 +766,14 @@ class ReceiptVaultStack(Stack):
             **auth_method_opts,
         )
 
+        # --- /sync/tree ---
+        sync_tree_resource = sync_resource.add_resource("tree")
+        sync_tree_resource.add_method(
+            "POST",
+            apigw.LambdaIntegration(sync_handler_fn),
+            **auth_method_opts,
+        )
+
         # --- /categories ---
         categories_resource = api.root.add_resource("categories")
         categories_resource.add_method(
@@ -679,6 +823,14 @@ class ReceiptVaultStack(Stack):
             **auth_method_opts,
         )
 
+        # --- /user/bootstrap ---
+        bootstrap_resource = user_resource.add_resource("bootstrap")
+        bootstrap_resource.add_method(
+            "GET",
+            apigw.LambdaIntegration(receipt_crud_fn),
+            **auth_method_opts,
+        )
+
         # --- /user/account ---
         account_resource = user_resource.add_resource("account")
         account_resource.add_method(
@@ -694,6 +846,12 @@ class ReceiptVaultStack(Stack):
             apigw.LambdaIntegration(export_handler_fn),
             **auth_method_opts,
         )
+        export_job_resource = export_resource.add_resource("{exportId}")
+        export_job_resource.add_method(
+            "GET",
+            apigw.LambdaIntegration(export_handler_fn),
+            **auth_method_opts,
+        )
 
         # ── Section 8: CloudFront ───────────────────────────────────────
 
@@ -773,7 +931,87 @@ class ReceiptVaultStack(Stack):
             "SNS_TOPIC_ARN", export_topic.topic_arn
         )
 
-        # ── Section 10: EventBridge Rules ───────────────────────────────
+        # ── Section 10: EventBridge Rules & Worker Queues ───────────────
+
+        # Segment queues — scheduled (and manually run) jobs fan out one message
+        # per segment and the same function consumes them as workers
+        worker_queue_dlq = sqs.Queue(
+            self,
+            "ScheduledJobWorkerDLQ",
+            queue_name="receiptvault-scheduled-job-worker-dlq-prod",
+            retention_period=Duration.days(14),
+        )
+
+        for job_fn, queue_id, queue_name in [
+            (warranty_checker_fn, "WarrantyCheckerQueue", "receiptvault-warranty-checker-segments-prod"),
+            (weekly_summary_fn, "WeeklySummaryQueue", "receiptvault-weekly-summary-segments-prod"),
+            (index_backfill_fn, "IndexBackfillQueue", "receiptvault-index-backfill-segments-prod"),
+        ]:
+            segment_queue = sqs.Queue(
+                self,
+                queue_id,
+                queue_name=queue_name,
+                visibility_timeout=Duration.seconds(360),
+                dead_letter_queue=sqs.DeadLetterQueue(
+                    max_receive_count=3, queue=worker_queue_dlq
+                ),
+            )
+            segment_queue.grant_send_messages(job_fn)
+            job_fn.add_environment("WORKER_QUEUE_URL", segment_queue.queue_url)
+            job_fn.add_event_source(
+                lambda_event_sources.SqsEventSource(segment_queue, batch_size=1)
+            )
+
+        # Export chunks — each message runs one resumable chunk of an export job;
+        # transient errors are retried by redelivery, the last receive fails the job
+        export_max_receives = 3
+        export_queue = sqs.Queue(
+            self,
+            "ExportJobQueue",
+            queue_name="receiptvault-export-jobs-prod",
+            visibility_timeout=Duration.seconds(360),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=export_max_receives, queue=worker_queue_dlq
+            ),
+        )
+        export_queue.grant_send_messages(export_handler_fn)
+        export_handler_fn.add_environment("EXPORT_QUEUE_URL", export_queue.queue_url)
+        export_handler_fn.add_environment("EXPORT_MAX_RECEIVES", str(export_max_receives))
+        export_handler_fn.add_event_source(
+            lambda_event_sources.SqsEventSource(export_queue, batch_size=1)
+        )
+
+        # Table stream — receipt changes only, in order per shard; a failing
+        # batch is bisected and its records retried, then recorded in the DLQ
+        stream_processor_dlq = sqs.Queue(
+            self,
+            "StreamProcessorDLQ",
+            queue_name="receiptvault-stream-processor-dlq-prod",
+            retention_period=Duration.days(14),
+        )
+        stream_processor_fn.add_event_source(
+            lambda_event_sources.DynamoEventSource(
+                table,
+                starting_position=lambda_.StartingPosition.TRIM_HORIZON,
+                batch_size=100,
+                max_batching_window=Duration.seconds(1),
+                bisect_batch_on_error=True,
+                retry_attempts=10,
+                max_record_age=Duration.hours(24),
+                report_batch_item_failures=True,
+                parallelization_factor=1,
+                on_failure=lambda_event_sources.SqsDlq(stream_processor_dlq),
+                filters=[
+                    lambda_.FilterCriteria.filter({
+                        "dynamodb": {
+                            "Keys": {
+                                "SK": {"S": lambda_.FilterRule.begins_with("RECEIPT#")},
+                            },
+                        },
+                    }),
+                ],
+            )
+        )
 
         # Daily warranty check at 8 AM UTC
         events.Rule(
@@ -885,6 +1123,22 @@ class ReceiptVaultStack(Stack):
             cw_actions.SnsAction(ops_topic)
         )
 
+        # Alarm: Stream records that exhausted their retries
+        stream_dlq_alarm = cloudwatch.Alarm(
+            self,
+            "StreamProcessorDLQNotEmpty",
+            alarm_name="receiptvault-stream-processor-dlq",
+            metric=stream_processor_dlq.metric_approximate_number_of_messages_visible(
+                statistic="Maximum",
+                period=Duration.minutes(5),
+            ),
+            threshold=0,
+            evaluation_periods=1,
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+        )
+        stream_dlq_alarm.add_alarm_action(cw_actions.SnsAction(ops_topic))
+
         # Alarm: Sync handler failures
         sync_failure_alarm = cloudwatch.Alarm(
             self,
@@ -916,8 +1170,9 @@ class ReceiptVaultStack(Stack):
 
         # ── Section 13: IAM Grants ─────────────────────────────────────
 
-        # receipt-crud: DynamoDB full access
+        # receipt-crud: DynamoDB full access, cursor signing key
         table.grant_read_write_data(receipt_crud_fn)
+        cursor_signing_secret.grant_read(receipt_crud_fn)
 
         # ocr-refine: DynamoDB read+write, S3 read, KMS decrypt, Bedrock invoke
         table.grant_read_write_data(ocr_refine_fn)
@@ -944,14 +1199,19 @@ class ReceiptVaultStack(Stack):
         table.grant_read_write_data(warranty_checker_fn)
         warranty_topic.grant_publish(warranty_checker_fn)
 
-        # weekly-summary: DynamoDB read, SNS publish
-        table.grant_read_data(weekly_summary_fn)
+        # weekly-summary: DynamoDB read+write (segment checkpoints), SNS publish
+        table.grant_read_write_data(weekly_summary_fn)
         warranty_topic.grant_publish(weekly_summary_fn)
 
+        # index-backfill: DynamoDB read+write (receipt repairs, segment checkpoints)
+        table.grant_read_write_data(index_backfill_fn)
+
         # user-deletion: Cognito admin, DynamoDB read+write, S3 read+delete, KMS decrypt
         table.grant_read_write_data(user_deletion_fn)
         image_bucket.grant_read(user_deletion_fn)
         image_bucket.grant_delete(user_deletion_fn)
+        export_bucket.grant_read(user_deletion_fn)
+        export_bucket.grant_delete(user_deletion_fn)
         cmk.grant_decrypt(user_deletion_fn)
         user_deletion_fn.add_to_role_policy(
             iam.PolicyStatement(
@@ -970,16 +1230,22 @@ class ReceiptVaultStack(Stack):
             )
         )
 
-        # export-handler: DynamoDB read, S3 image read, S3 export write, KMS, SNS
-        table.grant_read_data(export_handler_fn)
+        # export-handler: DynamoDB read/write (job items), S3 image read,
+        # S3 export read/write/delete (checkpoints), KMS, SNS
+        table.grant_read_write_data(export_handler_fn)
         image_bucket.grant_read(export_handler_fn)
-        export_bucket.grant_write(export_handler_fn)
+        export_bucket.grant_read_write(export_handler_fn)
+        export_bucket.grant_delete(export_handler_fn)
         cmk.grant_encrypt_decrypt(export_handler_fn)
         export_topic.grant_publish(export_handler_fn)
 
         # category-handler: DynamoDB read+write
         table.grant_read_write_data(category_handler_fn)
 
+        # stream-processor: DynamoDB read+write (receipt repairs, view items,
+        # markers); stream read is granted by the event source
+        table.grant_read_write_data(stream_processor_fn)
+
         # presigned-url-generator: DynamoDB read, S3 read+write, KMS encrypt+decrypt
         table.grant_read_data(presigned_url_fn)
         image_bucket.grant_read_write(presigned_url_fn)
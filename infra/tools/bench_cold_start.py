@@ -0,0 +1,73 @@
+"""Local cold-start benchmark for the Lambda handlers.
+
+For each function, starts fresh interpreters that import the handler module
+the way the Lambda runtime does and time the init phase. It then resolves
+every lazily built client the module declares, which is what the first
+request touching them pays. "init" is the cold start a request sees; "init +
+all clients" is what the same module cost when every client was built at
+import time. No AWS calls are made — building a client only loads its
+service model.
+
+Usage (from infra/):
+    python tools/bench_cold_start.py [function ...] [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from import_profile import LAMBDAS_DIR, function_names, handler_env  # noqa: E402
+
+_PROBE = """
+import json, time
+start = time.perf_counter()
+import handler
+init = time.perf_counter() - start
+from shared.clients import LazyProxy, built_clients
+built_at_init = len(built_clients())
+start = time.perf_counter()
+for value in list(vars(handler).values()):
+    if isinstance(value, LazyProxy):
+        value._resolve()
+resolve = time.perf_counter() - start
+print(json.dumps({"init": init, "resolve": resolve,
+                  "built_at_init": built_at_init, "clients": len(built_clients())}))
+"""
+
+
+def measure(name):
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=os.path.join(LAMBDAS_DIR, name),
+        env=handler_env(),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{name}: probe failed\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("functions", nargs="*", help="handlers to measure (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per function")
+    args = parser.parse_args()
+
+    print(f"{'function':<26} {'init ms':>9} {'init + all clients ms':>22} "
+          f"{'built at init':>14} {'clients':>8}")
+    for name in args.functions or function_names():
+        runs = [measure(name) for _ in range(args.runs)]
+        init = statistics.median(r["init"] for r in runs) * 1000
+        eager = statistics.median(r["init"] + r["resolve"] for r in runs) * 1000
+        print(f"{name:<26} {init:>9.1f} {eager:>22.1f} "
+              f"{runs[0]['built_at_init']:>14} {runs[0]['clients']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Microbenchmark: fast-path marshaller vs the boto3 resource-layer conversion.
+
+Converts 1,000 and 10,000 receipt-shaped items to and from DynamoDB JSON
+with boto3's TypeSerializer / TypeDeserializer (what Table and
+meta.client do for every attribute) and with shared.fastpath, checks the
+results agree, and prints the per-item cost of each.
+
+Usage (from infra/):
+    python tools/bench_marshal.py [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+
+INFRA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(INFRA_DIR, "lambda_layer", "python"))
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer  # noqa: E402
+
+from shared.fastpath import marshal_item, unmarshal_item  # noqa: E402
+
+ITEM_COUNTS = (1000, 10000)
+
+
+def make_items(count):
+    items = []
+    for i in range(count):
+        receipt_id = f"{i:08x}-0000-4000-8000-000000000000"
+        items.append({
+            "PK": "USER#bench", "SK": f"RECEIPT#{receipt_id}", "receiptId": receipt_id,
+            "userId": "bench", "status": "active", "createdAt": "2025-12-01T00:00:00Z",
+            "updatedAt": "2026-01-01T00:00:00Z", "serverVersion": 3,
+            "displayName": f"Receipt {i}", "merchantName": "Store", "purchaseDate": "2025-12-01",
+            "totalAmount": Decimal("19.99"), "currency": "EUR", "category": "Home",
+            "warrantyMonths": 24, "warrantyExpiryDate": "2027-12-01", "notes": "",
+            "tags": ["home", "kitchen"], "imageKeys": [f"img/{receipt_id}.jpg"],
+            "userEditedFields": ["displayName"], "llmConfidence": "0.92",
+            "extractedItems": [{"name": "Kettle", "quantity": 1, "price": Decimal("19.99")}],
+            "GSI1PK": "USER#bench", "GSI1SK": "2025-12-01", "GSI2PK": "USER#bench",
+            "GSI2SK": "CAT#Home", "GSI5PK": "USER#bench", "GSI5SK": "STATUS#active#2025-12-01",
+            "GSI6PK": "USER#bench", "GSI6SK": "2026-01-01T00:00:00Z",
+        })
+    return items
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+
+    def boto_marshal(items):
+        return [{k: serializer.serialize(v) for k, v in item.items()} for item in items]
+
+    def boto_unmarshal(raws):
+        return [{k: deserializer.deserialize(v) for k, v in raw.items()} for raw in raws]
+
+    print(f"{'items':>6}  {'direction':<10} {'boto3 us/item':>14} {'fastpath us/item':>17} {'speedup':>8}")
+    for count in ITEM_COUNTS:
+        items = make_items(count)
+
+        old_m, boto_raws = timed(lambda: boto_marshal(items), args.repeat)
+        new_m, fast_raws = timed(lambda: [marshal_item(item) for item in items], args.repeat)
+        assert boto_raws == fast_raws, "marshalled items differ"
+
+        old_u, boto_items = timed(lambda: boto_unmarshal(boto_raws), args.repeat)
+        new_u, fast_items = timed(lambda: [unmarshal_item(raw) for raw in boto_raws], args.repeat)
+        assert boto_items == fast_items, "unmarshalled items differ"
+
+        for direction, old, new in (("marshal", old_m, new_m), ("unmarshal", old_u, new_u)):
+            print(f"{count:>6}  {direction:<10} {old / count * 1e6:>14.2f} "
+                  f"{new / count * 1e6:>17.2f} {old / new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
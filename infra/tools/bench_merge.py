@@ -0,0 +1,171 @@
+"""Microbenchmark: compiled sync merge vs the original per-item merge.
+
+Compares, for pushes of 25, 250 and 2,500 items, the original
+_field_level_merge (set union over every attribute, hand-built
+UpdateExpression per item) against MergePlan plus the cached update shape
+now used by sync_handler. Both paths are checked to produce the same writes
+and conflicts before timing.
+
+Usage (from infra/):
+    python tools/bench_merge.py [--repeat 5]
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import timeit
+
+INFRA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(INFRA_DIR, "lambda_layer", "python"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+
+BATCH_SIZES = (25, 250, 2500)
+
+
+def load_sync_handler():
+    path = os.path.join(INFRA_DIR, "lambdas", "sync_handler", "handler.py")
+    spec = importlib.util.spec_from_file_location("sync_handler", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_merge(sync, user_id, receipt_id, client_item, server_item, now_iso):
+    """The merge and UpdateExpression building as they were before MergePlan."""
+    user_edited_fields = set(client_item.get("userEditedFields", []))
+    merged_fields = {}
+    conflicts = []
+
+    all_fields = set(client_item.keys()) | set(server_item.keys())
+    skip_fields = sync.PROTECTED_FIELDS | {"createdAt", "userEditedFields"}
+
+    for field in all_fields:
+        if field in skip_fields:
+            continue
+        client_val = client_item.get(field)
+        server_val = server_item.get(field)
+        if client_val == server_val:
+            continue
+        if field in sync.TIER_1_SERVER_WINS:
+            merged_fields[field] = server_val
+        elif field in sync.TIER_2_CLIENT_WINS:
+            merged_fields[field] = client_val
+        elif field in sync.TIER_3_CONDITIONAL:
+            if field in user_edited_fields:
+                merged_fields[field] = client_val
+            else:
+                merged_fields[field] = server_val
+        else:
+            merged_fields[field] = server_val
+            if client_val != server_val and client_val is not None:
+                conflicts.append({
+                    "field": field,
+                    "clientValue": client_val,
+                    "serverValue": server_val,
+                    "resolution": "server_wins_default",
+                })
+
+    write_fields = {
+        field: value for field, value in merged_fields.items()
+        if value is not None and value != server_item.get(field)
+    }
+    if not write_fields:
+        return write_fields, conflicts, None
+
+    expr_parts = ["#updatedAt = :now", "#sv = #sv + :one", "#gsi6sk = :now"]
+    expr_names = {"#updatedAt": "updatedAt", "#sv": "serverVersion", "#gsi6sk": "GSI6SK"}
+    expr_values = {":now": now_iso, ":one": 1,
+                   ":expectedVersion": server_item.get("serverVersion", 0)}
+    for field, value in write_fields.items():
+        expr_parts.append(f"#f_{field} = :v_{field}")
+        expr_names[f"#f_{field}"] = field
+        expr_values[f":v_{field}"] = value
+    action = {
+        "Update": {
+            "TableName": sync.TABLE_NAME,
+            "Key": sync.serialize_item({"PK": f"USER#{user_id}", "SK": f"RECEIPT#{receipt_id}"}),
+            "UpdateExpression": "SET " + ", ".join(expr_parts),
+            "ExpressionAttributeNames": expr_names,
+            "ExpressionAttributeValues": sync.serialize_item(expr_values),
+        }
+    }
+    return write_fields, conflicts, action
+
+
+def make_pairs(count, seed=7):
+    """Build (client_item, server_item) pairs shaped like real receipts."""
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(count):
+        receipt_id = f"{i:08x}-0000-4000-8000-000000000000"
+        server = {
+            "PK": "USER#bench", "SK": f"RECEIPT#{receipt_id}", "receiptId": receipt_id,
+            "userId": "bench", "serverVersion": 3, "updatedAt": "2026-01-01T00:00:00Z",
+            "createdAt": "2025-12-01T00:00:00Z", "status": "active",
+            "displayName": f"Receipt {i}", "merchantName": "Store", "category": "Home",
+            "purchaseDate": "2025-12-01", "totalAmount": 1999, "currency": "EUR",
+            "warrantyMonths": 24, "extractedMerchantName": "STORE", "extractedTotal": 1999,
+            "llmConfidence": "0.92", "ocrRawText": "x" * 400, "notes": "",
+            "tags": ["a", "b"], "imageKeys": [f"img/{receipt_id}.jpg"],
+            "GSI1PK": "USER#bench", "GSI1SK": "2025-12-01", "GSI6PK": "USER#bench",
+            "GSI6SK": "2026-01-01T00:00:00Z",
+        }
+        client = {k: v for k, v in server.items() if not k.startswith("GSI")}
+        client["serverVersion"] = 2
+        client["userNotes"] = f"note {rng.random()}"
+        client["isFavorite"] = rng.random() < 0.5
+        if rng.random() < 0.5:
+            client["displayName"] = f"Renamed {i}"
+            client["userEditedFields"] = ["displayName"]
+        if rng.random() < 0.2:
+            client["notes"] = "edited offline"
+        pairs.append((client, server))
+    return pairs
+
+
+def compiled_merge(sync, pairs, now_iso):
+    for client_item, server_item in pairs:
+        sync._field_level_merge("bench", client_item["receiptId"], client_item, server_item, now_iso)
+
+
+def original_merge(sync, pairs, now_iso):
+    for client_item, server_item in pairs:
+        legacy_merge(sync, "bench", client_item["receiptId"], client_item, server_item, now_iso)
+
+
+def check_equivalent(sync, pairs, now_iso):
+    for client_item, server_item in pairs:
+        receipt_id = client_item["receiptId"]
+        old_fields, old_conflicts, _ = legacy_merge(
+            sync, "bench", receipt_id, client_item, server_item, now_iso
+        )
+        new_fields, new_conflicts = sync.MERGE_PLAN.merge(client_item, server_item)
+        key = lambda c: c["field"]
+        if old_fields != new_fields or sorted(old_conflicts, key=key) != sorted(new_conflicts, key=key):
+            raise AssertionError(f"merge results differ for {receipt_id}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sync = load_sync_handler()
+    now_iso = "2026-02-01T00:00:00Z"
+
+    print(f"{'items':>6}  {'original ms':>12}  {'compiled ms':>12}  {'speedup':>8}")
+    for size in BATCH_SIZES:
+        pairs = make_pairs(size)
+        check_equivalent(sync, pairs, now_iso)
+        number = max(1, 2500 // size)
+        old = min(timeit.repeat(lambda: original_merge(sync, pairs, now_iso),
+                                number=number, repeat=args.repeat)) / number
+        new = min(timeit.repeat(lambda: compiled_merge(sync, pairs, now_iso),
+                                number=number, repeat=args.repeat)) / number
+        print(f"{size:>6}  {old * 1000:>12.3f}  {new * 1000:>12.3f}  {old / new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
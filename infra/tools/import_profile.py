@@ -0,0 +1,91 @@
+"""Import-time profile of each Lambda handler module.
+
+Imports every handler in a fresh interpreter under ``python -X importtime``
+(with the shared layer on the path, as in Lambda) and reports the handler's
+total import time and its slowest direct imports.
+
+Usage (from infra/):
+    python tools/import_profile.py [function ...] [--top 8]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+INFRA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDAS_DIR = os.path.join(INFRA_DIR, "lambdas")
+LAYER_DIR = os.path.join(INFRA_DIR, "lambda_layer", "python")
+
+# Values the handlers read with os.environ[...] at import time
+HANDLER_ENV = {
+    "AWS_DEFAULT_REGION": "eu-west-1",
+    "TABLE_NAME": "ReceiptVault",
+    "S3_BUCKET": "receiptvault-images",
+    "EXPORT_BUCKET": "receiptvault-exports",
+    "SNS_TOPIC_ARN": "arn:aws:sns:eu-west-1:000000000000:receiptvault-notifications",
+    "USER_POOL_ID": "eu-west-1_example",
+}
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def function_names():
+    return sorted(
+        name for name in os.listdir(LAMBDAS_DIR)
+        if os.path.isfile(os.path.join(LAMBDAS_DIR, name, "handler.py"))
+    )
+
+
+def handler_env():
+    env = dict(os.environ)
+    env.update(HANDLER_ENV)
+    env["PYTHONPATH"] = LAYER_DIR
+    return env
+
+
+def profile(name):
+    """Return ``(total_us, [(cumulative_us, module), ...])`` for one handler."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import handler"],
+        cwd=os.path.join(LAMBDAS_DIR, name),
+        env=handler_env(),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{name}: import failed\n{proc.stderr[-2000:]}")
+
+    # importtime lists a module's imports (indented one level deeper) before
+    # the module itself, so collect direct children until "handler" appears
+    children = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, module = int(match.group(2)), len(match.group(3)), match.group(4)
+        if depth == 1:
+            if module == "handler":
+                return cumulative, sorted(children, reverse=True)
+            children = []
+        elif depth == 3:
+            children.append((cumulative, module))
+    raise RuntimeError(f"{name}: handler missing from the import time report")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("functions", nargs="*", help="handlers to profile (default: all)")
+    parser.add_argument("--top", type=int, default=8, help="imports listed per function")
+    args = parser.parse_args()
+
+    for name in args.functions or function_names():
+        total, imports = profile(name)
+        print(f"{name}: {total / 1000:.1f} ms to import handler")
+        for cumulative, module in imports[:args.top]:
+            print(f"    {cumulative / 1000:8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
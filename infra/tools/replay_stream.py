@@ -0,0 +1,182 @@
+"""Record table stream records and replay them through the stream processor.
+
+``record`` reads every shard of a table's stream from the start (DynamoDB
+Local keeps one when the table is created with a StreamSpecification) and
+writes the records as JSON lines. ``replay`` feeds recorded records to
+lambdas/stream_processor in batches, the way the Lambda event source does:
+receipt records only, and after a batch item failure the batch is sent
+again from the reported sequence number, up to ``--retries`` times.
+``--redeliver`` sends every batch twice, which must leave the derived views
+as a single delivery would.
+
+Input for ``replay`` is JSON lines of records, a JSON list of records, or a
+Lambda event / GetRecords response ({"Records": [...]}).
+
+Usage (from infra/):
+    python tools/replay_stream.py record --endpoint-url http://localhost:8000 -o changes.jsonl
+    python tools/replay_stream.py replay changes.jsonl --endpoint-url http://localhost:8000
+"""
+
+import argparse
+import json
+import os
+import sys
+from decimal import Decimal
+
+INFRA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYER_DIR = os.path.join(INFRA_DIR, "lambda_layer", "python")
+HANDLER_DIR = os.path.join(INFRA_DIR, "lambdas", "stream_processor")
+
+DEFAULT_TABLE = "ReceiptVault"
+DEFAULT_REGION = "eu-west-1"
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_RETRIES = 3
+
+
+def load_records(path):
+    """Return the stream records stored in ``path``."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if not text:
+        return []
+    if text[0] in "[{":
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = None  # JSON lines that start with an object
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict):
+            return data.get("Records", [data])
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def is_receipt_record(record):
+    """Mirror of the event source filter on SK begins_with RECEIPT#."""
+    return record["dynamodb"]["Keys"]["SK"].get("S", "").startswith("RECEIPT#")
+
+
+def import_handler(table_name, region, endpoint_url=None):
+    """Import the stream processor module pointed at ``table_name``."""
+    os.environ["TABLE_NAME"] = table_name
+    os.environ["REGION"] = region
+    os.environ.setdefault("AWS_DEFAULT_REGION", region)
+    if endpoint_url:
+        os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = endpoint_url
+    for path in (LAYER_DIR, HANDLER_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    import handler
+    return handler
+
+
+def replay(handler_module, records, batch_size=DEFAULT_BATCH_SIZE, retries=DEFAULT_RETRIES,
+           redeliver=False):
+    """Deliver ``records`` to the handler and return a summary of the run."""
+    records = [r for r in records if is_receipt_record(r)]
+    summary = {"records": len(records), "deliveries": 0, "retried": 0, "failed": []}
+    for start in range(0, len(records), batch_size):
+        for _ in range(2 if redeliver else 1):
+            batch = records[start:start + batch_size]
+            for attempt in range(retries + 1):
+                result = handler_module.handler({"Records": batch}, None)
+                summary["deliveries"] += 1
+                failures = [f["itemIdentifier"] for f in result.get("batchItemFailures", [])]
+                if not failures:
+                    break
+                # Lambda resumes the shard from the lowest reported record
+                first = min(failures, key=int)
+                batch = batch[[r["dynamodb"]["SequenceNumber"] for r in batch].index(first):]
+                if attempt < retries:
+                    summary["retried"] += 1
+            else:
+                summary["failed"].append(first)
+    return summary
+
+
+def record(client, streams_client, table_name, out):
+    """Write every record of the table's stream to ``out``; return the count."""
+    stream_arn = client.describe_table(TableName=table_name)["Table"].get("LatestStreamArn")
+    if not stream_arn:
+        raise SystemExit(f"{table_name} has no stream")
+
+    shards = []
+    params = {"StreamArn": stream_arn}
+    while True:
+        description = streams_client.describe_stream(**params)["StreamDescription"]
+        shards.extend(description["Shards"])
+        if "LastEvaluatedShardId" not in description:
+            break
+        params["ExclusiveStartShardId"] = description["LastEvaluatedShardId"]
+
+    count = 0
+    for shard in shards:
+        iterator = streams_client.get_shard_iterator(
+            StreamArn=stream_arn, ShardId=shard["ShardId"], ShardIteratorType="TRIM_HORIZON",
+        ).get("ShardIterator")
+        while iterator:
+            resp = streams_client.get_records(ShardIterator=iterator)
+            for item in resp["Records"]:
+                out.write(json.dumps(item, default=_json_default) + "\n")
+                count += 1
+            # An open shard always returns a next iterator; stop once it is drained
+            iterator = resp.get("NextShardIterator") if resp["Records"] else None
+    return count
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record", help="write the table's stream records as JSON lines")
+    rec.add_argument("-o", "--output", help="output file (default: stdout)")
+
+    rep = commands.add_parser("replay", help="feed recorded records to the stream processor")
+    rep.add_argument("path", help="recorded records")
+    rep.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    rep.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                     help="re-sends of a batch after a batch item failure")
+    rep.add_argument("--redeliver", action="store_true", help="deliver every batch twice")
+    rep.add_argument("--derived-views", choices=("inline", "stream"), default="stream",
+                     help="DERIVED_VIEWS_MODE for the processor (default: stream)")
+
+    for command in (rec, rep):
+        command.add_argument("--table", default=DEFAULT_TABLE)
+        command.add_argument("--region", default=DEFAULT_REGION)
+        command.add_argument("--endpoint-url", help="e.g. http://localhost:8000 for DynamoDB Local")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        import boto3
+        client = boto3.client("dynamodb", region_name=args.region, endpoint_url=args.endpoint_url)
+        streams_client = boto3.client(
+            "dynamodbstreams", region_name=args.region, endpoint_url=args.endpoint_url
+        )
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as out:
+                count = record(client, streams_client, args.table, out)
+        else:
+            count = record(client, streams_client, args.table, sys.stdout)
+        print(f"{count} records", file=sys.stderr)
+        return 0
+
+    os.environ["DERIVED_VIEWS_MODE"] = args.derived_views
+    handler_module = import_handler(args.table, args.region, args.endpoint_url)
+    summary = replay(
+        handler_module, load_records(args.path),
+        batch_size=args.batch_size, retries=args.retries, redeliver=args.redeliver,
+    )
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())